@@ -12,6 +12,9 @@ import threading
 from typing import List, Dict, Optional
 import logging
 from datetime import datetime
+from chat_archive import open_archive
+from chat_sentiment import read_mood
+from columnar_store import read_summary
 from gemini_ai_integration import GeminiChatAI, InteractiveManager, ChatMessage, load_api_key
 
 logger = logging.getLogger(__name__)
@@ -26,11 +29,15 @@ class AIChatBridge:
         self.analysis_results = {}
         self.active_polls = {}
         self.active_contests = {}
+        self.archive = None
+        self.seen_escalations = None
         
         # Настройки
         self.settings = {
             'ai_enabled': False,
             'auto_analysis_interval': 300,  # 5 минут
+            'local_mood_enabled': True,  # Gemini только при эскалации локальной оценки (chat_mood.json)
+            'mood_check_interval': 5,
             'auto_polls_enabled': False,
             'auto_contests_enabled': False,
             'stream_context': 'Игровой стрим'
@@ -81,35 +88,67 @@ class AIChatBridge:
             logger.error(f"❌ Ошибка инициализации ИИ: {e}")
             return False
     
-    def read_chat_messages(self) -> List[ChatMessage]:
-        """Читает сообщения из messages.json"""
+    def get_archive(self):
+        """Возвращает архив чата (chat_archive.db), если парсер или координатор его ведут"""
+        if self.archive is None:
+            try:
+                with open('chat_settings.json', 'r', encoding='utf-8') as f:
+                    chat_settings = json.load(f)
+            except (OSError, ValueError):
+                chat_settings = {}
+            self.archive = open_archive(chat_settings)
+        return self.archive
+    
+    def read_chat_messages(self, limit: int = 50, since: Optional[int] = None) -> List[ChatMessage]:
+        """
+        Читает последние сообщения чата
+        
+        Args:
+            limit (int): Максимум сообщений
+            since (int): Только сообщения не старше этого времени (мс)
+        
+        Returns:
+            list: Сообщения из архива чата, а без архива - из messages.json
+        """
+        archive = self.get_archive()
+        if archive is not None:
+            messages_data = archive.recent(limit=limit, since=since)
+        else:
+            messages_data = self.read_messages_file(limit, since)
+        
+        # Конвертируем в ChatMessage объекты
+        chat_messages = []
+        for msg_data in messages_data:
+            try:
+                author = msg_data['author']
+                
+                chat_msg = ChatMessage(
+                    author=author.get('display_name', author.get('name', 'Unknown')),
+                    text=msg_data['text'],
+                    timestamp=msg_data['timestamp'],
+                    is_moderator=author.get('is_moderator', False),
+                    is_sponsor=author.get('is_sponsor', False),
+                    is_owner=author.get('is_owner', False)
+                )
+                
+                chat_messages.append(chat_msg)
+                
+            except KeyError as e:
+                logger.warning(f"⚠️ Пропущено сообщение с неполными данными: {e}")
+                continue
+        
+        return chat_messages
+    
+    def read_messages_file(self, limit: int, since: Optional[int] = None) -> List[Dict]:
+        """Читает последние сообщения из messages.json (только окно оверлея)"""
         
         try:
             with open('messages.json', 'r', encoding='utf-8') as f:
                 messages_data = json.load(f)
             
-            # Конвертируем в ChatMessage объекты
-            chat_messages = []
-            for msg_data in messages_data[-50:]:  # Последние 50 сообщений
-                try:
-                    author = msg_data['author']
-                    
-                    chat_msg = ChatMessage(
-                        author=author.get('display_name', author.get('name', 'Unknown')),
-                        text=msg_data['text'],
-                        timestamp=msg_data['timestamp'],
-                        is_moderator=author.get('is_moderator', False),
-                        is_sponsor=author.get('is_sponsor', False),
-                        is_owner=author.get('is_owner', False)
-                    )
-                    
-                    chat_messages.append(chat_msg)
-                    
-                except KeyError as e:
-                    logger.warning(f"⚠️ Пропущено сообщение с неполными данными: {e}")
-                    continue
-            
-            return chat_messages
+            if since is not None:
+                messages_data = [msg for msg in messages_data if msg.get('timestamp', 0) >= since]
+            return messages_data[-limit:]
             
         except FileNotFoundError:
             logger.warning("⚠️ Файл messages.json не найден")
@@ -121,8 +160,26 @@ class AIChatBridge:
             logger.error(f"❌ Ошибка чтения сообщений: {e}")
             return []
     
-    async def analyze_chat_auto(self):
-        """Автоматический анализ чата"""
+    def update_user_stats(self):
+        """Заполняет статистику авторов менеджера из chat_analytics.json (пишет координатор)"""
+        try:
+            with open('chat_analytics.json', 'r', encoding='utf-8') as f:
+                analytics = json.load(f)
+        except (OSError, ValueError):
+            return
+        
+        self.ai_manager.user_stats = {
+            entry['value']: entry['count'] for entry in analytics.get('top_authors', [])
+        }
+    
+    async def analyze_chat_auto(self, force: bool = False, reason: Optional[str] = None):
+        """
+        Автоматический анализ чата
+        
+        Args:
+            force (bool): Не ждать интервал анализа менеджера
+            reason (str): Причина эскалации локальной оценки настроения
+        """
         
         if not self.ai_manager or not self.settings['ai_enabled']:
             return
@@ -131,6 +188,8 @@ class AIChatBridge:
         if not messages:
             return
         
+        self.update_user_stats()
+        
         # Проверяем, есть ли новые сообщения
         if messages == self.last_messages:
             return
@@ -139,13 +198,19 @@ class AIChatBridge:
         
         try:
             # Анализируем чат
-            result = await self.ai_manager.process_chat_messages(messages)
+            result = await self.ai_manager.process_chat_messages(messages, force=force)
             
             if result.get('status') == 'success':
+                if reason:
+                    result['trigger'] = reason
+                local_mood = self.analysis_results.get('local_mood')
+                if local_mood is not None:
+                    result['local_mood'] = local_mood
                 self.analysis_results = result
                 self.save_analysis_results()
                 
-                logger.info(f"📊 Автоанализ: настроение {result['analysis']['overall_mood']}")
+                trigger = f" ({reason})" if reason else ""
+                logger.info(f"📊 Автоанализ: настроение {result['analysis']['overall_mood']}{trigger}")
                 
                 # Автоматически создаем опрос если включено
                 if self.settings.get('auto_polls_enabled', False):
@@ -154,6 +219,21 @@ class AIChatBridge:
         except Exception as e:
             logger.error(f"❌ Ошибка автоанализа: {e}")
     
+    async def follow_local_mood(self, mood: Dict):
+        """
+        Публикует локальное настроение и запускает анализ Gemini при новой эскалации
+        
+        Args:
+            mood (dict): Снимок chat_mood.json
+        """
+        self.analysis_results['local_mood'] = mood
+        self.save_analysis_results()
+        
+        escalations = mood.get('escalations', 0)
+        if escalations and escalations != self.seen_escalations:
+            self.seen_escalations = escalations
+            await self.analyze_chat_auto(force=True, reason=mood.get('escalation_reason'))
+    
     async def create_auto_poll(self, messages: List[ChatMessage]):
         """Создает автоматический опрос"""
         
@@ -183,6 +263,10 @@ class AIChatBridge:
     
     def save_analysis_results(self):
         """Сохраняет результаты анализа"""
+        # Объём, доли каналов и задержка конвейера за 5 минут по колонкам координатора
+        activity = read_summary()
+        if activity is not None:
+            self.analysis_results['activity'] = activity
         try:
             with open('ai_analysis.json', 'w', encoding='utf-8') as f:
                 json.dump(self.analysis_results, f, ensure_ascii=False, indent=2)
@@ -300,6 +384,14 @@ class AIChatBridge:
         
         while self.is_running:
             try:
+                # Пока координатор оценивает настроение локально, Gemini вызывается только при его
+                # эскалации; без свежего chat_mood.json - анализ по расписанию
+                mood = read_mood() if self.settings.get('local_mood_enabled', True) else None
+                if mood is not None:
+                    await self.follow_local_mood(mood)
+                    await asyncio.sleep(self.settings.get('mood_check_interval', 5))
+                    continue
+                
                 await self.analyze_chat_auto()
                 await asyncio.sleep(self.settings['auto_analysis_interval'])
                 
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Справедливый планировщик очередей каналов мульти-чата
+Объединитель забирает сообщения по алгоритму deficit round robin: за раунд
+канал получает quantum * weight сообщений, поэтому канал под рейдом
+не вытесняет остальные. Очереди ограничены, а при переполнении применяется
+явная политика сброса с подсчётом потерь по каждому каналу:
+
+- drop_oldest - вытесняется самое старое сообщение очереди
+- sample - принимается каждое sample_every-е новое сообщение, остальные сбрасываются
+- collapse - повтор текста, уже стоящего в очереди, сбрасывается; иначе drop_oldest
+"""
+
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+# Политики переполнения очереди
+OVERLOAD_POLICIES = ('drop_oldest', 'sample', 'collapse')
+
+DEFAULT_QUEUE_LIMIT = 500
+DEFAULT_QUANTUM = 10
+DEFAULT_SAMPLE_EVERY = 5
+
+
+class ChannelQueue:
+    """Ограниченная очередь одного канала"""
+
+    def __init__(self, channel_id: str, weight: float, limit: int, policy: str,
+                 key: Optional[Callable[[Any], Any]] = None, sample_every: int = DEFAULT_SAMPLE_EVERY):
+        self.channel_id = channel_id
+        self.weight = weight
+        self.limit = limit
+        self.policy = policy
+        self.key = key if policy == 'collapse' else None
+        self.sample_every = max(sample_every, 1)
+
+        self.items = deque()
+        self.key_counts = {}
+        self.deficit = 0.0
+        self.overload_arrivals = 0
+
+        # Статистика
+        self.enqueued = 0
+        self.dropped = 0
+        self.collapsed = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def _push(self, item, item_key):
+        self.items.append((item, item_key))
+        if item_key is not None:
+            self.key_counts[item_key] = self.key_counts.get(item_key, 0) + 1
+        self.enqueued += 1
+
+    def pop(self):
+        item, item_key = self.items.popleft()
+        if item_key is not None:
+            count = self.key_counts[item_key] - 1
+            if count:
+                self.key_counts[item_key] = count
+            else:
+                del self.key_counts[item_key]
+        return item
+
+    def put(self, item) -> bool:
+        """
+        Добавляет сообщение с учётом политики переполнения
+
+        Returns:
+            bool: False если сброшено само новое сообщение
+        """
+        item_key = self.key(item) if self.key is not None else None
+
+        if len(self.items) < self.limit:
+            self.overload_arrivals = 0
+            self._push(item, item_key)
+            return True
+
+        if self.policy == 'collapse' and item_key is not None and item_key in self.key_counts:
+            self.collapsed += 1
+            return False
+
+        if self.policy == 'sample':
+            self.overload_arrivals += 1
+            if self.overload_arrivals % self.sample_every:
+                self.dropped += 1
+                return False
+
+        # drop_oldest (и принятое sample/collapse): освобождаем место
+        self.pop()
+        self.dropped += 1
+        self._push(item, item_key)
+        return True
+
+    def get_stats(self) -> Dict:
+        return {
+            'queued': len(self.items),
+            'weight': self.weight,
+            'enqueued': self.enqueued,
+            'dropped': self.dropped,
+            'collapsed': self.collapsed
+        }
+
+
+class FairScheduler:
+    """
+    Набор очередей каналов с выборкой deficit round robin
+
+    Писатели (потоки чтения каналов, in-process движок) вызывают put(),
+    объединитель - drain() раз за цикл; ни одна из сторон не спит
+    """
+
+    def __init__(self, quantum: int = DEFAULT_QUANTUM,
+                 queue_limit: int = DEFAULT_QUEUE_LIMIT,
+                 policy: str = 'drop_oldest',
+                 key: Optional[Callable[[Any], Any]] = None,
+                 sample_every: int = DEFAULT_SAMPLE_EVERY):
+        self.quantum = quantum
+        self.queue_limit = queue_limit
+        self.policy = policy if policy in OVERLOAD_POLICIES else 'drop_oldest'
+        self.key = key
+        self.sample_every = sample_every
+
+        self.queues = {}
+        self.order = deque()
+        self.lock = threading.Lock()
+
+    def register(self, channel_id: str, weight: float = 1.0) -> ChannelQueue:
+        """Создаёт очередь канала (при повторном запуске канала обновляет только вес)"""
+        with self.lock:
+            queue = self.queues.get(channel_id)
+            if queue is None:
+                queue = self.queues[channel_id] = ChannelQueue(
+                    channel_id, weight, self.queue_limit, self.policy, self.key, self.sample_every
+                )
+                self.order.append(channel_id)
+            else:
+                queue.weight = weight
+            return queue
+
+    def put(self, channel_id: str, item) -> bool:
+        """Добавляет сообщение в очередь канала"""
+        with self.lock:
+            queue = self.queues.get(channel_id)
+            if queue is None:
+                queue = self.queues[channel_id] = ChannelQueue(
+                    channel_id, 1.0, self.queue_limit, self.policy, self.key, self.sample_every
+                )
+                self.order.append(channel_id)
+            return queue.put(item)
+
+    def size(self, channel_id: str) -> int:
+        """Длина очереди канала"""
+        queue = self.queues.get(channel_id)
+        return len(queue) if queue is not None else 0
+
+    def drain(self, budget: Optional[int] = None, quantum: Optional[int] = None,
+              single_round: bool = False) -> List:
+        """
+        Забирает сообщения из очередей по весам каналов
+
+        Args:
+            budget (int): Максимум сообщений за вызов (None - без ограничения)
+            quantum (int): Сообщений на единицу веса за раунд (по умолчанию self.quantum)
+            single_round (bool): Только один раунд (жёсткий лимит на канал за цикл)
+
+        Returns:
+            list: Сообщения в порядке выборки
+        """
+        quantum = quantum or self.quantum
+        drained = []
+
+        with self.lock:
+            active = [self.queues[channel_id] for channel_id in self.order if self.queues[channel_id].items]
+            # Следующий вызов начинает раунд со следующего канала
+            self.order.rotate(-1)
+
+            while active and (budget is None or len(drained) < budget):
+                still_active = []
+                for queue in active:
+                    queue.deficit += quantum * queue.weight
+                    while queue.items and queue.deficit >= 1 and (budget is None or len(drained) < budget):
+                        drained.append(queue.pop())
+                        queue.deficit -= 1
+                    if queue.items:
+                        still_active.append(queue)
+                    else:
+                        # Пустая очередь не копит кредит
+                        queue.deficit = 0.0
+                active = still_active
+                if single_round:
+                    break
+
+        return drained
+
+    def get_stats(self) -> Dict[str, Dict]:
+        """Статистика очередей по каналам"""
+        with self.lock:
+            return {channel_id: queue.get_stats() for channel_id, queue in self.queues.items()}
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Потоковая аналитика мульти-чата
+Координатор передаёт сюда каждое принятое сообщение, а наружу (оверлеи,
+GUI, ИИ-мост) уходит готовый снимок chat_analytics.json:
+
+- скорость чата по каналам за 10 секунд, 1 и 5 минут (посекундные корзины)
+- приблизительное число уникальных авторов (HyperLogLog) за сессию и 5 минут
+- самые активные авторы, эмоджи и слова/биграммы (Space-Saving)
+
+Память ограничена независимо от длины трансляции, а запросы не перебирают сообщения
+"""
+
+import re
+import json
+import math
+import time
+import heapq
+import hashlib
+import logging
+import os
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+
+logger = logging.getLogger('chat_analytics')
+
+# Окна скорости чата (подпись -> секунды)
+RATE_WINDOWS = (('10s', 10), ('1m', 60), ('5m', 300))
+
+# Значения по умолчанию (переопределяются в chat_settings.json)
+DEFAULT_ANALYTICS_FILE = 'chat_analytics.json'
+DEFAULT_TOP_K = 100
+DEFAULT_TOP_SPAN_SECONDS = 300
+DEFAULT_HOT_FACTOR = 3.0
+DEFAULT_HOT_MIN_RATE = 1.0
+
+# Точность HyperLogLog: 2^p регистров, ошибка ~1.04/sqrt(2^p)
+SESSION_HLL_PRECISION = 12
+WINDOW_HLL_PRECISION = 10
+
+_EMOJI_CODE_PATTERN = re.compile(r':[\w\-]+:')
+_WORD_PATTERN = re.compile(r'[^\W\d_]{2,}')
+
+# Служебные слова не попадают в популярные слова и биграммы
+STOP_WORDS = frozenset((
+    'и', 'в', 'во', 'не', 'на', 'я', 'что', 'он', 'с', 'со', 'как', 'а', 'то', 'все', 'она', 'так',
+    'его', 'но', 'да', 'ты', 'к', 'у', 'же', 'вы', 'за', 'бы', 'по', 'ее', 'мне', 'есть', 'от',
+    'это', 'из', 'ну', 'вот', 'мы', 'там', 'тут', 'где', 'уже', 'или', 'ещё', 'еще', 'нет', 'ли',
+    'the', 'a', 'an', 'and', 'or', 'is', 'are', 'to', 'of', 'in', 'on', 'it', 'i', 'you', 'this',
+    'that', 'for', 'be', 'was', 'so', 'my', 'me', 'we', 'at', 'do', 'with'
+))
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class RateCounter:
+    """
+    Скорость событий за 10 с, 1 мин и 5 мин
+
+    Посекундные корзины в кольце на самое длинное окно; суммы окон
+    поддерживаются на лету, поэтому запрос скорости - O(1)
+    """
+
+    def __init__(self, windows=RATE_WINDOWS):
+        self.windows = windows
+        self.size = max(seconds for _, seconds in windows)
+        self.buckets = [0] * self.size
+        self.sums = [0] * len(windows)
+        self.second = None
+        self.total = 0
+
+    def _advance(self, second: int):
+        if self.second is None:
+            self.second = second
+            return
+        steps = min(second - self.second, self.size)
+        for step in range(steps):
+            current = self.second + step + 1
+            # Корзины, выходящие из каждого окна при переходе к секунде current
+            for index, (_, seconds) in enumerate(self.windows):
+                self.sums[index] -= self.buckets[(current - seconds) % self.size]
+            self.buckets[current % self.size] = 0
+        self.second = max(second, self.second)
+
+    def add(self, count: int = 1, now: Optional[float] = None):
+        second = int(time.monotonic() if now is None else now)
+        self._advance(second)
+        self.buckets[self.second % self.size] += count
+        for index in range(len(self.sums)):
+            self.sums[index] += count
+        self.total += count
+
+    def rates(self, now: Optional[float] = None) -> Dict[str, float]:
+        """Сообщений в секунду по окнам"""
+        self._advance(int(time.monotonic() if now is None else now))
+        return {label: round(self.sums[index] / seconds, 2)
+                for index, (label, seconds) in enumerate(self.windows)}
+
+
+class HyperLogLog:
+    """Приблизительный счётчик уникальных значений фиксированного размера"""
+
+    def __init__(self, precision: int = SESSION_HLL_PRECISION):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(self.size)
+        self.alpha = 0.7213 / (1 + 1.079 / self.size)
+        self._estimate = 0
+
+    def add(self, value: str) -> bool:
+        """Добавляет значение; True если изменился регистр (оценка могла вырасти)"""
+        hashed = _hash64(value)
+        index = hashed & (self.size - 1)
+        rest = hashed >> self.precision
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            self._estimate = None
+            return True
+        return False
+
+    def merge(self, other: 'HyperLogLog'):
+        """Объединяет с другим счётчиком той же точности"""
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+        self._estimate = None
+
+    def count(self) -> int:
+        """Оценка числа уникальных значений (пересчитывается только после изменений)"""
+        if self._estimate is None:
+            inverse_sum = sum(2.0 ** -register for register in self.registers)
+            estimate = self.alpha * self.size * self.size / inverse_sum
+            zeros = self.registers.count(0)
+            if estimate <= 2.5 * self.size and zeros:
+                # Поправка для малых значений (linear counting)
+                estimate = self.size * math.log(self.size / zeros)
+            self._estimate = int(round(estimate))
+        return self._estimate
+
+
+class WindowedUniques:
+    """Уникальные значения за последние minutes минут: HyperLogLog на каждую минуту"""
+
+    def __init__(self, minutes: int = 5, precision: int = WINDOW_HLL_PRECISION):
+        self.precision = precision
+        self.slots = deque(maxlen=minutes)
+        self.minute = None
+        self._estimate = None
+
+    def _advance(self, minute: int):
+        if self.minute != minute:
+            gap = min(minute - self.minute, self.slots.maxlen) if self.minute is not None else 1
+            for _ in range(gap):
+                self.slots.append(HyperLogLog(self.precision))
+            self.minute = minute
+            self._estimate = None
+
+    def add(self, value: str, now: Optional[float] = None):
+        self._advance(int((time.monotonic() if now is None else now) // 60))
+        if self.slots[-1].add(value):
+            self._estimate = None
+
+    def count(self, now: Optional[float] = None) -> int:
+        self._advance(int((time.monotonic() if now is None else now) // 60))
+        if self._estimate is None:
+            merged = HyperLogLog(self.precision)
+            for slot in self.slots:
+                merged.merge(slot)
+            self._estimate = merged.count()
+        return self._estimate
+
+
+class SpaceSaving:
+    """
+    Приблизительный топ частых значений (алгоритм Space-Saving)
+
+    Хранит не больше capacity счётчиков; значение, вытесняющее самый редкий
+    счётчик, наследует его значение, поэтому частые значения оцениваются сверху
+    с ошибкой не больше минимального счётчика.
+
+    Самый редкий счётчик ищется по ленивой min-куче: у каждого значения одна
+    запись, которая при росте счётчика не обновляется (только занижена).
+    Устаревшая запись на вершине перекладывается с текущим счётчиком, поэтому
+    вытеснение стоит O(log k) в среднем, а не O(k)
+    """
+
+    def __init__(self, capacity: int = DEFAULT_TOP_K):
+        self.capacity = capacity
+        self.counts = {}
+        self.heap = []
+
+    def add(self, value: str, count: int = 1):
+        counts = self.counts
+        if value in counts:
+            counts[value] += count
+            return
+        if len(counts) < self.capacity:
+            counts[value] = count
+            heapq.heappush(self.heap, (count, value))
+            return
+
+        heap = self.heap
+        while True:
+            stored, victim = heap[0]
+            current = counts[victim]
+            if stored == current:
+                break
+            heapq.heapreplace(heap, (current, victim))
+        del counts[victim]
+        counts[value] = current + count
+        heapq.heapreplace(heap, (current + count, value))
+
+    def top(self, limit: int = 10) -> List[tuple]:
+        return sorted(self.counts.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+class WindowedTopK:
+    """Топ значений за последние span..2*span секунд: два поколения Space-Saving"""
+
+    def __init__(self, capacity: int = DEFAULT_TOP_K, span: float = DEFAULT_TOP_SPAN_SECONDS):
+        self.capacity = capacity
+        self.span = span
+        self.current = SpaceSaving(capacity)
+        self.previous = SpaceSaving(capacity)
+        self.started = None
+
+    def _maybe_rotate(self, now: float):
+        if self.started is None:
+            self.started = now
+        elif now - self.started >= self.span:
+            # После долгой тишины прошлое поколение тоже устарело
+            self.previous = self.current if now - self.started < 2 * self.span else SpaceSaving(self.capacity)
+            self.current = SpaceSaving(self.capacity)
+            self.started = now
+
+    def add(self, value: str, now: Optional[float] = None):
+        self._maybe_rotate(time.monotonic() if now is None else now)
+        self.current.add(value)
+
+    def top(self, limit: int = 10, now: Optional[float] = None) -> List[Dict]:
+        self._maybe_rotate(time.monotonic() if now is None else now)
+        merged = dict(self.previous.counts)
+        for value, count in self.current.counts.items():
+            merged[value] = merged.get(value, 0) + count
+        ranked = sorted(merged.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [{'value': value, 'count': count} for value, count in ranked]
+
+
+class ChannelStats:
+    """Скорость и уникальные авторы одного канала"""
+
+    def __init__(self):
+        self.rate = RateCounter()
+        self.uniques = WindowedUniques()
+
+
+class ChatAnalytics:
+    """
+    Аналитика объединённого потока сообщений
+
+    add() вызывается объединителем для каждой принятой записи MessageRecord
+    (до свёртки повторов: повторы - тоже активность чата)
+    """
+
+    def __init__(self, top_k: int = DEFAULT_TOP_K, top_span: float = DEFAULT_TOP_SPAN_SECONDS,
+                 hot_factor: float = DEFAULT_HOT_FACTOR, hot_min_rate: float = DEFAULT_HOT_MIN_RATE):
+        self.hot_factor = hot_factor
+        self.hot_min_rate = hot_min_rate
+
+        self.rate = RateCounter()
+        self.session_uniques = HyperLogLog(SESSION_HLL_PRECISION)
+        self.window_uniques = WindowedUniques()
+        self.channels = {}
+
+        self.top_authors = WindowedTopK(top_k, top_span)
+        self.top_emojis = WindowedTopK(top_k, top_span)
+        self.top_ngrams = WindowedTopK(top_k, top_span)
+
+    def add(self, record, now: Optional[float] = None):
+        """Учитывает одно сообщение"""
+        now = time.monotonic() if now is None else now
+        channel_id = record.source.channel_id if record.source is not None else ''
+        author = record.display_name
+
+        stats = self.channels.get(channel_id)
+        if stats is None:
+            stats = self.channels[channel_id] = ChannelStats()
+        stats.rate.add(1, now)
+        stats.uniques.add(author, now)
+
+        self.rate.add(1, now)
+        self.session_uniques.add(author)
+        self.window_uniques.add(author, now)
+        self.top_authors.add(author, now)
+
+        text = record.search_text()
+        for code in _EMOJI_CODE_PATTERN.findall(text):
+            self.top_emojis.add(code, now)
+
+        words = [word for word in _WORD_PATTERN.findall(_EMOJI_CODE_PATTERN.sub(' ', text).casefold())
+                 if word not in STOP_WORDS]
+        # Слово считается один раз на сообщение, чтобы копипаста не забивала топ
+        for word in set(words):
+            self.top_ngrams.add(word, now)
+        for bigram in set(zip(words, words[1:])):
+            self.top_ngrams.add(' '.join(bigram), now)
+
+    def add_many(self, records: Iterable, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        for record in records:
+            self.add(record, now)
+
+    def is_hot(self, rates: Dict[str, float]) -> bool:
+        """Всплеск активности: скорость за 10 с в hot_factor раз выше средней за 5 минут"""
+        return rates['10s'] >= self.hot_min_rate and rates['10s'] >= self.hot_factor * rates['5m']
+
+    def snapshot(self, limit: int = 10, now: Optional[float] = None) -> Dict:
+        """
+        Снимок аналитики для оверлеев и GUI
+
+        Args:
+            limit (int): Размер топов
+
+        Returns:
+            dict: Скорости, уникальные авторы и топы
+        """
+        now = time.monotonic() if now is None else now
+        rates = self.rate.rates(now)
+        channels = {}
+        for channel_id, stats in self.channels.items():
+            channel_rates = stats.rate.rates(now)
+            channels[channel_id] = {
+                'rates': channel_rates,
+                'messages': stats.rate.total,
+                'unique_chatters_5m': stats.uniques.count(now),
+                'hot': self.is_hot(channel_rates)
+            }
+        return {
+            'updated': int(time.time() * 1000),
+            'rates': rates,
+            'messages': self.rate.total,
+            'hot': self.is_hot(rates),
+            'unique_chatters': self.session_uniques.count(),
+            'unique_chatters_5m': self.window_uniques.count(now),
+            'channels': channels,
+            'top_authors': self.top_authors.top(limit, now),
+            'top_emojis': self.top_emojis.top(limit, now),
+            'top_ngrams': self.top_ngrams.top(limit, now)
+        }
+
+    def save(self, path: str = DEFAULT_ANALYTICS_FILE, limit: int = 10) -> bool:
+        """Атомарно записывает снимок в JSON файл"""
+        temp_path = f"{path}.tmp.{os.getpid()}"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.snapshot(limit), f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, path)
+            return True
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить аналитику {path}: {e}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return False
+
+
+def analytics_from_settings(settings: Optional[Dict] = None) -> Optional[ChatAnalytics]:
+    """
+    Создаёт аналитику по chat_settings.json
+
+    Args:
+        settings (dict): Настройки (chat_analytics_enabled, chat_analytics_top_k,
+            chat_analytics_hot_factor, chat_analytics_hot_min_rate)
+
+    Returns:
+        ChatAnalytics: Аналитика или None, если отключена
+    """
+    settings = settings or {}
+    if not settings.get('chat_analytics_enabled', True):
+        return None
+    return ChatAnalytics(
+        top_k=settings.get('chat_analytics_top_k', DEFAULT_TOP_K),
+        hot_factor=settings.get('chat_analytics_hot_factor', DEFAULT_HOT_FACTOR),
+        hot_min_rate=settings.get('chat_analytics_hot_min_rate', DEFAULT_HOT_MIN_RATE)
+    )
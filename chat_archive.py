@@ -0,0 +1,495 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Архив сообщений чата в SQLite
+Все принятые сообщения (а не только последние max_messages из messages.json)
+сохраняются в базу в режиме WAL. Запись идёт фоновым потоком пачками,
+одна транзакция на пачку, поэтому цикл объединения и парсер не ждут диск.
+Чтение (ИИ-мост, диагностика) идёт из любых потоков и процессов параллельно
+с записью: WAL не блокирует читателей.
+
+Полнотекстовый поиск (search) идёт по индексу FTS5, который пополняется
+триггером при вставке сообщения. Индексируется текст без HTML, а эмоджи -
+и картинки, и Unicode - заменяются своими кодами, поэтому ":fire:", "fire"
+и "🔥" находят одни и те же сообщения. Если SQLite собран без FTS5,
+поиск работает через LIKE по тексту (медленнее и без эмоджи-кодов).
+
+Время во всех запросах - миллисекунды, как в поле timestamp сообщений
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import logging
+import threading
+from queue import Queue, Empty
+from typing import Dict, Iterable, List, Optional
+
+from chat_message import plain_text
+from emoji_matcher import EmojiMatcher
+from message_window import UNKNOWN_CHANNEL
+
+logger = logging.getLogger('chat_archive')
+
+# Значения по умолчанию (переопределяются в chat_settings.json)
+DEFAULT_ARCHIVE_PATH = 'chat_archive.db'
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_INTERVAL_MS = 1000
+DEFAULT_QUEUE_LIMIT = 100000
+DEFAULT_PAGE_SIZE = 100
+DEFAULT_SEARCH_LIMIT = 50
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS messages (
+        message_id TEXT NOT NULL,
+        channel TEXT NOT NULL,
+        author TEXT NOT NULL,
+        timestamp INTEGER NOT NULL,
+        type TEXT,
+        text TEXT,
+        data TEXT NOT NULL
+    )""",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_messages_id ON messages(message_id)",
+    "CREATE INDEX IF NOT EXISTS idx_messages_channel_time ON messages(channel, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_messages_author_time ON messages(author, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_messages_time ON messages(timestamp)",
+)
+
+# Повтор ID (например, обновлённый счётчик свёрнутых повторов) перезаписывает сообщение
+_UPSERT = (
+    "INSERT INTO messages (message_id, channel, author, timestamp, type, text, data) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT(message_id) DO UPDATE SET data = excluded.data"
+)
+
+_FTS_SCHEMA = (
+    # Без копии текста (content=''): индекс хранит только токены, сообщения берутся из messages
+    "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+    "body, content='', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN "
+    "INSERT INTO messages_fts (rowid, body) VALUES (new.rowid, chat_search_text(new.text)); END",
+)
+
+_STOP = object()
+
+# Слова запроса: буквы и цифры (как у токенизатора unicode61)
+_TOKEN_PATTERN = re.compile(r'[^\W_]+')
+
+
+def _check_fts5() -> bool:
+    try:
+        conn = sqlite3.connect(':memory:')
+        try:
+            conn.execute("CREATE VIRTUAL TABLE fts_check USING fts5(body)")
+        finally:
+            conn.close()
+        return True
+    except sqlite3.Error:
+        return False
+
+
+FTS_AVAILABLE = _check_fts5()
+
+_shortcode_matcher = None
+
+
+def get_shortcode_matcher() -> EmojiMatcher:
+    """Матчер Unicode-эмоджи -> код (строится по базе эмоджи при первом вызове)"""
+    global _shortcode_matcher
+    if _shortcode_matcher is None:
+        from emoji_database import get_emoji_shortcodes
+        _shortcode_matcher = EmojiMatcher({emoji: f" {code} " for emoji, code in get_emoji_shortcodes().items()})
+    return _shortcode_matcher
+
+
+def search_text(text: str) -> str:
+    """Текст для поискового индекса: без HTML, эмоджи заменены кодами"""
+    return get_shortcode_matcher().replace(plain_text(text or ''))
+
+
+def search_tokens(query: str) -> List[str]:
+    """Слова поискового запроса (после той же нормализации, что и у индекса)"""
+    return _TOKEN_PATTERN.findall(search_text(query).casefold())
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """Открывает соединение с архивом в режиме WAL"""
+    conn = sqlite3.connect(path, timeout=10)
+    # Нужна триггеру поискового индекса при вставке
+    conn.create_function('chat_search_text', 1, search_text)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # В WAL режим NORMAL не портит базу при сбое, теряются лишь последние транзакции
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def message_row(message: Dict, default_channel: str = UNKNOWN_CHANNEL) -> tuple:
+    """Строка таблицы messages для сообщения в формате оверлея"""
+    author = message.get('author') or {}
+    source = message.get('source') or {}
+    return (
+        str(message.get('id')),
+        source.get('channel_id') or default_channel,
+        author.get('name', 'Unknown'),
+        int(message.get('timestamp') or 0),
+        message.get('type'),
+        message.get('text', ''),
+        json.dumps(message, ensure_ascii=False, separators=(',', ':'))
+    )
+
+
+class ChatArchive:
+    """
+    Архив сообщений: фоновая пакетная запись и запросы истории
+
+    submit() никогда не блокирует и не сериализует сообщения (это делает поток
+    записи): при переполнении очереди (диск не успевает) пачка отбрасывается
+    и учитывается в статистике. Переданные сообщения не должны изменяться
+    """
+
+    def __init__(self, path: str = DEFAULT_ARCHIVE_PATH,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval_ms: int = DEFAULT_FLUSH_INTERVAL_MS,
+                 queue_limit: int = DEFAULT_QUEUE_LIMIT,
+                 default_channel: str = UNKNOWN_CHANNEL):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.default_channel = default_channel
+
+        # Очередь ограничена числом сообщений, а не пачек (парсер отдаёт по одному)
+        self.queue = Queue()
+        self.queue_limit = queue_limit
+        self.pending = 0
+        self.pending_lock = threading.Lock()
+        self.thread = None
+        self.local = threading.local()
+
+        # Статистика
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.transactions = 0
+        self.write_ms = 0.0
+
+        conn = connect(path)
+        try:
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            self.fts = FTS_AVAILABLE and self._create_fts(conn)
+            conn.commit()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _create_fts(conn: sqlite3.Connection) -> bool:
+        """Создаёт поисковый индекс; архив без индекса (старой версии) индексируется целиком"""
+        try:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+            ).fetchone()
+            for statement in _FTS_SCHEMA:
+                conn.execute(statement)
+            if not exists:
+                conn.execute(
+                    "INSERT INTO messages_fts (rowid, body) SELECT rowid, chat_search_text(text) FROM messages"
+                )
+            return True
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Поисковый индекс архива недоступен, поиск через LIKE: {e}")
+            return False
+
+    # ------------------------------------------------------------------
+    # Запись
+    # ------------------------------------------------------------------
+
+    def start(self) -> 'ChatArchive':
+        """Запускает поток записи"""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name='chat-archive', daemon=True)
+            self.thread.start()
+        return self
+
+    def submit(self, messages: Iterable[Dict]) -> bool:
+        """
+        Ставит сообщения в очередь записи
+
+        Args:
+            messages: Сообщения в формате оверлея
+
+        Returns:
+            bool: False если очередь переполнена и сообщения отброшены
+        """
+        batch = list(messages)
+        if not batch:
+            return True
+        with self.pending_lock:
+            if self.pending + len(batch) > self.queue_limit:
+                self.dropped += len(batch)
+                return False
+            self.pending += len(batch)
+            self.submitted += len(batch)
+        self.queue.put_nowait(batch)
+        return True
+
+    def _run(self):
+        conn = connect(self.path)
+        try:
+            stopping = False
+            while not stopping:
+                try:
+                    batch = self.queue.get(timeout=self.flush_interval)
+                except Empty:
+                    continue
+                if batch is _STOP:
+                    break
+
+                # Добираем всё, что накопилось, до batch_size сообщений
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    try:
+                        more = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+                    except Empty:
+                        break
+                    if more is _STOP:
+                        stopping = True
+                        break
+                    batch.extend(more)
+
+                with self.pending_lock:
+                    self.pending -= len(batch)
+                self._write(conn, [message_row(message, self.default_channel) for message in batch])
+        finally:
+            conn.close()
+
+    def _write(self, conn: sqlite3.Connection, rows: List[tuple]):
+        started = time.perf_counter()
+        try:
+            with conn:
+                conn.executemany(_UPSERT, rows)
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка записи {len(rows)} сообщений в архив {self.path}: {e}")
+            self.dropped += len(rows)
+            return
+        self.write_ms += (time.perf_counter() - started) * 1000
+        self.written += len(rows)
+        self.transactions += 1
+
+    def close(self, timeout: float = 5.0):
+        """Дописывает очередь и останавливает поток записи"""
+        if self.thread is None:
+            return
+        self.queue.put(_STOP)
+        self.thread.join(timeout=timeout)
+        if self.thread.is_alive():
+            logger.warning(f"⚠️ Архив не успел записать очередь за {timeout}s при остановке")
+        self.thread = None
+
+    # ------------------------------------------------------------------
+    # Запросы
+    # ------------------------------------------------------------------
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = connect(self.path)
+        return conn
+
+    def query(self, since: Optional[int] = None, until: Optional[int] = None,
+              channel: Optional[str] = None, author: Optional[str] = None,
+              limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+              newest_first: bool = False) -> Dict:
+        """
+        Страница сообщений архива
+
+        Args:
+            since (int): Не раньше этого времени (мс)
+            until (int): Раньше этого времени (мс)
+            channel (str): ID канала
+            author (str): Имя автора
+            limit (int): Размер страницы
+            cursor (str): next_cursor предыдущей страницы
+            newest_first (bool): Сначала новые сообщения
+
+        Returns:
+            dict: {'messages': [...], 'next_cursor': str или None}
+        """
+        conditions = []
+        params = []
+        if since is not None:
+            conditions.append("timestamp >= ?")
+            params.append(int(since))
+        if until is not None:
+            conditions.append("timestamp < ?")
+            params.append(int(until))
+        if channel is not None:
+            conditions.append("channel = ?")
+            params.append(channel)
+        if author is not None:
+            conditions.append("author = ?")
+            params.append(author)
+        if cursor:
+            # Курсор - позиция последней строки страницы (timestamp:rowid)
+            cursor_time, cursor_row = (int(part) for part in cursor.split(':', 1))
+            conditions.append("(timestamp, rowid) < (?, ?)" if newest_first else "(timestamp, rowid) > (?, ?)")
+            params.extend((cursor_time, cursor_row))
+
+        order = 'DESC' if newest_first else 'ASC'
+        sql = "SELECT rowid, timestamp, data FROM messages"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += f" ORDER BY timestamp {order}, rowid {order} LIMIT ?"
+        params.append(int(limit))
+
+        try:
+            rows = self._reader().execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка запроса к архиву {self.path}: {e}")
+            return {'messages': [], 'next_cursor': None}
+
+        next_cursor = f"{rows[-1][1]}:{rows[-1][0]}" if len(rows) == limit else None
+        return {'messages': [json.loads(data) for _, _, data in rows], 'next_cursor': next_cursor}
+
+    def since(self, timestamp: int, channel: Optional[str] = None,
+              limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None) -> Dict:
+        """Сообщения начиная с timestamp (мс), от старых к новым"""
+        return self.query(since=timestamp, channel=channel, limit=limit, cursor=cursor)
+
+    def by_author(self, author: str, since: Optional[int] = None,
+                  limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None) -> Dict:
+        """Сообщения автора, от новых к старым"""
+        return self.query(since=since, author=author, limit=limit, cursor=cursor, newest_first=True)
+
+    def by_channel(self, channel: str, since: Optional[int] = None,
+                   limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None) -> Dict:
+        """Сообщения канала, от новых к старым"""
+        return self.query(since=since, channel=channel, limit=limit, cursor=cursor, newest_first=True)
+
+    def recent(self, limit: int = 50, since: Optional[int] = None) -> List[Dict]:
+        """Последние limit сообщений (в хронологическом порядке)"""
+        page = self.query(since=since, limit=limit, newest_first=True)
+        return list(reversed(page['messages']))
+
+    def search(self, query: str, since: Optional[int] = None, channel: Optional[str] = None,
+               author: Optional[str] = None, limit: int = DEFAULT_SEARCH_LIMIT) -> List[Dict]:
+        """
+        Полнотекстовый поиск по архиву
+
+        Args:
+            query (str): Слова запроса (все должны встретиться; каждое ищется как префикс),
+                эмоджи и их коды допустимы
+            since (int): Не раньше этого времени (мс)
+            channel (str): ID канала
+            author (str): Имя автора
+            limit (int): Максимум результатов
+
+        Returns:
+            list: Найденные сообщения, от последних записанных в архив к ранним
+        """
+        tokens = search_tokens(query)
+        if not tokens:
+            return []
+
+        # Совпадения перебираются от последних вставленных (rowid по убыванию),
+        # поэтому LIMIT останавливает поиск, не сортируя все совпадения
+        if self.fts:
+            sql = ("SELECT m.data FROM messages_fts JOIN messages m ON m.rowid = messages_fts.rowid "
+                   "WHERE messages_fts MATCH ?")
+            params = [' '.join(f'"{token}"*' for token in tokens)]
+            order_column = 'messages_fts.rowid'
+        else:
+            # Слова запроса состоят из букв и цифр, экранировать для LIKE нечего
+            sql = "SELECT m.data FROM messages m WHERE " + " AND ".join("m.text LIKE ?" for _ in tokens)
+            params = [f"%{token}%" for token in tokens]
+            order_column = 'm.rowid'
+
+        if since is not None:
+            # Граница по rowid отсекает старую часть индекса ещё до чтения сообщений
+            sql += f" AND {order_column} >= (SELECT MIN(rowid) FROM messages WHERE timestamp >= ?) AND m.timestamp >= ?"
+            params.extend((int(since), int(since)))
+        if channel is not None:
+            sql += " AND m.channel = ?"
+            params.append(channel)
+        if author is not None:
+            sql += " AND m.author = ?"
+            params.append(author)
+        sql += f" ORDER BY {order_column} DESC LIMIT ?"
+        params.append(int(limit))
+
+        try:
+            rows = self._reader().execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка поиска в архиве {self.path}: {e}")
+            return []
+        return [json.loads(data) for (data,) in rows]
+
+    def count(self, since: Optional[int] = None) -> Dict[str, int]:
+        """Число сообщений по каналам (с момента since, мс)"""
+        sql = "SELECT channel, COUNT(*) FROM messages"
+        params = []
+        if since is not None:
+            sql += " WHERE timestamp >= ?"
+            params.append(int(since))
+        sql += " GROUP BY channel"
+        try:
+            return dict(self._reader().execute(sql, params).fetchall())
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка запроса к архиву {self.path}: {e}")
+            return {}
+
+    def get_stats(self) -> Dict:
+        """Возвращает статистику записи"""
+        return {
+            'submitted': self.submitted,
+            'written': self.written,
+            'dropped': self.dropped,
+            'pending': self.pending,
+            'transactions': self.transactions,
+            'avg_transaction_ms': round(self.write_ms / self.transactions, 2) if self.transactions else 0.0
+        }
+
+
+def archive_from_settings(settings: Optional[Dict] = None) -> Optional[ChatArchive]:
+    """
+    Создаёт и запускает архив по chat_settings.json
+
+    Args:
+        settings (dict): Настройки (chat_archive_enabled, chat_archive_path,
+            chat_archive_batch_size, chat_archive_flush_interval_ms)
+
+    Returns:
+        ChatArchive: Запущенный архив или None (отключён или база недоступна)
+    """
+    settings = settings or {}
+    if not settings.get('chat_archive_enabled', True):
+        return None
+    try:
+        return ChatArchive(
+            path=settings.get('chat_archive_path', DEFAULT_ARCHIVE_PATH),
+            batch_size=settings.get('chat_archive_batch_size', DEFAULT_BATCH_SIZE),
+            flush_interval_ms=settings.get('chat_archive_flush_interval_ms', DEFAULT_FLUSH_INTERVAL_MS)
+        ).start()
+    except sqlite3.Error as e:
+        logger.error(f"Не удалось открыть архив чата: {e}")
+        return None
+
+
+def open_archive(settings: Optional[Dict] = None) -> Optional[ChatArchive]:
+    """
+    Открывает существующий архив только для запросов (без потока записи)
+
+    Returns:
+        ChatArchive: Архив или None, если файла архива нет
+    """
+    settings = settings or {}
+    path = settings.get('chat_archive_path', DEFAULT_ARCHIVE_PATH)
+    if not os.path.exists(path):
+        return None
+    try:
+        return ChatArchive(path)
+    except sqlite3.Error as e:
+        logger.error(f"Не удалось открыть архив чата {path}: {e}")
+        return None
@@ -10,6 +10,7 @@ import subprocess
 import threading
 import webbrowser
 import time
+from columnar_store import read_summary
 
 def setup_logging():
     """Настраивает детальное логирование в файл"""
@@ -38,6 +39,7 @@ class YouTubeChatGUISimple:
         # Переменные для процессов
         self.parser_process = None
         self.server_process = None
+        self.activity_mtime = None
         
         # Словарь для отслеживания процессов отдельных каналов
         # Ключ: префикс канала, Значение: subprocess.Popen объект
@@ -86,12 +88,33 @@ class YouTubeChatGUISimple:
             else:
                 self.server_status_label.config(text="HTTP сервер: Остановлен", foreground="red")
             
+            self.update_activity()
             logging.debug("Статус процессов обновлен.")
         except Exception as e:
             logging.error(f"Ошибка в check_process_status: {e}", exc_info=True)
         
         # Повторяем проверку через 2 секунды
         self.root.after(2000, self.check_process_status)
+    
+    def update_activity(self):
+        """Обновляет строку активности чата по снимку колонок координатора (chat_columns.npz)"""
+        try:
+            mtime = os.path.getmtime('chat_columns.npz')
+        except OSError:
+            return
+        # Снимок перечитывается только после его обновления координатором
+        if mtime == self.activity_mtime:
+            return
+        self.activity_mtime = mtime
+        
+        summary = read_summary('chat_columns.npz', seconds=60)
+        if summary is None:
+            return
+        delay = summary['pipeline_delay_ms'].get('p90')
+        text = f"Активность чата: {summary['rate']} сообщ./с за минуту"
+        if delay is not None:
+            text += f", задержка конвейера p90 {delay / 1000:.1f} с"
+        self.activity_label.config(text=text, foreground="black")
         
     def load_default_settings(self):
         logging.debug("Загрузка настроек по умолчанию...")
@@ -388,6 +411,9 @@ class YouTubeChatGUISimple:
         self.server_status_label = ttk.Label(status_group, text="HTTP сервер: Остановлен", foreground="red")
         self.server_status_label.pack(anchor='w', pady=2)
         
+        self.activity_label = ttk.Label(status_group, text="Активность чата: нет данных", foreground="gray")
+        self.activity_label.pack(anchor='w', pady=2)
+        
         # Управление
         control_group = ttk.LabelFrame(parent, text="Управление системой", padding=10)
         control_group.pack(fill='x', padx=10, pady=5)
@@ -524,10 +550,10 @@ class YouTubeChatGUISimple:
         try:
             self.log("🚀 Запуск HTTP сервера...")
             
-            # Запускаем надежный встроенный HTTP сервер через venv Python
+            # Запускаем сервер оверлея через venv Python (статика + push-поток /events)
             venv_python = os.path.join(os.path.dirname(os.path.abspath(__file__)), "venv", "Scripts", "python.exe")
             self.server_process = subprocess.Popen(
-                [venv_python, "-m", "http.server", str(self.settings['server_port'])],
+                [venv_python, "simple_server.py", str(self.settings['server_port'])],
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
                 text=True,
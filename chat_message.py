@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Компактная модель сообщений мульти-чата
+Сообщения окна координатора хранятся объектами со __slots__, а повторяющиеся
+данные разделяются: одинаковые авторы интернируются в AuthorTable,
+источник канала - один ChannelSource на канал. В JSON формата оверлея
+сообщение превращается только на выходе (снимок, журнал) через to_dict()
+"""
+
+import re
+import weakref
+from typing import Dict, Optional, Tuple
+
+from message_window import UNKNOWN_CHANNEL
+
+# Поля сообщения, которые хранятся в слотах; остальные попадают в extra
+_MESSAGE_FIELDS = ('id', 'text', 'author', 'timestamp', 'source', 'seq', 'type', 'amount',
+                   'repeat_count', 'repeat_authors')
+
+# Типы событий, которые идут приоритетной полосой (см. chat_parser_pytchat.EVENT_TYPES)
+PRIORITY_EVENT_TYPES = ('superchat', 'supersticker', 'membership')
+
+# Аватар по умолчанию, как в парсерах
+DEFAULT_AVATAR = 'https://via.placeholder.com/32x32?text=👤'
+
+# Эмоджи-картинки в тексте сообщения заменяются их кодом (alt), остальные теги отбрасываются
+_IMG_ALT_PATTERN = re.compile(r'<img\b[^>]*?\balt="([^"]*)"[^>]*>', re.IGNORECASE)
+_TAG_PATTERN = re.compile(r'<[^>]+>')
+
+
+def plain_text(text: str) -> str:
+    """Текст сообщения без HTML: картинки эмоджи заменяются их кодом"""
+    if not text or '<' not in text:
+        return text or ''
+    return _TAG_PATTERN.sub(' ', _IMG_ALT_PATTERN.sub(r' \1 ', text))
+
+
+def channel_key(channel: Dict) -> str:
+    """ID канала мульти-чата по его префиксу ("[KM]" -> "km")"""
+    return channel['prefix'].replace('[', '').replace(']', '').lower()
+
+
+class ChannelSource:
+    """Метаданные канала, общие для всех его сообщений"""
+
+    __slots__ = ('platform', 'channel_id', 'channel_name', 'prefix', '_dict')
+
+    def __init__(self, channel_id: str, channel_name: str, prefix: str, platform: str = 'youtube'):
+        self.platform = platform
+        self.channel_id = channel_id
+        self.channel_name = channel_name
+        self.prefix = prefix
+        self._dict = None
+
+    @classmethod
+    def from_channel(cls, channel: Dict) -> 'ChannelSource':
+        """Создаёт источник из конфигурации канала (multichat_channels)"""
+        return cls(channel_key(channel), channel['name'], channel['prefix'])
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ChannelSource':
+        """Создаёт источник из поля source сообщения"""
+        return cls(
+            channel_id=data.get('channel_id', ''),
+            channel_name=data.get('channel_name', ''),
+            prefix=data.get('prefix', ''),
+            platform=data.get('platform', 'youtube')
+        )
+
+    def to_dict(self) -> Dict:
+        """Словарь source в формате оверлея (общий для всех сообщений, не изменять)"""
+        if self._dict is None:
+            self._dict = {
+                'platform': self.platform,
+                'channel_id': self.channel_id,
+                'channel_name': self.channel_name,
+                'prefix': self.prefix
+            }
+        return self._dict
+
+
+class Author:
+    """Автор сообщения; экземпляры неизменяемы и разделяются между сообщениями"""
+
+    __slots__ = ('name', 'avatar', 'is_sponsor', 'is_moderator', 'is_owner', 'badges', '_dict', '__weakref__')
+
+    def __init__(self, name: str, avatar: str, is_sponsor: bool, is_moderator: bool, is_owner: bool,
+                 badges: Tuple[Tuple[str, str, str], ...] = ()):
+        self.name = name
+        self.avatar = avatar
+        self.is_sponsor = is_sponsor
+        self.is_moderator = is_moderator
+        self.is_owner = is_owner
+        # Значки хранятся кортежами (type, title, icon)
+        self.badges = badges
+        self._dict = None
+
+    def to_dict(self) -> Dict:
+        """Словарь author в формате оверлея (общий для всех сообщений автора, не изменять)"""
+        if self._dict is None:
+            self._dict = {
+                'name': self.name,
+                'avatar': self.avatar,
+                'is_sponsor': self.is_sponsor,
+                'is_moderator': self.is_moderator,
+                'is_owner': self.is_owner,
+                'badges': [{'type': badge_type, 'title': title, 'icon': icon}
+                           for badge_type, title, icon in self.badges]
+            }
+        return self._dict
+
+
+class AuthorTable:
+    """
+    Таблица интернированных авторов
+
+    Ключ - все поля автора, поэтому смена ролей или аватара даёт новую запись.
+    Записи хранятся по слабым ссылкам и исчезают, когда последнее сообщение
+    автора вытеснено из окна
+    """
+
+    def __init__(self):
+        self.authors = weakref.WeakValueDictionary()
+        self.lookups = 0
+        self.hits = 0
+
+    def __len__(self):
+        return len(self.authors)
+
+    def intern(self, data: Dict) -> Author:
+        """
+        Возвращает общий объект автора для словаря author сообщения
+
+        Args:
+            data (dict): Поле author в формате парсера
+
+        Returns:
+            Author: Существующий или новый автор
+        """
+        badges = tuple(
+            (badge.get('type', ''), badge.get('title', ''), badge.get('icon', ''))
+            for badge in data.get('badges') or ()
+        )
+        key = (
+            data.get('name', 'Unknown'),
+            data.get('avatar') or DEFAULT_AVATAR,
+            bool(data.get('is_sponsor')),
+            bool(data.get('is_moderator')),
+            bool(data.get('is_owner')),
+            badges
+        )
+
+        self.lookups += 1
+        author = self.authors.get(key)
+        if author is not None:
+            self.hits += 1
+            return author
+
+        author = Author(*key)
+        self.authors[key] = author
+        return author
+
+    def get_stats(self) -> Dict:
+        """Возвращает статистику таблицы"""
+        return {
+            'authors': len(self.authors),
+            'lookups': self.lookups,
+            'hits': self.hits
+        }
+
+
+class MessageRecord:
+    """
+    Сообщение окна мульти-чата
+
+    Хранит ссылки на общие Author и ChannelSource; поля, неизвестные модели,
+    сохраняются в extra и возвращаются в to_dict() без изменений.
+    type - тип события ('text', 'superchat', 'supersticker', 'membership'),
+    amount - сумма платного события,
+    repeat_count/repeat_authors - число свёрнутых повторов и выборка их авторов (см. spam_aggregator)
+    """
+
+    __slots__ = ('id', 'text', 'author', 'timestamp', 'source', 'seq', 'type', 'amount',
+                 'repeat_count', 'repeat_authors', 'extra', '_search_text')
+
+    def __init__(self, message_id: str, text: str, author: Author, timestamp: int,
+                 source: Optional[ChannelSource] = None, seq: Optional[int] = None,
+                 extra: Optional[Dict] = None, message_type: Optional[str] = None,
+                 amount: Optional[Dict] = None, repeat_count: Optional[int] = None,
+                 repeat_authors: Tuple[str, ...] = ()):
+        self.id = message_id
+        self.text = text
+        self.author = author
+        self.timestamp = timestamp
+        self.source = source
+        self.seq = seq
+        self.type = message_type
+        self.amount = amount
+        self.repeat_count = repeat_count
+        self.repeat_authors = repeat_authors
+        self.extra = extra
+        self._search_text = None
+
+    @classmethod
+    def from_dict(cls, data: Dict, authors: AuthorTable,
+                  source: Optional[ChannelSource] = None) -> 'MessageRecord':
+        """
+        Создаёт запись из сообщения парсера
+
+        Args:
+            data (dict): Сообщение в формате build_message()
+            authors (AuthorTable): Таблица для интернирования автора
+            source (ChannelSource): Источник канала; по умолчанию берётся из поля source
+
+        Returns:
+            MessageRecord: Запись, не разделяющая изменяемых данных с data
+        """
+        if source is None and data.get('source'):
+            source = ChannelSource.from_dict(data['source'])
+
+        extra = {key: value for key, value in data.items() if key not in _MESSAGE_FIELDS}
+        return cls(
+            message_id=data.get('id'),
+            text=data.get('text', ''),
+            author=authors.intern(data.get('author') or {}),
+            timestamp=data.get('timestamp', 0),
+            source=source,
+            seq=data.get('seq'),
+            extra=extra or None,
+            message_type=data.get('type'),
+            amount=data.get('amount'),
+            repeat_count=data.get('repeat_count'),
+            repeat_authors=tuple(data.get('repeat_authors') or ())
+        )
+
+    @property
+    def priority(self) -> bool:
+        """Высокоценное событие: платное, членство, сообщение владельца или модератора"""
+        return (self.type in PRIORITY_EVENT_TYPES
+                or self.author.is_owner or self.author.is_moderator)
+
+    def search_text(self) -> str:
+        """
+        Нормализованный текст (без HTML, эмоджи заменены кодами, см. chat_archive.search_text)
+
+        Вычисляется один раз и разделяется аналитикой, тональностью и колонками
+        """
+        if self._search_text is None:
+            # chat_archive импортирует этот модуль, поэтому импорт отложенный
+            from chat_archive import search_text
+            self._search_text = search_text(self.text)
+        return self._search_text
+
+    @property
+    def display_name(self) -> str:
+        """Имя автора с префиксом канала"""
+        if self.source is not None and self.source.prefix:
+            return f"{self.source.prefix} {self.author.name}"
+        return self.author.name
+
+    def to_dict(self) -> Dict:
+        """Сериализует сообщение в формат оверлея"""
+        author = self.author.to_dict()
+        if self.source is not None:
+            author = dict(author, display_name=self.display_name)
+
+        data = {
+            'id': self.id,
+            'text': self.text,
+            'author': author,
+            'timestamp': self.timestamp
+        }
+        if self.source is not None:
+            data['source'] = self.source.to_dict()
+        if self.type is not None:
+            data['type'] = self.type
+        if self.amount is not None:
+            data['amount'] = self.amount
+        if self.repeat_count:
+            data['repeat_count'] = self.repeat_count
+            data['repeat_authors'] = list(self.repeat_authors)
+        if self.extra:
+            data.update(self.extra)
+        if self.seq is not None:
+            data['seq'] = self.seq
+        return data
+
+
+# Функции доступа для MessageWindow(key=..., identity=..., channel=...)
+
+def record_timestamp(record: MessageRecord):
+    """Ключ сортировки записей"""
+    return record.timestamp
+
+
+def record_identity(record: MessageRecord):
+    """ID записи для дедупликации"""
+    return record.id
+
+
+def record_channel(record: MessageRecord) -> str:
+    """Канал записи"""
+    return record.source.channel_id if record.source is not None else UNKNOWN_CHANNEL
@@ -7,11 +7,15 @@ YouTube Chat Parser с поддержкой OAuth
 import sys
 import os
 import json
+import re
 import time
 import argparse
 import logging
 from datetime import datetime
+from chat_archive import archive_from_settings
+from dedupe_store import dedupe_from_settings
 from emoji_database import convert_emojis, get_emoji_count
+from message_journal import CoalescingWriter, MessageJournal, clear_journal
 
 # =============================================================================
 # ЛОГИРОВАНИЕ
@@ -128,18 +132,18 @@ def clear_old_messages(filename='messages.json'):
             json.dump([], f, ensure_ascii=False, indent=2)
     except Exception as e:
         logger.error(f"Не удалось очистить {filename}: {e}")
+    clear_journal(filename)
+
+# inline-стили и размеры в <img> тегах эмоджи (один проход вместо трёх re.sub)
+INLINE_STYLE_PATTERN = re.compile(r'\s+(?:style|width|height)="[^"]*"')
 
 def process_emojis(text):
     """Обрабатывает эмоджи в тексте и удаляет inline-стили"""
-    import re
+    # Повторяющиеся тексты берутся из LRU-кэша базы эмоджи
     result = convert_emojis(text, performance_mode='channel')
     
     # АГРЕССИВНО удаляем inline-стили из всех <img> тегов
-    result = re.sub(r'\s+style="[^"]*"', '', result)
-    result = re.sub(r'\s+width="[^"]*"', '', result)
-    result = re.sub(r'\s+height="[^"]*"', '', result)
-    
-    return result
+    return INLINE_STYLE_PATTERN.sub('', result)
 
 def load_existing_messages(filename='messages.json'):
     """Загружает существующие сообщения"""
@@ -185,6 +189,12 @@ def save_messages(messages, filename='messages.json', max_retries=10):
                     continue
                 break
             except Exception as inner:
+                # Недописанный временный файл не оставляем рядом со снимком
+                if os.path.exists(temp_filename):
+                    try:
+                        os.remove(temp_filename)
+                    except Exception:
+                        pass
                 if attempt == max_retries:
                     logger.warning(f"⚠️ Не удалось сохранить {filename} атомарно (попытка {attempt}/{max_retries}): {inner}")
                     try:
@@ -296,7 +306,30 @@ def main():
     write_status("CONNECTING")
     logger.info("Подключение к чату...")
     
-    messages, seen_message_ids = load_existing_messages(args.output)
+    messages, loaded_ids = load_existing_messages(args.output)
+    
+    # ID помнятся dedupe_retention_seconds независимо от max_messages
+    seen_message_ids = dedupe_from_settings(settings)
+    seen_message_ids.update(loaded_ids)
+    
+    # Новые сообщения дописываются в журнал, а снимок рендерится с троттлингом
+    journal = MessageJournal(
+        args.output,
+        snapshot_writer=save_messages,
+        max_messages=max_messages,
+        snapshot_interval_ms=settings.get('snapshot_interval_ms', 500)
+    )
+    
+    # Запись на диск идёт в отдельном потоке пачками, цикл чтения чата не ждёт файлы
+    writer = CoalescingWriter(
+        journal,
+        status_writer=write_status,
+        max_latency_ms=settings.get('writer_max_latency_ms', 100),
+        max_batch=settings.get('writer_max_batch', 50)
+    )
+    
+    # Вся история трансляции пишется в архив SQLite фоновым потоком
+    archive = archive_from_settings(settings)
     
     try:
         from chat_downloader import ChatDownloader
@@ -357,21 +390,19 @@ def main():
                     'timestamp': timestamp
                 }
                 
+                # seq назначается до публикации в общий список: снимок сериализует его в другом потоке
+                journal.assign_seq(message_obj)
                 messages.append(message_obj)
                 seen_message_ids.add(message_id)
                 
                 # Ограничиваем количество
                 if len(messages) > max_messages:
-                    overflow = len(messages) - max_messages
-                    for _ in range(overflow):
-                        removed = messages.pop(0)
-                        removed_id = removed.get('id')
-                        if removed_id:
-                            seen_message_ids.discard(removed_id)
+                    del messages[:len(messages) - max_messages]
                 
-                # Сохраняем
-                save_messages(messages, args.output)
-                write_status(f"RUNNING: {len(messages)} messages")
+                # Журнал, снимок и статус пишутся фоновым потоком одной пачкой
+                writer.submit(message_obj, messages, f"RUNNING: {len(messages)} messages")
+                if archive is not None:
+                    archive.submit((message_obj,))
                 
             except Exception as e:
                 logger.error(f"Ошибка обработки сообщения: {e}")
@@ -385,8 +416,14 @@ def main():
         write_status(error_message)
         logger.critical(f"Критическая ошибка: {e}", exc_info=True)
     finally:
+        writer.close()
+        stats = writer.get_stats()
+        logger.info(f"Фоновая запись: {stats['messages_written']} сообщений за {stats['flushes']} сбросов, сэкономлено {stats['writes_saved']} записей")
         if messages:
-            save_messages(messages, args.output)
+            journal.flush_snapshot(messages)
+        journal.close()
+        if archive is not None:
+            archive.close()
         write_status("FINISHED")
         logger.info("Парсер завершил работу.")
 
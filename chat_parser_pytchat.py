@@ -5,11 +5,19 @@ import sys
 import os
 import pytchat
 import json
+import re
 import time
 import argparse
+import asyncio
 import logging
 from datetime import datetime
-from emoji_database import convert_emojis, get_emoji_count
+from chat_archive import archive_from_settings
+from emoji_database import convert_emojis, get_emoji_count, get_emoji_version
+from dedupe_store import dedupe_from_settings
+from message_journal import CoalescingWriter, MessageJournal, clear_journal
+from parser_checkpoint import ParserCheckpoint
+from poll_scheduler import scheduler_from_settings
+from shm_ring import ShmRing
 
 # =============================================================================
 # ЛОГИРОВАНИЕ
@@ -60,21 +68,32 @@ def clear_old_messages(filename='messages.json'):
             json.dump([], f, ensure_ascii=False, indent=2)
     except Exception as e:
         logger.error(f"Не удалось очистить {filename}: {e}")
+    clear_journal(filename)
 
 EMOJI_DEBUGGED_IDS = set()
 
 
+# Типы событий pytchat -> тип сообщения оверлея (неизвестные считаются обычным текстом)
+EVENT_TYPES = {
+    'textMessage': 'text',
+    'superChat': 'superchat',
+    'superSticker': 'supersticker',
+    'newSponsor': 'membership'
+}
+
+# Платные события, для которых сохраняется сумма
+PAID_EVENT_TYPES = ('superchat', 'supersticker')
+
+# inline-стили и размеры в <img> тегах эмоджи (один проход вместо трёх re.sub)
+INLINE_STYLE_PATTERN = re.compile(r'\s+(?:style|width|height)="[^"]*"')
+
 def process_emojis(text):
     """Обрабатывает эмоджи в тексте и удаляет inline-стили"""
-    import re
+    # Повторяющиеся тексты берутся из LRU-кэша базы эмоджи
     result = convert_emojis(text, performance_mode='channel')
     
     # АГРЕССИВНО удаляем inline-стили из всех <img> тегов
-    result = re.sub(r'\s+style="[^"]*"', '', result)
-    result = re.sub(r'\s+width="[^"]*"', '', result)
-    result = re.sub(r'\s+height="[^"]*"', '', result)
-    
-    return result
+    return INLINE_STYLE_PATTERN.sub('', result)
 
 def load_existing_messages(filename='messages.json'):
     """
@@ -207,6 +226,12 @@ def save_messages(messages, filename='messages.json', max_retries=10):
                     continue
                 break
             except Exception as inner:
+                # Недописанный временный файл не оставляем рядом со снимком
+                if os.path.exists(temp_filename):
+                    try:
+                        os.remove(temp_filename)
+                    except Exception:
+                        pass
                 if attempt == max_retries:
                     logger.warning(f"⚠️ Не удалось сохранить {filename} атомарно (попытка {attempt}/{max_retries}): {inner}. Пробуем прямую запись.")
                     try:
@@ -220,13 +245,16 @@ def save_messages(messages, filename='messages.json', max_retries=10):
     except Exception as e:
         logger.error(f"Не удалось сохранить сообщения в {filename}: {e}")
 
+# Файл статуса (под координатором у каждого канала свой, см. --status-file)
+status_file = 'parser_status.txt'
+
 def write_status(status):
     """Записывает статус в файл для GUI"""
     try:
-        with open('parser_status.txt', 'w', encoding='utf-8') as f:
+        with open(status_file, 'w', encoding='utf-8') as f:
             f.write(status)
     except Exception as e:
-        logger.error(f"Не удалось записать статус в parser_status.txt: {e}")
+        logger.error(f"Не удалось записать статус в {status_file}: {e}")
 
 def extract_video_id(url):
     """Извлекает video ID из различных форматов YouTube URL"""
@@ -250,15 +278,174 @@ def extract_video_id(url):
     
     return None
 
+def connect_chat(video_id, interruptable=True):
+    """
+    Создаёт сессию PyTChat, при блокировке пробует cookies из файла
+    
+    Args:
+        video_id (str): ID трансляции
+        interruptable (bool): Перехватывать SIGINT (только для главного потока)
+    """
+    try:
+        logger.info("Попытка подключения без cookies...")
+        return pytchat.create(video_id, interruptable=interruptable)
+    except Exception as e:
+        logger.warning(f"Не удалось подключиться без cookies: {e}")
+        logger.info("Попытка подключения с cookies из файла...")
+        
+        # Пробуем загрузить cookies из файла
+        cookies_path = 'youtube_cookies.txt'
+        if os.path.exists(cookies_path):
+            logger.info(f"Найден файл cookies: {cookies_path}")
+            return pytchat.create(video_id, cookies=cookies_path, interruptable=interruptable)
+        else:
+            logger.error("=" * 60)
+            logger.error("ТРЕБУЕТСЯ АУТЕНТИФИКАЦИЯ YOUTUBE!")
+            logger.error("=" * 60)
+            logger.error("YouTube блокирует доступ к чату без аутентификации.")
+            logger.error("")
+            logger.error("Для решения проблемы нужно:")
+            logger.error("1. Установить расширение 'Get cookies.txt LOCALLY'")
+            logger.error("   Chrome: https://chrome.google.com/webstore/detail/get-cookiestxt-locally/cclelndahbckbenkjhflpdbgdldlbecc")
+            logger.error("   Firefox: https://addons.mozilla.org/en-US/firefox/addon/cookies-txt/")
+            logger.error("")
+            logger.error("2. Открыть youtube.com и войти в свой аккаунт")
+            logger.error("3. Экспортировать cookies через расширение")
+            logger.error("4. Сохранить файл как 'youtube_cookies.txt' в папку:")
+            logger.error(f"   {os.path.abspath('.')}")
+            logger.error("=" * 60)
+            raise
+
+def build_message(c, seen_ids=None):
+    """
+    Формирует объект сообщения из элемента PyTChat в формате оверлея
+    
+    Возвращает None, если сообщение с таким ID уже есть в seen_ids
+    """
+    author_name = c.author.name
+    
+    # Извлекаем текст сообщения (включая эмоджи)
+    message_text = extract_message_text(c)
+    
+    # Логируем сообщения с потенциальными эмодзи для отладки
+    if logger.isEnabledFor(logging.DEBUG) and message_text and any(ord(char) > 0x1F000 for char in message_text[:50]):  # Проверяем на эмодзи в первых 50 символах
+        logger.debug(f"Сообщение с эмодзи от {author_name}: {message_text[:100]}")
+    
+    # Также пробуем получить текст напрямую из message, если messageEx не дал результата
+    if not message_text or len(message_text.strip()) == 0:
+        direct_message = getattr(c, 'message', None)
+        if direct_message and direct_message != message_text:
+            logger.info(f"Фолбэк: используем прямой message для {author_name}: {direct_message[:100]}")
+            message_text = direct_message
+    
+    # Используем текущее время в миллисекундах для совместимости с JavaScript Date.now()
+    timestamp = int(time.time() * 1000)
+    message_id = c.id if hasattr(c, 'id') else f"{timestamp}_{author_name}"
+
+    # Пропускаем уже сохраненные сообщения
+    if seen_ids is not None and message_id in seen_ids:
+        return None
+    
+    # URL аватара
+    avatar_url = c.author.imageUrl if hasattr(c.author, 'imageUrl') else 'https://via.placeholder.com/32x32?text=👤'
+    
+    # Определяем роли пользователя
+    is_sponsor = c.author.isChatSponsor if hasattr(c.author, 'isChatSponsor') else False
+    is_moderator = c.author.isChatModerator if hasattr(c.author, 'isChatModerator') else False
+    is_owner = c.author.isChatOwner if hasattr(c.author, 'isChatOwner') else False
+    
+    # Обрабатываем значки (badges)
+    user_badges = []
+    if hasattr(c.author, 'badgeUrl') and c.author.badgeUrl:
+        badge_type = 'badge'
+        if is_sponsor:
+            badge_type = 'member'
+        elif is_moderator:
+            badge_type = 'moderator'
+        elif is_owner:
+            badge_type = 'owner'
+        
+        user_badges.append({
+            'type': badge_type,
+            'title': badge_type.capitalize(),
+            'icon': c.author.badgeUrl
+        })
+    
+    # Обрабатываем эмоджи
+    processed_text = process_emojis(message_text) if message_text else ""
+    
+    event_type = EVENT_TYPES.get(getattr(c, 'type', 'textMessage'), 'text')
+    
+    message_obj = {
+        'id': message_id,
+        'text': processed_text,
+        'author': {
+            'name': author_name,
+            'avatar': avatar_url,
+            'is_sponsor': is_sponsor,
+            'is_moderator': is_moderator,
+            'is_owner': is_owner,
+            'badges': user_badges
+        },
+        'timestamp': timestamp,
+        'type': event_type
+    }
+    
+    # Суперчаты и суперстикеры: сумма в исходной валюте и строка для показа
+    if event_type in PAID_EVENT_TYPES:
+        message_obj['amount'] = {
+            'value': getattr(c, 'amountValue', 0) or 0,
+            'text': getattr(c, 'amountString', '') or '',
+            'currency': getattr(c, 'currency', '') or ''
+        }
+    
+    return message_obj
+
+async def consume_async(video_id, on_message, on_connected=None):
+    """
+    Читает чат через async-итератор и передаёт каждое сообщение в on_message
+    
+    Args:
+        video_id (str): ID видео
+        on_message (callable): Обработчик нормализованного сообщения
+        on_connected (callable): Вызывается после подключения (по умолчанию пишет статус CONNECTED)
+    """
+    from chat_stream import iter_chat_messages, close_shared_client
+    
+    if on_connected is not None:
+        on_connected()
+    else:
+        write_status("CONNECTED")
+    logger.info("Успешно подключено к чату (async).")
+    try:
+        async for message_obj in iter_chat_messages(video_id):
+            try:
+                on_message(message_obj)
+            except Exception as e:
+                logger.error(f"Ошибка обработки сообщения: {e}")
+    finally:
+        await close_shared_client()
+
 def main():
     parser = argparse.ArgumentParser(description='YouTube Chat Parser (PyTChat)')
     parser.add_argument('video_url', nargs='?', help='URL трансляции YouTube')
     parser.add_argument('--output', '-o', default='messages.json', help='Файл для сохранения сообщений')
     parser.add_argument('--interval', '-i', type=float, help='Интервал обновления в секундах')
     parser.add_argument('--clear', '-c', action='store_true', help='Очистить старые сообщения')
+    parser.add_argument('--shm-name', help='Буфер координатора в разделяемой памяти (вместо журнала на диске)')
+    parser.add_argument('--async', dest='use_async', action='store_true', help='Асинхронное чтение чата (pytchat LiveChatAsync) без пауз между запросами')
+    parser.add_argument('--status-file', help='Файл статуса парсера (по умолчанию parser_status.txt)')
+    parser.add_argument('--no-archive', dest='archive', action='store_false', help='Не записывать сообщения в архив (под координатором архив ведёт он)')
     
     args = parser.parse_args()
     
+    # Отсчёт времени восстановления после перезапуска
+    main_started = time.time()
+    
+    global status_file
+    if args.status_file:
+        status_file = args.status_file
+    
     logger.info("Парсер запущен (PyTChat).")
     
     # Получаем URL из аргументов или настроек
@@ -283,6 +470,15 @@ def main():
     logger.info(f"Video ID: {video_id}")
     logger.info(f"Загружено эмоджи: {get_emoji_count()}")
     
+    # Загружаем настройки
+    settings = load_settings()
+    max_messages = settings.get('max_messages', 20)
+    
+    # Контрольная точка прошлого запуска той же трансляции
+    emoji_version = get_emoji_version()
+    checkpoint = ParserCheckpoint(args.output, interval=settings.get('checkpoint_interval', 5))
+    resume_state = None
+    
     # Проверяем, изменился ли URL трансляции
     last_url = load_last_url()
     if last_url != video_url:
@@ -292,155 +488,164 @@ def main():
     elif args.clear:
         logger.info("Принудительная очистка старых сообщений.")
         clear_old_messages(args.output)
+    else:
+        resume_state = checkpoint.load(video_id, emoji_version)
+        if resume_state:
+            logger.info(f"Продолжение с контрольной точки: seq {resume_state.get('last_seq')}, {len(checkpoint.recent_ids)} ID")
     
-    # Загружаем настройки
-    settings = load_settings()
-    update_interval = args.interval or settings.get('update_interval', 2)
-    max_messages = settings.get('max_messages', 20)
+    # Интервал опроса подстраивается под активность чата
+    scheduler = scheduler_from_settings(settings, base_interval=args.interval)
     
     write_status("CONNECTING")
     logger.info("Подключение к чату...")
     
-    messages, seen_message_ids = load_existing_messages(args.output)
-    if messages:
-        # Сохраняем очищенный список (если в исходном файле были дубли)
+    messages, loaded_ids = load_existing_messages(args.output)
+    if messages and not resume_state:
+        # Сохраняем очищенный список (если в исходном файле были дубли);
+        # при продолжении с контрольной точки файл уже записан этим парсером
         save_messages(messages, args.output)
-    else:
-        seen_message_ids = set()
     
-    try:
-        # Создаем объект чата PyTChat с поддержкой cookies
-        # Пробуем сначала без cookies, если не получится - выведем инструкцию
+    # ID помнятся dedupe_retention_seconds независимо от max_messages,
+    # поэтому повторы после переподключения не попадают в чат снова
+    seen_message_ids = dedupe_from_settings(settings)
+    seen_message_ids.update(checkpoint.recent_ids)
+    seen_message_ids.update(loaded_ids)
+    
+    # Новые сообщения дописываются в журнал, а снимок рендерится с троттлингом
+    journal = MessageJournal(
+        args.output,
+        snapshot_writer=save_messages,
+        max_messages=max_messages,
+        snapshot_interval_ms=settings.get('snapshot_interval_ms', 500)
+    )
+    
+    # Вся история трансляции пишется в архив SQLite фоновым потоком
+    archive = archive_from_settings(settings) if args.archive else None
+    
+    # Под координатором сообщения можно передавать через разделяемую память без записи на диск
+    ring = None
+    if args.shm_name:
         try:
-            logger.info("Попытка подключения без cookies...")
-            chat = pytchat.create(video_id)
+            ring = ShmRing.attach(args.shm_name)
+            logger.info(f"Сообщения передаются через буфер {args.shm_name}")
         except Exception as e:
-            logger.warning(f"Не удалось подключиться без cookies: {e}")
-            logger.info("Попытка подключения с cookies из файла...")
-            
-            # Пробуем загрузить cookies из файла
-            cookies_path = 'youtube_cookies.txt'
-            if os.path.exists(cookies_path):
-                logger.info(f"Найден файл cookies: {cookies_path}")
-                chat = pytchat.create(video_id, cookies=cookies_path)
-            else:
-                logger.error("=" * 60)
-                logger.error("ТРЕБУЕТСЯ АУТЕНТИФИКАЦИЯ YOUTUBE!")
-                logger.error("=" * 60)
-                logger.error("YouTube блокирует доступ к чату без аутентификации.")
-                logger.error("")
-                logger.error("Для решения проблемы нужно:")
-                logger.error("1. Установить расширение 'Get cookies.txt LOCALLY'")
-                logger.error("   Chrome: https://chrome.google.com/webstore/detail/get-cookiestxt-locally/cclelndahbckbenkjhflpdbgdldlbecc")
-                logger.error("   Firefox: https://addons.mozilla.org/en-US/firefox/addon/cookies-txt/")
-                logger.error("")
-                logger.error("2. Открыть youtube.com и войти в свой аккаунт")
-                logger.error("3. Экспортировать cookies через расширение")
-                logger.error("4. Сохранить файл как 'youtube_cookies.txt' в папку:")
-                logger.error(f"   {os.path.abspath('.')}")
-                logger.error("=" * 60)
-                raise
-        
+            logger.error(f"Не удалось подключиться к буферу {args.shm_name}, используем журнал: {e}")
+    
+    def running_status():
+        return f"RUNNING: {len(messages)} messages, interval {scheduler.interval:.1f}s"
+    
+    # Метрики восстановления переносятся из точки в точку
+    recovery = dict(resume_state.get('recovery') or {}) if resume_state else None
+    chat = None
+    
+    def save_checkpoint(stopped=False):
+        # seq берётся у того, кто его опубликовал: буфер координатора или уже записанный журнал
+        state = {
+            'video_id': video_id,
+            'emoji_version': emoji_version,
+            'continuation': getattr(chat, 'continuation', None),
+            'last_seq': ring.last_seq if ring is not None else writer.last_seq,
+            'recovery': recovery
+        }
+        if stopped:
+            checkpoint.save(stopped=True, **state)
+        else:
+            checkpoint.maybe_save(**state)
+    
+    # Запись на диск (журнал, снимок, статус и контрольная точка) идёт в отдельном
+    # потоке пачками, цикл чтения чата не ждёт файлы
+    writer = CoalescingWriter(
+        journal,
+        status_writer=write_status,
+        max_latency_ms=settings.get('writer_max_latency_ms', 100),
+        max_batch=settings.get('writer_max_batch', 50),
+        checkpoint_writer=save_checkpoint
+    )
+    
+    def report_connected():
+        """Пишет статус подключения и метрику восстановления после перезапуска"""
+        nonlocal recovery
         write_status("CONNECTED")
+        if not resume_state:
+            return
+        connected = time.time()
+        stopped_at = resume_state.get('stopped_at') or resume_state.get('saved_at', connected)
+        recovery = {
+            'restart_ms': int((connected - main_started) * 1000),
+            'downtime_ms': int((connected - stopped_at) * 1000),
+            'restarts': (recovery or {}).get('restarts', 0) + 1
+        }
+        logger.info(f"⏱️ Восстановление после перезапуска: {recovery['restart_ms']} мс (простой чата {recovery['downtime_ms']} мс, перезапуск #{recovery['restarts']})")
+    
+    def accept(message_obj):
+        """Добавляет новое сообщение в список и передаёт его на запись"""
+        if not seen_message_ids.add(message_obj['id']):
+            return False
+        
+        # seq назначается до публикации в общий список: снимок сериализует его в другом потоке
+        if ring is not None:
+            ring.append(message_obj)
+        else:
+            journal.assign_seq(message_obj)
+        
+        messages.append(message_obj)
+        checkpoint.remember(message_obj['id'])
+        
+        # Ограничиваем количество сообщений
+        if len(messages) > max_messages:
+            del messages[:len(messages) - max_messages]
+        
+        status = running_status()
+        if ring is not None:
+            writer.submit(status=status)
+        else:
+            # Журнал, снимок и статус пишутся фоновым потоком одной пачкой
+            writer.submit(message_obj, messages, status)
+        if archive is not None:
+            archive.submit((message_obj,))
+        return True
+    
+    try:
+        if args.use_async:
+            # Пачки ожидаются по готовности continuation, без update_interval
+            asyncio.run(consume_async(video_id, accept, report_connected))
+            return
+        
+        # Создаем объект чата PyTChat с поддержкой cookies
+        chat = connect_chat(video_id)
+        
+        report_connected()
         logger.info("Успешно подключено к чату.")
         
         # Основной цикл чтения сообщений
         while chat.is_alive():
             try:
                 # Получаем новые сообщения
-                for c in chat.get().sync_items():
+                chat_data = chat.get()
+                accepted = 0
+                for c in chat_data.sync_items():
                     try:
                         # Формируем объект сообщения в формате совместимом со старым парсером
-                        author_name = c.author.name
-                        
-                        # Извлекаем текст сообщения (включая эмоджи)
-                        message_text = extract_message_text(c)
-                        
-                        # Логируем сообщения с потенциальными эмодзи для отладки
-                        if message_text and any(ord(char) > 0x1F000 for char in message_text[:50]):  # Проверяем на эмодзи в первых 50 символах
-                            logger.debug(f"Сообщение с эмодзи от {author_name}: {message_text[:100]}")
-                        
-                        # Также пробуем получить текст напрямую из message, если messageEx не дал результата
-                        if not message_text or len(message_text.strip()) == 0:
-                            direct_message = getattr(c, 'message', None)
-                            if direct_message and direct_message != message_text:
-                                logger.info(f"Фолбэк: используем прямой message для {author_name}: {direct_message[:100]}")
-                                message_text = direct_message
-                        
-                        # Используем текущее время в миллисекундах для совместимости с JavaScript Date.now()
-                        timestamp = int(time.time() * 1000)
-                        message_id = c.id if hasattr(c, 'id') else f"{timestamp}_{author_name}"
-
-                        # Пропускаем уже сохраненные сообщения
-                        if message_id in seen_message_ids:
+                        message_obj = build_message(c, seen_message_ids)
+                        if message_obj is None:
                             continue
-                        
-                        # URL аватара
-                        avatar_url = c.author.imageUrl if hasattr(c.author, 'imageUrl') else 'https://via.placeholder.com/32x32?text=👤'
-                        
-                        # Определяем роли пользователя
-                        is_sponsor = c.author.isChatSponsor if hasattr(c.author, 'isChatSponsor') else False
-                        is_moderator = c.author.isChatModerator if hasattr(c.author, 'isChatModerator') else False
-                        is_owner = c.author.isChatOwner if hasattr(c.author, 'isChatOwner') else False
-                        
-                        # Обрабатываем значки (badges)
-                        user_badges = []
-                        if hasattr(c.author, 'badgeUrl') and c.author.badgeUrl:
-                            badge_type = 'badge'
-                            if is_sponsor:
-                                badge_type = 'member'
-                            elif is_moderator:
-                                badge_type = 'moderator'
-                            elif is_owner:
-                                badge_type = 'owner'
-                            
-                            user_badges.append({
-                                'type': badge_type,
-                                'title': badge_type.capitalize(),
-                                'icon': c.author.badgeUrl
-                            })
-                        
-                        # Обрабатываем эмоджи
-                        processed_text = process_emojis(message_text) if message_text else ""
-                        
-                        message_obj = {
-                            'id': message_id,
-                            'text': processed_text,
-                            'author': {
-                                'name': author_name,
-                                'avatar': avatar_url,
-                                'is_sponsor': is_sponsor,
-                                'is_moderator': is_moderator,
-                                'is_owner': is_owner,
-                                'badges': user_badges
-                            },
-                            'timestamp': timestamp
-                        }
-                        
-                        messages.append(message_obj)
-                        seen_message_ids.add(message_id)
-                        
-                        # Ограничиваем количество сообщений
-                        if len(messages) > max_messages:
-                            overflow = len(messages) - max_messages
-                            for _ in range(overflow):
-                                removed = messages.pop(0)
-                                removed_id = removed.get('id')
-                                if removed_id:
-                                    seen_message_ids.discard(removed_id)
-                        
-                        # Сохраняем сообщения
-                        save_messages(messages, args.output)
-                        
-                        write_status(f"RUNNING: {len(messages)} messages")
-                        
+                        if accept(message_obj):
+                            accepted += 1
                         
                     except Exception as e:
                         logger.error(f"Ошибка обработки сообщения: {e}")
                         continue
                 
-                # Небольшая задержка между проверками
-                time.sleep(update_interval)
+                # Пауза зависит от скорости чата и подсказки таймаута YouTube
+                previous_interval = scheduler.interval
+                interval = scheduler.record(accepted, getattr(chat_data, 'interval', None))
+                if abs(interval - previous_interval) >= 0.1:
+                    writer.submit(status=running_status())
+                
+                # Конец пачки - сбрасываем накопленное сразу
+                writer.end_batch()
+                
+                time.sleep(interval)
                 
             except KeyboardInterrupt:
                 logger.info("Парсер остановлен пользователем (KeyboardInterrupt).")
@@ -459,21 +664,47 @@ def main():
         write_status(error_message)
         logger.critical(f"Критическая ошибка парсера: {e}", exc_info=True)
     finally:
+        writer.close()
+        stats = writer.get_stats()
+        logger.info(f"Фоновая запись: {stats['messages_written']} сообщений за {stats['flushes']} сбросов, сэкономлено {stats['writes_saved']} записей")
         if messages:
-            save_messages(messages, args.output)
+            journal.flush_snapshot(messages)
+        save_checkpoint(stopped=True)
+        journal.close()
+        if archive is not None:
+            archive.close()
+        if ring is not None:
+            ring.close()
         write_status("FINISHED")
         logger.info("Парсер завершил работу.")
 
+# Перезапуск парсера: после долгой работы - сразу (состояние берётся из контрольной точки),
+# при частых падениях - с нарастающей паузой
+RESTART_STABLE_SECONDS = 60
+RESTART_BACKOFF_BASE = 1
+RESTART_BACKOFF_MAX = 30
+
 if __name__ == "__main__":
+    restart_attempt = 0
     while True:
+        started = time.time()
         try:
             main()
-            logger.info("Парсер завершился нормально. Перезапуск через 10 секунд...")
-            time.sleep(10)  # Пауза перед перезапуском
+            logger.info("Парсер завершился нормально.")
         except KeyboardInterrupt:
             logger.info("Получен сигнал остановки. Завершение работы.")
             break
         except Exception as e:
-            logger.error(f"Неожиданная ошибка: {e}. Перезапуск через 30 секунд...")
-            time.sleep(30)  # Более длинная пауза при ошибке
+            logger.error(f"Неожиданная ошибка: {e}")
+        
+        if time.time() - started >= RESTART_STABLE_SECONDS:
+            restart_attempt = 0
+        delay = min(RESTART_BACKOFF_BASE * 2 ** (restart_attempt - 1), RESTART_BACKOFF_MAX) if restart_attempt else 0
+        restart_attempt += 1
+        logger.info(f"Перезапуск через {delay} с...")
+        try:
+            time.sleep(delay)
+        except KeyboardInterrupt:
+            logger.info("Получен сигнал остановки. Завершение работы.")
+            break
 
@@ -0,0 +1,495 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Локальная потоковая оценка настроения чата
+Каждое сообщение оценивается словарём слов (русский и английский чатовый сленг)
+и таблицей валентности эмоджи, построенной по нашей базе эмоджи. Настроение -
+экспоненциально затухающее среднее оценок, поэтому обновляется на каждом
+сообщении без обращения к API.
+
+Gemini (analyze_chat_sentiment) нужен только когда картина меняется: check()
+отмечает эскалацию при заметном сдвиге настроения, всплеске темы (слово
+внезапно встречается в разы чаще обычного) или раз в refresh_seconds.
+Счётчик эскалаций сохраняется в chat_mood.json, ИИ-мост запускает анализ
+при его изменении
+"""
+
+import os
+import re
+import json
+import math
+import time
+import logging
+from collections import deque
+from functools import lru_cache
+from typing import Dict, Iterable, Optional
+
+from chat_analytics import STOP_WORDS
+from chat_archive import search_text
+
+logger = logging.getLogger('chat_sentiment')
+
+# Значения по умолчанию (переопределяются в chat_settings.json)
+DEFAULT_MOOD_FILE = 'chat_mood.json'
+DEFAULT_SHIFT_THRESHOLD = 0.3
+DEFAULT_COOLDOWN_SECONDS = 120.0
+# Анализ Gemini - два запроса; 12 эскалаций в час не больше прежнего анализа раз в 5 минут
+DEFAULT_MAX_PER_HOUR = 12
+DEFAULT_REFRESH_SECONDS = 1800.0
+DEFAULT_SPIKE_FACTOR = 4.0
+DEFAULT_SPIKE_MIN_COUNT = 8.0
+
+# Периоды полураспада: быстрое (текущее) и медленное (фоновое) среднее
+FAST_HALF_LIFE = 30.0
+SLOW_HALF_LIFE = 600.0
+
+# Эскалации не раньше, чем накопится столько сообщений
+WARMUP_MESSAGES = 30
+# Настроение к нулю тянет априорный вес: пара сообщений не делает чат "негативным"
+MOOD_PRIOR = 2.0
+MOOD_LABEL_THRESHOLD = 0.15
+
+# Слова целиком: оценка от -1 до 1
+LEXICON = {
+    # русский
+    'лол': 0.5, 'кек': 0.5, 'ура': 0.6, 'имба': 0.7, 'топ': 0.6, 'гг': 0.6, 'вп': 0.5, 'огонь': 0.7,
+    'ого': 0.3, 'вау': 0.5, 'ржу': 0.6, 'жиза': 0.4, 'база': 0.4, 'спс': 0.5, 'пасиб': 0.5,
+    'фу': -0.5, 'жаль': -0.4, 'скука': -0.6, 'лаг': -0.5, 'лаги': -0.5, 'зря': -0.3, 'дно': -0.6,
+    'мда': -0.3, 'эх': -0.2, 'увы': -0.4, 'нуб': -0.4,
+    # английский и эмоуты Twitch/YouTube
+    'good': 0.6, 'great': 0.7, 'nice': 0.6, 'love': 0.8, 'lol': 0.5, 'lmao': 0.6, 'rofl': 0.6,
+    'gg': 0.6, 'wp': 0.5, 'pog': 0.8, 'poggers': 0.8, 'pogchamp': 0.8, 'based': 0.4,
+    'awesome': 0.8, 'amazing': 0.8, 'cool': 0.5, 'wow': 0.5, 'hype': 0.7, 'win': 0.5, 'best': 0.7,
+    'thanks': 0.5, 'thx': 0.5, 'ty': 0.4, 'beautiful': 0.7, 'epic': 0.7, 'fun': 0.5,
+    'kekw': 0.6, 'lul': 0.5, 'omegalul': 0.6,
+    'bad': -0.6, 'boring': -0.7, 'sad': -0.5, 'hate': -0.8, 'cringe': -0.6, 'lag': -0.5,
+    'laggy': -0.6, 'trash': -0.7, 'worst': -0.8, 'fail': -0.5, 'awful': -0.8, 'terrible': -0.8,
+    'sucks': -0.7, 'rip': -0.3, 'scam': -0.8, 'ugh': -0.4, 'meh': -0.3, 'wtf': -0.4,
+    'sadge': -0.5, 'pepehands': -0.5, 'residentsleeper': -0.6, 'notlikethis': -0.5,
+    # текстовые смайлы
+    ':)': 0.5, ':-)': 0.5, ';)': 0.4, ':(': -0.5, ':-(': -0.5, '))': 0.5, '((': -0.5,
+}
+
+# Основы русских слов (первые 4-8 букв) - покрывают окончания
+STEMS = {
+    'крут': 0.7, 'класс': 0.7, 'клёв': 0.6, 'клев': 0.6, 'отлич': 0.7, 'прекрас': 0.8, 'супер': 0.7,
+    'красав': 0.8, 'молод': 0.6, 'гениа': 0.8, 'шикар': 0.8, 'кайф': 0.7, 'обожа': 0.8,
+    'любл': 0.7, 'люби': 0.6, 'спасиб': 0.6, 'благодар': 0.6, 'восторг': 0.8, 'восхит': 0.8,
+    'велик': 0.5, 'хорош': 0.6, 'балдеж': 0.6, 'топов': 0.6, 'топч': 0.6, 'смешн': 0.6,
+    'угар': 0.6, 'ржак': 0.6, 'лайк': 0.5, 'побед': 0.6,
+    'скучн': -0.7, 'отсто': -0.7, 'плох': -0.6, 'ужас': -0.7, 'кошмар': -0.7, 'кринж': -0.6,
+    'беси': -0.7, 'бесят': -0.7, 'лагае': -0.6, 'торм': -0.5, 'фигн': -0.6, 'херн': -0.7,
+    'дерьм': -0.8, 'говн': -0.8, 'грус': -0.5, 'печал': -0.5, 'слаб': -0.4, 'позор': -0.8,
+    'ненави': -0.8, 'отпис': -0.6, 'дизл': -0.6, 'разочар': -0.7, 'обидн': -0.5, 'тупо': -0.5,
+    'тупой': -0.6, 'бред': -0.6, 'скам': -0.8, 'обман': -0.7, 'хуже': -0.6, 'худш': -0.7,
+    'провал': -0.7, 'надоел': -0.6, 'уныл': -0.6, 'отврат': -0.8, 'мерзк': -0.8,
+}
+
+# Смех: "ахаха", "хахах", "ahahah", "хд"
+_LAUGH_PATTERN = re.compile(r'^(?:а?(?:ха){2,}х?|х[аы]?х[аы]+|a?(?:ha){2,}h?|хд+|xd+|у+р+а+)$')
+_LAUGH_VALENCE = 0.6
+
+# Отрицание переворачивает (и ослабляет) оценку следующего слова, усилители - усиливают
+NEGATIONS = frozenset(('не', 'нет', 'ни', 'без', 'not', 'no', 'never', 'isnt', 'dont'))
+NEGATION_FACTOR = -0.7
+INTENSIFIERS = frozenset(('очень', 'оч', 'прям', 'реально', 'very', 'really', 'so'))
+INTENSIFIER_FACTOR = 1.4
+
+# Валентность эмоджи по словам кода (отрицательные проверяются первыми: broken_heart)
+NEGATIVE_EMOJI_WORDS = (
+    'broken', 'angry', 'rage', 'pout', 'cry', 'sob', 'sad', 'disappoint', 'thumbs_down', 'thumbsdown',
+    '-1', 'pensive', 'weary', 'tired', 'frown', 'worried', 'fear', 'scream', 'nause', 'vomit',
+    'unamused', 'expressionless', 'confounded', 'persevere', 'cursing', 'symbols_on_mouth',
+    'yawn', 'facepalm', 'face_palm', 'poo', 'anguish', 'anxious', 'downcast', 'sleepy',
+)
+POSITIVE_EMOJI_WORDS = (
+    'smil', 'grin', 'laugh', 'joy', 'heart', 'love', 'kiss', 'fire', 'thumbs_up', 'thumbsup', '+1',
+    'clap', 'party', 'tada', 'star_struck', 'star-struck', 'hundred', '100', 'muscle', 'trophy',
+    'sparkl', 'ok_hand', 'raising_hands', 'sunglasses', 'yum', 'wink', 'blush', 'hug', 'rofl',
+    'rolling_on_the_floor', 'medal', 'confetti', 'beaming', 'relieved', 'pog', 'cool',
+)
+EMOJI_VALENCE = 0.6
+
+# Слова сообщения: коды эмоджи, текстовые смайлы, скобки, слова
+_TOKEN_PATTERN = re.compile(r':[\w+\-]+:|[:;]-?[)(]|\)\)+|\(\(+|[^\W\d_]+')
+_EMOJI_CODE_PATTERN = re.compile(r':[\w+\-]+:')
+# Темы для поиска всплесков: слова не короче 3 букв
+_TERM_PATTERN = re.compile(r'[^\W\d_]{3,}')
+
+# Каждые столько добавлений редкие темы вычищаются из памяти
+_PRUNE_EVERY = 5000
+
+_emoji_valence = None
+
+
+def _code_valence(code: str) -> float:
+    name = code.strip(':').casefold()
+    if any(word in name for word in NEGATIVE_EMOJI_WORDS):
+        return -EMOJI_VALENCE
+    if any(word in name for word in POSITIVE_EMOJI_WORDS):
+        return EMOJI_VALENCE
+    return 0.0
+
+
+def get_emoji_valence() -> Dict[str, float]:
+    """Таблица валентности кодов эмоджи (строится по базе эмоджи при первом вызове)"""
+    global _emoji_valence
+    if _emoji_valence is None:
+        from emoji_database import get_emoji_shortcodes
+        _emoji_valence = {}
+        for code in get_emoji_shortcodes().values():
+            valence = _code_valence(code)
+            if valence:
+                _emoji_valence[code] = valence
+    return _emoji_valence
+
+
+@lru_cache(maxsize=50000)
+def token_valence(token: str) -> float:
+    """Оценка одного слова, смайла или кода эмоджи"""
+    if token.startswith(':') and token.endswith(':') and len(token) > 2:
+        # Эмоджи-картинки каналов (":face-blue-smiling:") в базе не всегда есть
+        return get_emoji_valence().get(token) or _code_valence(token)
+    if token[0] == ')':
+        return LEXICON['))']
+    if token[0] == '(':
+        return LEXICON['((']
+    valence = LEXICON.get(token)
+    if valence is not None:
+        return valence
+    if _LAUGH_PATTERN.match(token):
+        return _LAUGH_VALENCE
+    for length in range(min(len(token), 8), 3, -1):
+        valence = STEMS.get(token[:length])
+        if valence is not None:
+            return valence
+    return 0.0
+
+
+def score_text(text: str) -> float:
+    """
+    Оценка настроения сообщения
+
+    Args:
+        text (str): Текст сообщения (может содержать HTML эмоджи)
+
+    Returns:
+        float: От -1 (негатив) до 1 (позитив); 0 - нейтрально
+    """
+    return _score_normalized(search_text(text).casefold())
+
+
+def _score_normalized(text: str) -> float:
+    total = 0.0
+    factor = 1.0
+    for token in _TOKEN_PATTERN.findall(text):
+        if token in NEGATIONS:
+            factor = NEGATION_FACTOR
+            continue
+        if token in INTENSIFIERS:
+            factor *= INTENSIFIER_FACTOR
+            continue
+        valence = token_valence(token)
+        if valence:
+            total += valence * factor
+        factor = 1.0
+    # Нормализация как в VADER: сумма уходит в (-1, 1), не растёт бесконечно с флудом
+    return total / math.sqrt(total * total + 1) if total else 0.0
+
+
+def _decay(value: float, elapsed: float, half_life: float) -> float:
+    return value * 0.5 ** (elapsed / half_life) if elapsed > 0 else value
+
+
+def _window(half_life: float, age: float) -> float:
+    """
+    Эффективная длина окна затухающей суммы (с)
+
+    В начале сессии сумма накоплена не за всё окно, и без поправки медленная
+    частота занижена: каждое частое слово выглядело бы всплеском
+    """
+    return half_life / math.log(2) * (1 - 0.5 ** (max(age, 1.0) / half_life))
+
+
+def mood_label(mood: float) -> str:
+    """Настроение в терминах анализа Gemini"""
+    if mood >= MOOD_LABEL_THRESHOLD:
+        return 'позитивное'
+    if mood <= -MOOD_LABEL_THRESHOLD:
+        return 'негативное'
+    return 'нейтральное'
+
+
+class _Term:
+    """Затухающие счётчики упоминаний темы"""
+
+    __slots__ = ('fast', 'slow', 'updated')
+
+    def __init__(self, now: float):
+        self.fast = 0.0
+        self.slow = 0.0
+        self.updated = now
+
+    def advance(self, now: float):
+        elapsed = now - self.updated
+        self.fast = _decay(self.fast, elapsed, FAST_HALF_LIFE)
+        self.slow = _decay(self.slow, elapsed, SLOW_HALF_LIFE)
+        self.updated = now
+
+    def ratio(self, age: float) -> float:
+        """Во сколько раз текущая частота выше фоновой (age - время с начала сессии)"""
+        if not self.slow:
+            return 0.0
+        return (self.fast / _window(FAST_HALF_LIFE, age)) / (self.slow / _window(SLOW_HALF_LIFE, age))
+
+
+class SentimentTracker:
+    """
+    Инкрементальное настроение чата и решение об эскалации к Gemini
+
+    add() вызывается объединителем для каждой принятой записи MessageRecord
+    (до свёртки повторов), check() - раз в цикл
+    """
+
+    def __init__(self, shift_threshold: float = DEFAULT_SHIFT_THRESHOLD,
+                 cooldown: float = DEFAULT_COOLDOWN_SECONDS,
+                 refresh_seconds: float = DEFAULT_REFRESH_SECONDS,
+                 spike_factor: float = DEFAULT_SPIKE_FACTOR,
+                 spike_min_count: float = DEFAULT_SPIKE_MIN_COUNT,
+                 max_per_hour: int = DEFAULT_MAX_PER_HOUR):
+        self.shift_threshold = shift_threshold
+        self.cooldown = cooldown
+        self.max_per_hour = max_per_hour
+        self.refresh_seconds = refresh_seconds
+        self.spike_factor = spike_factor
+        self.spike_min_count = spike_min_count
+
+        # Затухающие суммы: оценки (только сообщения с настроением), сообщения, позитив и негатив
+        self.started = None
+        self.updated = None
+        self.score_sum = 0.0
+        self.score_weight = 0.0
+        self.fast_count = 0.0
+        self.slow_count = 0.0
+        self.positive = 0.0
+        self.negative = 0.0
+        self.messages = 0
+
+        self.terms = {}
+        self.spiking = {}
+        self.new_spikes = []
+
+        # Последняя эскалация
+        self.escalations = 0
+        self.recent_escalations = deque()
+        self.escalated_at = None
+        self.escalated_mood = 0.0
+        self.escalated_messages = 0
+        self.escalation_reason = None
+        self.escalated_wall = None
+
+    def _advance(self, now: float):
+        if self.started is None:
+            self.started = now
+        if self.updated is not None:
+            elapsed = now - self.updated
+            self.score_sum = _decay(self.score_sum, elapsed, FAST_HALF_LIFE)
+            self.score_weight = _decay(self.score_weight, elapsed, FAST_HALF_LIFE)
+            self.fast_count = _decay(self.fast_count, elapsed, FAST_HALF_LIFE)
+            self.slow_count = _decay(self.slow_count, elapsed, SLOW_HALF_LIFE)
+            self.positive = _decay(self.positive, elapsed, FAST_HALF_LIFE)
+            self.negative = _decay(self.negative, elapsed, FAST_HALF_LIFE)
+        self.updated = now
+
+    def add(self, record, now: Optional[float] = None):
+        """Учитывает одно сообщение"""
+        now = time.monotonic() if now is None else now
+        self._advance(now)
+        self.messages += 1
+        self.fast_count += 1
+        self.slow_count += 1
+
+        text = record.search_text().casefold()
+        score = _score_normalized(text)
+        if score:
+            self.score_sum += score
+            self.score_weight += 1
+            if score > 0:
+                self.positive += 1
+            else:
+                self.negative += 1
+
+        for word in set(_TERM_PATTERN.findall(_EMOJI_CODE_PATTERN.sub(' ', text))):
+            if word not in STOP_WORDS:
+                self._add_term(word, now)
+
+        if self.messages % _PRUNE_EVERY == 0:
+            self._prune(now)
+
+    def add_many(self, records: Iterable, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        for record in records:
+            self.add(record, now)
+
+    def _add_term(self, word: str, now: float):
+        term = self.terms.get(word)
+        if term is None:
+            term = self.terms[word] = _Term(now)
+        term.advance(now)
+        term.fast += 1
+        term.slow += 1
+        if (word not in self.spiking and self.messages >= WARMUP_MESSAGES
+                and term.fast >= self.spike_min_count and term.ratio(now - self.started) >= self.spike_factor):
+            self.spiking[word] = term
+            self.new_spikes.append(word)
+            logger.info(f"Всплеск темы чата: {word}")
+
+    def _prune(self, now: float):
+        for word in [word for word, term in self.terms.items() if word not in self.spiking
+                     and _decay(term.slow, now - term.updated, SLOW_HALF_LIFE) < 0.5]:
+            del self.terms[word]
+
+    def mood(self, now: Optional[float] = None) -> float:
+        """Текущее настроение от -1 до 1"""
+        now = time.monotonic() if now is None else now
+        self._advance(now)
+        return self.score_sum / (self.score_weight + MOOD_PRIOR)
+
+    def check(self, now: Optional[float] = None) -> Optional[str]:
+        """
+        Решает, нужен ли анализ Gemini
+
+        Returns:
+            str: Причина эскалации или None
+        """
+        now = time.monotonic() if now is None else now
+
+        # Тема перестала быть всплеском, когда частота вернулась к фоновой
+        for word, term in list(self.spiking.items()):
+            term.advance(now)
+            if term.ratio(now - self.started) < self.spike_factor / 2:
+                del self.spiking[word]
+        self.new_spikes = [word for word in self.new_spikes if word in self.spiking]
+
+        if self.messages < WARMUP_MESSAGES:
+            return None
+        if self.escalated_at is not None and now - self.escalated_at < self.cooldown:
+            return None
+        recent = self.recent_escalations
+        while recent and now - recent[0] >= 3600:
+            recent.popleft()
+        if len(recent) >= self.max_per_hour:
+            return None
+
+        mood = self.mood(now)
+        if self.escalated_at is None:
+            reason = 'начальная оценка'
+        elif abs(mood - self.escalated_mood) >= self.shift_threshold:
+            reason = f"сдвиг настроения {self.escalated_mood:+.2f} -> {mood:+.2f}"
+        elif self.new_spikes:
+            reason = f"всплеск темы: {', '.join(self.new_spikes[:3])}"
+        elif now - self.escalated_at >= self.refresh_seconds and self.messages > self.escalated_messages:
+            reason = 'плановое обновление'
+        else:
+            return None
+
+        self.new_spikes = []
+        self.escalations += 1
+        recent.append(now)
+        self.escalated_at = now
+        self.escalated_mood = mood
+        self.escalated_messages = self.messages
+        self.escalation_reason = reason
+        self.escalated_wall = int(time.time() * 1000)
+        logger.info(f"Эскалация анализа настроения: {reason}")
+        return reason
+
+    def snapshot(self, now: Optional[float] = None) -> Dict:
+        """Снимок настроения для ИИ-моста и оверлеев"""
+        now = time.monotonic() if now is None else now
+        mood = self.mood(now)
+        age = now - self.started if self.started is not None else 0.0
+        rate = self.fast_count / _window(FAST_HALF_LIFE, age)
+        baseline = self.slow_count / _window(SLOW_HALF_LIFE, age)
+        energy = rate / baseline if baseline else 1.0
+        opinionated = self.positive + self.negative
+        total = self.fast_count or 1.0
+        trending = sorted(self.spiking.items(), key=lambda item: item[1].ratio(age), reverse=True)
+        return {
+            'updated': int(time.time() * 1000),
+            'mood': round(mood, 3),
+            'overall_mood': mood_label(mood),
+            'energy_level': 'высокий' if energy >= 1.5 else 'низкий' if energy <= 0.5 else 'средний',
+            'activity_level': 'активный' if rate >= 1 else 'умеренный' if rate >= 0.1 else 'тихий',
+            'messages_per_second': round(rate, 2),
+            'positive_share': round(self.positive / total, 3),
+            'negative_share': round(self.negative / total, 3),
+            'neutral_share': round(max(total - opinionated, 0.0) / total, 3) if self.fast_count else 1.0,
+            'messages': self.messages,
+            'trending_terms': [{'term': word, 'ratio': round(term.ratio(age), 1)} for word, term in trending[:5]],
+            'escalations': self.escalations,
+            'escalation_reason': self.escalation_reason,
+            'escalated_at': self.escalated_wall
+        }
+
+    def save(self, path: str = DEFAULT_MOOD_FILE) -> bool:
+        """Атомарно записывает снимок в JSON файл"""
+        temp_path = f"{path}.tmp.{os.getpid()}"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, path)
+            return True
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить настроение чата {path}: {e}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return False
+
+
+def sentiment_from_settings(settings: Optional[Dict] = None) -> Optional[SentimentTracker]:
+    """
+    Создаёт оценку настроения по chat_settings.json
+
+    Args:
+        settings (dict): Настройки (chat_sentiment_enabled, chat_sentiment_shift_threshold,
+            chat_sentiment_cooldown_seconds, chat_sentiment_max_per_hour, chat_sentiment_refresh_seconds,
+            chat_sentiment_spike_factor)
+
+    Returns:
+        SentimentTracker: Оценка или None, если отключена
+    """
+    settings = settings or {}
+    if not settings.get('chat_sentiment_enabled', True):
+        return None
+    return SentimentTracker(
+        shift_threshold=settings.get('chat_sentiment_shift_threshold', DEFAULT_SHIFT_THRESHOLD),
+        cooldown=settings.get('chat_sentiment_cooldown_seconds', DEFAULT_COOLDOWN_SECONDS),
+        max_per_hour=settings.get('chat_sentiment_max_per_hour', DEFAULT_MAX_PER_HOUR),
+        refresh_seconds=settings.get('chat_sentiment_refresh_seconds', DEFAULT_REFRESH_SECONDS),
+        spike_factor=settings.get('chat_sentiment_spike_factor', DEFAULT_SPIKE_FACTOR)
+    )
+
+
+def read_mood(path: str = DEFAULT_MOOD_FILE, max_age: float = 30.0) -> Optional[Dict]:
+    """
+    Читает снимок настроения, который пишет координатор
+
+    Args:
+        path (str): Файл снимка
+        max_age (float): Снимок старше этого (с) считается устаревшим (координатор остановлен)
+
+    Returns:
+        dict: Снимок или None
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            mood = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if time.time() * 1000 - mood.get('updated', 0) > max_age * 1000:
+        return None
+    return mood
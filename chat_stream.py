@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Асинхронный поток сообщений YouTube чата
+Обёртка над pytchat.LiveChatAsync: новые пачки сообщений ожидаются через
+await сразу по готовности continuation, без фиксированного sleep между
+запросами. Все каналы одного event loop используют общий HTTP клиент
+(пул соединений). Поток отдаёт нормализованные сообщения в формате
+build_message() и используется как отдельным парсером (--async),
+так и in-process движком координатора
+"""
+
+import asyncio
+import logging
+from typing import AsyncIterator, Dict
+
+from chat_parser_pytchat import build_message
+from dedupe_store import DedupeStore
+
+logger = logging.getLogger('chat_parser.stream')
+
+# Асинхронный API есть не во всех сборках pytchat
+try:
+    from pytchat import LiveChatAsync
+    ASYNC_AVAILABLE = True
+except ImportError:
+    ASYNC_AVAILABLE = False
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# Общие HTTP клиенты по event loop
+_clients = {}
+
+
+def get_shared_client():
+    """Возвращает общий HTTP клиент текущего event loop (создаётся при первом вызове)"""
+    if httpx is None:
+        return None
+
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        try:
+            client = httpx.AsyncClient(http2=True)
+        except ImportError:
+            # Пакет h2 не установлен - работаем по HTTP/1.1
+            client = httpx.AsyncClient()
+        _clients[loop] = client
+    return client
+
+
+async def close_shared_client():
+    """Закрывает общий HTTP клиент текущего event loop"""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def create_async_chat(video_id: str, client=None):
+    """
+    Создаёт LiveChatAsync в текущем event loop
+
+    Args:
+        video_id (str): ID видео
+        client: Общий httpx.AsyncClient или None
+
+    Returns:
+        LiveChatAsync: Объект асинхронного чата
+    """
+    kwargs = {'interruptable': False}
+    if client is not None:
+        kwargs['client'] = client
+    try:
+        return LiveChatAsync(video_id, **kwargs)
+    except TypeError:
+        # Старые версии pytchat не принимают внешний клиент
+        kwargs.pop('client', None)
+        return LiveChatAsync(video_id, **kwargs)
+
+
+async def iter_chat_messages(video_id: str, client=None, seen_ids: DedupeStore = None) -> AsyncIterator[Dict]:
+    """
+    Async-итератор нормализованных сообщений чата
+
+    Args:
+        video_id (str): ID видео
+        client: Общий HTTP клиент (по умолчанию get_shared_client())
+        seen_ids (DedupeStore): Принятые ID; передаётся снаружи, чтобы переживать переподключения
+
+    Yields:
+        dict: Сообщение в формате build_message()
+    """
+    if not ASYNC_AVAILABLE:
+        raise RuntimeError("Установленная версия pytchat не поддерживает LiveChatAsync")
+
+    if client is None:
+        client = get_shared_client()
+    if seen_ids is None:
+        seen_ids = DedupeStore()
+
+    chat = create_async_chat(video_id, client)
+    try:
+        while chat.is_alive():
+            # Ждём следующую пачку ровно столько, сколько нужно YouTube
+            chat_data = await chat.get()
+            for item in getattr(chat_data, 'items', []):
+                message = build_message(item, seen_ids)
+                if message is None:
+                    continue
+                seen_ids.add(message['id'])
+                yield message
+
+        logger.info(f"Чат {video_id} завершился")
+    finally:
+        chat.terminate()
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Колоночное кольцевое хранилище сообщений на NumPy
+Координатор дописывает сюда каждое принятое сообщение в виде строки
+числовых колонок: время приёма парсером и координатором, канал, автор,
+длина текста, число эмоджи и задержка конвейера (от парсера до объединителя;
+время публикации на платформе парсеры не передают). Строковые значения (каналы, авторы)
+кодируются словарём в целые индексы. Графики скорости, доли каналов
+и перцентили задержки конвейера считаются векторно по колонкам, без списков словарей.
+
+Снимок (копия колонок) записывается в .npz фоновым потоком, откуда его читают GUI, монитор и ИИ-мост
+(ColumnarStore.load). Без NumPy хранилище отключено (NUMPY_AVAILABLE)
+"""
+
+import os
+import re
+import time
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+from chat_message import plain_text
+
+logger = logging.getLogger('columnar_store')
+
+# Значения по умолчанию (переопределяются в chat_settings.json)
+DEFAULT_CAPACITY = 200000
+DEFAULT_COLUMNS_FILE = 'chat_columns.npz'
+
+# Код эмоджи после search_text (":fire:", ":face_with_tears_of_joy:")
+_SHORTCODE_PATTERN = re.compile(r':[\w+-]+:')
+
+# Числовые колонки и их типы
+COLUMNS = (
+    ('timestamp', 'int64'),    # время приёма парсером (мс, поле timestamp)
+    ('arrival', 'float64'),    # время приёма координатором (unix, с)
+    ('channel', 'int16'),      # индекс в словаре каналов
+    ('author', 'int32'),       # индекс в словаре авторов
+    ('text_length', 'int32'),  # длина текста без HTML
+    ('emoji_count', 'int16'),  # число эмоджи (картинки и Unicode)
+    ('pipeline_delay_ms', 'int32'),  # приём координатором минус приём парсером
+)
+
+
+class StringDictionary:
+    """Словарное кодирование строк в целые индексы"""
+
+    def __init__(self, values: Sequence[str] = ()):
+        self.values = list(values)
+        self.index = {value: position for position, value in enumerate(self.values)}
+
+    def __len__(self):
+        return len(self.values)
+
+    def encode(self, value: str) -> int:
+        position = self.index.get(value)
+        if position is None:
+            position = self.index[value] = len(self.values)
+            self.values.append(value)
+        return position
+
+    def decode(self, position: int) -> str:
+        return self.values[position]
+
+
+class ColumnarStore:
+    """
+    Кольцо последних capacity сообщений в колонках NumPy
+
+    Запись - O(1) на сообщение; запросы выбирают строки маской по времени
+    приёма и агрегируют их векторно (bincount, percentile)
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("Для колоночного хранилища нужен numpy")
+        self.capacity = capacity
+        self.columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in COLUMNS}
+        self.channels = StringDictionary()
+        self.authors = StringDictionary()
+        self.head = 0
+        self.size = 0
+        self.appended = 0
+        self.saver = None
+
+    def __len__(self):
+        return self.size
+
+    # ------------------------------------------------------------------
+    # Запись
+    # ------------------------------------------------------------------
+
+    def append(self, record, now: Optional[float] = None):
+        """Дописывает запись MessageRecord"""
+        self.append_many((record,), now)
+
+    def append_many(self, records: Iterable, now: Optional[float] = None):
+        """
+        Дописывает пачку записей MessageRecord
+
+        Args:
+            records: Записи в порядке приёма
+            now (float): Время приёма (unix, с); по умолчанию текущее
+        """
+        now = time.time() if now is None else now
+        rows = []
+        for record in records:
+            channel_id = record.source.channel_id if record.source is not None else ''
+            text = plain_text(record.text)
+            emoji_count = len(_SHORTCODE_PATTERN.findall(record.search_text())) if text else 0
+            rows.append((
+                record.timestamp or 0,
+                now,
+                self.channels.encode(channel_id),
+                self.authors.encode(record.author.name),
+                len(text),
+                emoji_count,
+                int(now * 1000) - int(record.timestamp or 0) if record.timestamp else 0
+            ))
+        if not rows:
+            return
+
+        # Пачка больше кольца - остаются только последние capacity строк
+        rows = rows[-self.capacity:]
+        count = len(rows)
+        positions = (self.head + np.arange(count)) % self.capacity
+        for index, (name, _) in enumerate(COLUMNS):
+            self.columns[name][positions] = [row[index] for row in rows]
+        wrapped = self.head + count >= self.capacity
+        self.head = (self.head + count) % self.capacity
+        self.size = min(self.size + count, self.capacity)
+        self.appended += count
+
+        # Кольцо прошло полный круг: авторы, чьих сообщений в нём не осталось, удаляются из словаря
+        if wrapped:
+            self._compact_authors()
+
+    def _compact_authors(self):
+        """Перекодирует колонку автора только по авторам, ещё присутствующим в кольце"""
+        column = self.columns['author'][:self.size]
+        used = np.unique(column)
+        if len(used) == len(self.authors):
+            return
+        remap = np.zeros(len(self.authors), dtype=self.columns['author'].dtype)
+        remap[used] = np.arange(len(used))
+        column[:] = remap[column]
+        self.authors = StringDictionary([self.authors.values[position] for position in used.tolist()])
+
+    # ------------------------------------------------------------------
+    # Запросы
+    # ------------------------------------------------------------------
+
+    def column(self, name: str) -> 'np.ndarray':
+        """Колонка в порядке приёма (копия только при переходе через конец кольца)"""
+        data = self.columns[name]
+        if self.size < self.capacity:
+            return data[:self.size]
+        return np.concatenate((data[self.head:], data[:self.head]))
+
+    def _mask(self, seconds: Optional[float] = None, channel: Optional[str] = None,
+              now: Optional[float] = None) -> 'np.ndarray':
+        mask = np.ones(self.size, dtype=bool)
+        if seconds is not None:
+            now = time.time() if now is None else now
+            mask &= self.column('arrival') >= now - seconds
+        if channel is not None:
+            position = self.channels.index.get(channel)
+            if position is None:
+                return np.zeros(self.size, dtype=bool)
+            mask &= self.column('channel') == position
+        return mask
+
+    def count(self, seconds: Optional[float] = None, channel: Optional[str] = None,
+              now: Optional[float] = None) -> int:
+        """Число сообщений за последние seconds секунд"""
+        return int(self._mask(seconds, channel, now).sum())
+
+    def rate_series(self, seconds: int = 300, bucket: int = 1, channel: Optional[str] = None,
+                    now: Optional[float] = None) -> List[int]:
+        """
+        Сообщений в каждой корзине за последние seconds секунд (для графика)
+
+        Returns:
+            list: seconds // bucket значений, от старых к новым
+        """
+        now = time.time() if now is None else now
+        buckets = max(int(seconds // bucket), 1)
+        arrival = self.column('arrival')[self._mask(seconds, channel, now)]
+        index = ((arrival - (now - buckets * bucket)) // bucket).astype(np.int64)
+        index = index[(index >= 0) & (index < buckets)]
+        return np.bincount(index, minlength=buckets).tolist()
+
+    def channel_share(self, seconds: Optional[float] = None, now: Optional[float] = None) -> Dict[str, float]:
+        """Доля сообщений каждого канала"""
+        channel = self.column('channel')[self._mask(seconds, None, now)]
+        if not channel.size:
+            return {}
+        counts = np.bincount(channel, minlength=len(self.channels))
+        return {self.channels.decode(position): round(float(share), 4)
+                for position, share in enumerate(counts / channel.size) if share}
+
+    def pipeline_delay_percentiles(self, percentiles: Sequence[float] = (50, 90, 99),
+                                   seconds: Optional[float] = None, channel: Optional[str] = None,
+                                   now: Optional[float] = None) -> Dict[str, float]:
+        """Перцентили задержки конвейера: от приёма парсером до объединителя (мс)"""
+        delay = self.column('pipeline_delay_ms')[self._mask(seconds, channel, now)]
+        if not delay.size:
+            return {}
+        values = np.percentile(delay, percentiles)
+        return {f"p{percentile:g}": round(float(value), 1) for percentile, value in zip(percentiles, values)}
+
+    def top_authors(self, limit: int = 10, seconds: Optional[float] = None,
+                    channel: Optional[str] = None, now: Optional[float] = None) -> List[Dict]:
+        """Самые активные авторы"""
+        author = self.column('author')[self._mask(seconds, channel, now)]
+        if not author.size:
+            return []
+        counts = np.bincount(author)
+        top = np.argsort(counts)[::-1][:limit]
+        return [{'author': self.authors.decode(int(position)), 'count': int(counts[position])}
+                for position in top if counts[position]]
+
+    def summary(self, seconds: float = 300, now: Optional[float] = None) -> Dict:
+        """Сводка для панели статистики: объём, доли каналов, длина текста, эмоджи, задержка конвейера"""
+        now = time.time() if now is None else now
+        mask = self._mask(seconds, None, now)
+        text_length = self.column('text_length')[mask]
+        emoji_count = self.column('emoji_count')[mask]
+        return {
+            'window_seconds': seconds,
+            'messages': int(mask.sum()),
+            'rate': round(float(mask.sum()) / seconds, 2),
+            'channel_share': self.channel_share(seconds, now),
+            'avg_text_length': round(float(text_length.mean()), 1) if text_length.size else 0.0,
+            'emoji_per_message': round(float(emoji_count.mean()), 2) if emoji_count.size else 0.0,
+            'pipeline_delay_ms': self.pipeline_delay_percentiles(seconds=seconds, now=now)
+        }
+
+    # ------------------------------------------------------------------
+    # Снимок на диске
+    # ------------------------------------------------------------------
+
+    def _snapshot_arrays(self) -> Dict[str, 'np.ndarray']:
+        """Копии колонок (в порядке приёма) и словарей, не зависящие от дальнейших записей"""
+        arrays = {name: self.column(name).copy() for name, _ in COLUMNS}
+        arrays['channels'] = np.array(self.channels.values, dtype=str)
+        arrays['authors'] = np.array(self.authors.values, dtype=str)
+        return arrays
+
+    def save(self, path: str = DEFAULT_COLUMNS_FILE) -> bool:
+        """Атомарно сохраняет колонки и словари в .npz (дожидается фоновой записи)"""
+        if self.saver is not None:
+            self.saver.join()
+        return _write_snapshot(path, self._snapshot_arrays())
+
+    def save_async(self, path: str = DEFAULT_COLUMNS_FILE) -> bool:
+        """
+        Сохраняет снимок в фоновом потоке: в вызывающем потоке только копируются колонки
+
+        Returns:
+            bool: False если предыдущая запись ещё не закончилась (снимок пропущен)
+        """
+        if self.saver is not None and self.saver.is_alive():
+            return False
+        self.saver = threading.Thread(
+            target=_write_snapshot, args=(path, self._snapshot_arrays()),
+            name='columnar-save', daemon=True
+        )
+        self.saver.start()
+        return True
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_COLUMNS_FILE) -> Optional['ColumnarStore']:
+        """
+        Загружает снимок для запросов в другом процессе
+
+        Returns:
+            ColumnarStore: Хранилище или None (нет numpy или файла)
+        """
+        if not NUMPY_AVAILABLE or not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                size = len(data['timestamp'])
+                store = cls(capacity=max(size, 1))
+                for name, _ in COLUMNS:
+                    store.columns[name][:size] = data[name]
+                store.channels = StringDictionary(data['channels'].tolist())
+                store.authors = StringDictionary(data['authors'].tolist())
+        except Exception as e:
+            logger.warning(f"Не удалось загрузить колонки сообщений {path}: {e}")
+            return None
+        store.size = size
+        store.head = size % store.capacity
+        store.appended = size
+        return store
+
+
+def _write_snapshot(path: str, arrays: Dict[str, 'np.ndarray']) -> bool:
+    """Атомарно записывает массивы снимка в .npz"""
+    temp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}.npz"
+    try:
+        np.savez(temp_path, **arrays)
+        os.replace(temp_path, path)
+        return True
+    except Exception as e:
+        logger.warning(f"Не удалось сохранить колонки сообщений {path}: {e}")
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        return False
+
+
+def columnar_from_settings(settings: Optional[Dict] = None) -> Optional[ColumnarStore]:
+    """
+    Создаёт хранилище по chat_settings.json
+
+    Args:
+        settings (dict): Настройки (columnar_store_enabled, columnar_store_capacity)
+
+    Returns:
+        ColumnarStore: Хранилище или None (отключено или нет numpy)
+    """
+    settings = settings or {}
+    if not settings.get('columnar_store_enabled', True):
+        return None
+    if not NUMPY_AVAILABLE:
+        logger.info("numpy не установлен, колоночное хранилище сообщений отключено")
+        return None
+    return ColumnarStore(capacity=settings.get('columnar_store_capacity', DEFAULT_CAPACITY))
+
+
+def read_summary(path: str = DEFAULT_COLUMNS_FILE, seconds: float = 300) -> Optional[Dict]:
+    """
+    Сводка по снимку координатора (для монитора, GUI и ИИ-моста)
+
+    Args:
+        path (str): Файл снимка .npz
+        seconds (float): Окно сводки
+
+    Returns:
+        dict: Сводка summary() с топом авторов или None (нет numpy или снимка)
+    """
+    store = ColumnarStore.load(path)
+    if store is None:
+        return None
+    summary = store.summary(seconds)
+    summary['top_authors'] = store.top_authors(5, seconds)
+    return summary
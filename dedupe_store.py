@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Хранилище ID уже принятых сообщений
+Ротируемый bloom-фильтр: ID помнятся заданное время (retention) независимо
+от того, сколько сообщений помещается в окне оверлея, а память ограничена
+размером фильтров. Повторы pytchat после переподключения отбрасываются,
+даже если исходные сообщения уже вытеснены из messages.json
+"""
+
+import math
+import time
+import hashlib
+import logging
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger('dedupe_store')
+
+# Значения по умолчанию (переопределяются в chat_settings.json)
+DEFAULT_RETENTION_SECONDS = 3600
+DEFAULT_CAPACITY = 50000
+DEFAULT_FALSE_POSITIVE_RATE = 1e-6
+DEFAULT_BUCKETS = 4
+
+
+class BloomFilter:
+    """Bloom-фильтр фиксированного размера на bytearray"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.size = max(int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))), 8)
+        self.hashes = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, key: str) -> List[int]:
+        """Позиции битов ключа (двойное хэширование одного дайджеста)"""
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hashes)]
+
+    def contains_positions(self, positions: List[int]) -> bool:
+        bits = self.bits
+        for position in positions:
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def add_positions(self, positions: List[int]):
+        bits = self.bits
+        for position in positions:
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.bits)
+
+
+class DedupeStore:
+    """
+    ID сообщений за последние retention_seconds
+
+    Время хранения разбито на buckets поколений одинакового размера: новые ID
+    пишутся в текущий фильтр, проверка идёт по всем, а самый старый фильтр
+    отбрасывается при ротации. Любой ID помнится не меньше retention_seconds.
+    Суммарная вероятность ложного срабатывания (принять новое сообщение
+    за повтор) не превышает false_positive_rate. Если поколение заполнилось
+    раньше срока, ротация происходит досрочно: точность сохраняется,
+    а горизонт временно сокращается
+    """
+
+    def __init__(self, retention_seconds: float = DEFAULT_RETENTION_SECONDS,
+                 capacity: int = DEFAULT_CAPACITY,
+                 false_positive_rate: float = DEFAULT_FALSE_POSITIVE_RATE,
+                 buckets: int = DEFAULT_BUCKETS):
+        self.retention_seconds = retention_seconds
+        self.buckets = max(buckets, 1)
+        self.bucket_span = retention_seconds / self.buckets
+        # Проверяются buckets + 1 фильтров, бюджет ошибки делится между ними
+        self.bucket_capacity = max(capacity // self.buckets, 1)
+        self.bucket_error_rate = false_positive_rate / (self.buckets + 1)
+
+        self.filters = deque(maxlen=self.buckets + 1)
+        self.current = None
+        self.current_started = 0.0
+        self._rotate(time.monotonic())
+
+        # Статистика
+        self.added = 0
+        self.duplicates = 0
+        self.rotations = 0
+        self.early_rotations = 0
+
+    def _rotate(self, now: float):
+        self.current = BloomFilter(self.bucket_capacity, self.bucket_error_rate)
+        self.current_started = now
+        self.filters.append(self.current)
+
+    def _maybe_rotate(self):
+        now = time.monotonic()
+        if now - self.current_started >= self.bucket_span:
+            self._rotate(now)
+            self.rotations += 1
+        elif self.current.count >= self.bucket_capacity:
+            logger.warning(f"⚠️ Поколение фильтра дубликатов заполнено за {now - self.current_started:.0f}s, досрочная ротация")
+            self._rotate(now)
+            self.rotations += 1
+            self.early_rotations += 1
+
+    def _seen(self, positions: List[int]) -> bool:
+        # Все поколения одного размера, позиции ключа считаются один раз
+        return any(bloom.contains_positions(positions) for bloom in self.filters)
+
+    def __contains__(self, key) -> bool:
+        if not key:
+            return False
+        return self._seen(self.current.positions(str(key)))
+
+    def add(self, key) -> bool:
+        """
+        Запоминает ID
+
+        Args:
+            key: ID сообщения
+
+        Returns:
+            bool: True если ID новый, False если он уже встречался за время хранения
+        """
+        if not key:
+            return True
+        self._maybe_rotate()
+
+        positions = self.current.positions(str(key))
+        if self._seen(positions):
+            self.duplicates += 1
+            return False
+
+        self.current.add_positions(positions)
+        self.added += 1
+        return True
+
+    def update(self, keys: Iterable):
+        """Запоминает несколько ID (например, сообщения из сохранённого файла)"""
+        for key in keys:
+            self.add(key)
+
+    def clear(self):
+        """Забывает все ID"""
+        self.filters.clear()
+        self._rotate(time.monotonic())
+
+    def get_stats(self) -> Dict:
+        """Возвращает статистику хранилища"""
+        return {
+            'added': self.added,
+            'duplicates': self.duplicates,
+            'rotations': self.rotations,
+            'early_rotations': self.early_rotations,
+            'filters': len(self.filters),
+            'memory_kb': sum(bloom.nbytes for bloom in self.filters) // 1024
+        }
+
+
+def dedupe_from_settings(settings: Optional[Dict] = None) -> DedupeStore:
+    """
+    Создаёт хранилище по chat_settings.json
+
+    Args:
+        settings (dict): Настройки (dedupe_retention_seconds, dedupe_capacity, dedupe_false_positive_rate)
+
+    Returns:
+        DedupeStore: Хранилище ID
+    """
+    settings = settings or {}
+    return DedupeStore(
+        retention_seconds=settings.get('dedupe_retention_seconds', DEFAULT_RETENTION_SECONDS),
+        capacity=settings.get('dedupe_capacity', DEFAULT_CAPACITY),
+        false_positive_rate=settings.get('dedupe_false_positive_rate', DEFAULT_FALSE_POSITIVE_RATE)
+    )
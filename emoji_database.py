@@ -7,9 +7,11 @@
 Содержит 3,686+ эмоджи для конвертации текстовых кодов в Unicode символы
 """
 
+from emoji_matcher import EmojiMatcher
+
 # Импортируем улучшенную систему эмоджи
 try:
-    from emoji_database_enhanced import convert_emojis as enhanced_convert, get_emoji_stats, search_emojis
+    from emoji_database_enhanced import convert_emojis as enhanced_convert, get_emoji_stats, get_emoji_version as enhanced_version, get_emoji_shortcodes as enhanced_shortcodes, search_emojis
     ENHANCED_AVAILABLE = True
     print("✅ Загружена улучшенная система эмоджи с поддержкой YouTube эмоджи")
 except ImportError:
@@ -407,6 +409,15 @@ EMOJI_DATABASE = {
     ':no_hair:': '👨‍🦲'
 }
 
+_basic_matcher = None
+
+def get_basic_matcher():
+    """Возвращает матчер по базовой базе данных (компилируется при первом вызове)"""
+    global _basic_matcher
+    if _basic_matcher is None:
+        _basic_matcher = EmojiMatcher(EMOJI_DATABASE)
+    return _basic_matcher
+
 def convert_emojis(text, performance_mode='balanced'):
     """
     Конвертирует текстовые коды эмоджи в Unicode символы
@@ -430,15 +441,8 @@ def convert_emojis(text, performance_mode='balanced'):
     if ENHANCED_AVAILABLE:
         return enhanced_convert(text, performance_mode)
     
-    # Fallback на базовую версию
-    result = text
-    
-    # Проходим по всем эмоджи в базе данных
-    for code, emoji in EMOJI_DATABASE.items():
-        # Заменяем все вхождения кода на эмоджи
-        result = result.replace(code, emoji)
-    
-    return result
+    # Fallback на базовую версию: один проход скомпилированным матчером
+    return get_basic_matcher().replace(text)
 
 def get_emoji_count():
     """Возвращает количество эмоджи в базе данных"""
@@ -447,6 +451,21 @@ def get_emoji_count():
         return stats.get('total_count', len(EMOJI_DATABASE))
     return len(EMOJI_DATABASE)
 
+def get_emoji_version():
+    """Возвращает версию базы эмоджи (меняется при изменении источников или таблиц)"""
+    if ENHANCED_AVAILABLE:
+        return enhanced_version()
+    return f"basic:{len(EMOJI_DATABASE)}"
+
+def get_emoji_shortcodes():
+    """Возвращает обратную таблицу: Unicode-эмоджи -> код"""
+    if ENHANCED_AVAILABLE:
+        return enhanced_shortcodes()
+    shortcodes = {}
+    for code, emoji in EMOJI_DATABASE.items():
+        shortcodes.setdefault(emoji, code)
+    return shortcodes
+
 def get_emoji_by_code(code):
     """Возвращает эмоджи по коду или None если не найден"""
     return EMOJI_DATABASE.get(code)
@@ -7,11 +7,14 @@
 """
 
 import json
-import re
 import time
+from collections import OrderedDict
 from typing import Dict, List, Tuple, Optional, Set
 from pathlib import Path
 
+from emoji_matcher import EmojiMatcher
+import emoji_index_cache
+
 # Импортируем утилиты для работы с консолью
 try:
     from console_utils import setup_console_encoding, print_with_fallback
@@ -22,21 +25,59 @@ except ImportError:
     # Fallback если console_utils недоступен
     safe_print = print
 
+# Источники таблиц эмоджи
+UNICODE_EMOJI_PATH = Path("D:/vMix/liveChat/Emoji-List-Unicode/json/all-emoji.json")
+MODIFIERS_EMOJI_PATH = Path("D:/vMix/liveChat/Emoji-List-Unicode/json/full-emoji-modifiers.json")
+YOUTUBE_EMOJI_JSON_PATH = Path("youtube_emojis.json")
+YOUTUBE_EMOJI_CSV_PATH = Path("D:/vMix/liveChat/youtubeemoji.csv")
+HONEY_CLUB_EMOJI_DIR = Path("Emoji-Honey-Club")
+
+# Ограничения LRU-кэша преобразованных сообщений
+TEXT_CACHE_MAX_ENTRIES = 4096
+TEXT_CACHE_MAX_CHARS = 2_000_000  # Суммарная длина исходных текстов и результатов
+TEXT_CACHE_MAX_TEXT_LENGTH = 1000  # Длинные сообщения почти не повторяются - не кэшируем
+
+_MODULE_DIR = Path(__file__).resolve().parent
+
+def get_index_sources():
+    """Возвращает файлы и папки, от которых зависит индекс эмоджи"""
+    files = [
+        UNICODE_EMOJI_PATH,
+        MODIFIERS_EMOJI_PATH,
+        YOUTUBE_EMOJI_JSON_PATH,
+        YOUTUBE_EMOJI_CSV_PATH,
+        # Код, определяющий популярные эмоджи, разбор источников и формат матчера
+        _MODULE_DIR / "emoji_database_enhanced.py",
+        _MODULE_DIR / "honey_club_emojis.py",
+        _MODULE_DIR / "emoji_matcher.py"
+    ]
+    dirs = [(HONEY_CLUB_EMOJI_DIR, "*.png")]
+    return files, dirs
+
 class EmojiDatabase:
     """
     Оптимизированная база данных эмоджи с многоуровневой системой приоритетов
     """
     
-    def __init__(self):
+    def __init__(self, use_index: bool = True):
         self.popular_emojis = {}  # Уровень 1: Популярные эмоджи
         self.basic_emojis = {}    # Уровень 2: Базовые Unicode
         self.full_emojis = {}     # Уровень 3: Полная база
         self.youtube_emojis = {}  # Уровень 4: YouTube эмоджи
         self.honey_club_emojis = {}  # Уровень 5: Персональные эмоджи канала
         
-        # Кэш для производительности
-        self.emoji_cache = {}
-        self.compiled_patterns = {}
+        # LRU-кэш преобразованных сообщений: (текст, уровень, версия базы) -> (результат, найденные коды)
+        self.emoji_cache = OrderedDict()
+        self.cache_chars = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_evictions = 0
+        
+        # Версия таблиц: меняется при загрузке уровней и оптимизации
+        self.version = 0
+        
+        # Скомпилированные матчеры по максимальному уровню (строятся при загрузке уровней)
+        self.matchers = {}
         
         # Статистика использования
         self.usage_stats = {}
@@ -44,8 +85,62 @@ class EmojiDatabase:
         # Флаги загрузки
         self.levels_loaded = {1: False, 2: False, 3: False, 4: False, 5: False}
         
+        # Состояние бинарного кэша индекса
+        self.index_key = None
+        self.index_loaded = False
+        self.index_build_attempted = False
+        self.tables_modified = False
+        
         # Загружаем популярные эмоджи при инициализации
         self._load_popular_emojis()
+        
+        # Все уровни и матчеры из кэша, если источники не менялись
+        if use_index:
+            self._load_index()
+    
+    def _load_index(self) -> bool:
+        """Загружает таблицы и матчеры из бинарного кэша индекса"""
+        start_time = time.time()
+        try:
+            self.index_key = emoji_index_cache.compute_source_key(*get_index_sources())
+            data = emoji_index_cache.load_index(self.index_key)
+            if data is None:
+                return False
+            
+            (self.popular_emojis, self.basic_emojis, self.full_emojis,
+             self.youtube_emojis, self.honey_club_emojis) = data['tables']
+            self.levels_loaded = dict(data['levels_loaded'])
+            self.matchers = {level: EmojiMatcher.from_state(state) for level, state in data['matchers'].items()}
+            self.index_loaded = True
+            
+            safe_print(f"⚡ Индекс эмоджи загружен из кэша за {(time.time() - start_time) * 1000:.1f} мс")
+            return True
+        except Exception as e:
+            print(f"Ошибка загрузки индекса эмоджи: {e}")
+            return False
+    
+    def build_index(self) -> bool:
+        """
+        Загружает все уровни, компилирует полный матчер и сохраняет индекс
+        
+        Returns:
+            bool: True если индекс сохранён
+        """
+        # Пересборка не повторяется, даже если кэш не удалось записать (нет прав, диск заполнен)
+        self.index_build_attempted = True
+        if self.index_key is None:
+            self.index_key = emoji_index_cache.compute_source_key(*get_index_sources())
+        
+        self._ensure_levels_loaded(5)
+        self._get_matcher(5)
+        
+        data = {
+            'tables': [self.popular_emojis, self.basic_emojis, self.full_emojis,
+                       self.youtube_emojis, self.honey_club_emojis],
+            'levels_loaded': self.levels_loaded,
+            'matchers': {level: matcher.get_state() for level, matcher in self.matchers.items()}
+        }
+        return emoji_index_cache.save_index(data, self.index_key)
     
     def _load_popular_emojis(self):
         """Загрузка популярных эмоджи (Уровень 1)"""
@@ -227,7 +322,7 @@ class EmojiDatabase:
         }
         
         self.levels_loaded[1] = True
-        self._compile_patterns(self.popular_emojis)
+        self._invalidate_matchers()
     
     def _load_basic_emojis(self):
         """Загрузка базовых Unicode эмоджи (Уровень 2)"""
@@ -235,7 +330,7 @@ class EmojiDatabase:
             return
             
         try:
-            unicode_path = Path("D:/vMix/liveChat/Emoji-List-Unicode/json/all-emoji.json")
+            unicode_path = UNICODE_EMOJI_PATH
             if unicode_path.exists():
                 with open(unicode_path, 'r', encoding='utf-8') as f:
                     data = json.load(f)
@@ -254,6 +349,7 @@ class EmojiDatabase:
                                 self.basic_emojis[code] = emoji
                 
                 self.levels_loaded[2] = True
+                self._invalidate_matchers()
                 safe_print(f"Загружено {len(self.basic_emojis)} базовых эмоджи")
                 
         except Exception as e:
@@ -269,7 +365,7 @@ class EmojiDatabase:
             self._load_basic_emojis()
             
             # Загружаем эмоджи с модификаторами
-            modifiers_path = Path("D:/vMix/liveChat/Emoji-List-Unicode/json/full-emoji-modifiers.json")
+            modifiers_path = MODIFIERS_EMOJI_PATH
             if modifiers_path.exists():
                 with open(modifiers_path, 'r', encoding='utf-8') as f:
                     data = json.load(f)
@@ -282,6 +378,7 @@ class EmojiDatabase:
                             self.full_emojis[code] = emoji
                 
                 self.levels_loaded[3] = True
+                self._invalidate_matchers()
                 safe_print(f"Загружено {len(self.full_emojis)} эмоджи с модификаторами")
                 
         except Exception as e:
@@ -294,18 +391,19 @@ class EmojiDatabase:
             
         try:
             # Сначала пробуем загрузить из обновленного JSON с локальными путями
-            youtube_json_path = Path("youtube_emojis.json")
+            youtube_json_path = YOUTUBE_EMOJI_JSON_PATH
             if youtube_json_path.exists():
                 with open(youtube_json_path, 'r', encoding='utf-8') as f:
                     youtube_data = json.load(f)
                     # JSON уже содержит готовые HTML-теги с локальными путями
                     self.youtube_emojis.update(youtube_data)
                     self.levels_loaded[4] = True
+                    self._invalidate_matchers()
                     safe_print(f"Загружено {len(self.youtube_emojis)} YouTube эмоджи из JSON (локальные пути)")
                     return
             
             # Fallback: загружаем из CSV (старый способ)
-            youtube_path = Path("D:/vMix/liveChat/youtubeemoji.csv")
+            youtube_path = YOUTUBE_EMOJI_CSV_PATH
             if youtube_path.exists():
                 with open(youtube_path, 'r', encoding='utf-8') as f:
                     lines = f.readlines()[1:]  # Пропускаем заголовок
@@ -320,6 +418,7 @@ class EmojiDatabase:
                             self.youtube_emojis[label] = f'<img src="{url}" alt="{label}" class="youtube-emoji">'
                 
                 self.levels_loaded[4] = True
+                self._invalidate_matchers()
                 safe_print(f"Загружено {len(self.youtube_emojis)} YouTube эмоджи из CSV")
                 
         except Exception as e:
@@ -336,6 +435,7 @@ class EmojiDatabase:
             
             self.honey_club_emojis = get_honey_club_emojis()
             self.levels_loaded[5] = True
+            self._invalidate_matchers()
             safe_print(f"🍯 Загружено {len(self.honey_club_emojis)} персональных эмоджи канала Honey Club")
             
         except ImportError:
@@ -343,13 +443,58 @@ class EmojiDatabase:
         except Exception as e:
             print(f"Ошибка загрузки персональных эмоджи: {e}")
     
-    def _compile_patterns(self, emoji_dict: Dict[str, str]):
-        """Предварительная компиляция регулярных выражений для быстрой замены"""
-        for code in emoji_dict.keys():
-            if code not in self.compiled_patterns:
-                # Экранируем специальные символы
-                escaped_code = re.escape(code)
-                self.compiled_patterns[code] = re.compile(escaped_code)
+    def _invalidate_matchers(self):
+        """Сбрасывает скомпилированные матчеры после изменения таблиц эмоджи"""
+        self.matchers = {}
+        self.version += 1
+        self._clear_text_cache()
+    
+    def _clear_text_cache(self):
+        """Очищает кэш преобразованных сообщений (записи старой версии уже недостижимы)"""
+        self.emoji_cache.clear()
+        self.cache_chars = 0
+    
+    def _cache_result(self, key: Tuple[str, int, int], result: str, matched_codes: Tuple[str, ...]):
+        """Сохраняет результат в LRU-кэш, вытесняя самые старые записи сверх лимитов"""
+        text = key[0]
+        if len(text) > TEXT_CACHE_MAX_TEXT_LENGTH:
+            return
+        
+        self.emoji_cache[key] = (result, matched_codes)
+        self.cache_chars += len(text) + len(result)
+        
+        while len(self.emoji_cache) > TEXT_CACHE_MAX_ENTRIES or self.cache_chars > TEXT_CACHE_MAX_CHARS:
+            (old_text, _, _), (old_result, _) = self.emoji_cache.popitem(last=False)
+            self.cache_chars -= len(old_text) + len(old_result)
+            self.cache_evictions += 1
+    
+    def _get_level_tables(self, max_level: int) -> List[Dict[str, str]]:
+        """Возвращает таблицы эмоджи уровней 1..max_level в порядке приоритета"""
+        tables = [self.popular_emojis, self.basic_emojis, self.full_emojis,
+                  self.youtube_emojis, self.honey_club_emojis]
+        return tables[:max(1, min(max_level, len(tables)))]
+    
+    def _get_matcher(self, max_level: int) -> EmojiMatcher:
+        """Возвращает матчер для уровня, компилируя его один раз после загрузки уровней"""
+        matcher = self.matchers.get(max_level)
+        if matcher is None:
+            matcher = EmojiMatcher()
+            # Более низкий уровень имеет приоритет, как и при последовательной замене
+            for table in self._get_level_tables(max_level):
+                matcher.add_all(table)
+            self.matchers[max_level] = matcher
+        return matcher
+    
+    def _ensure_levels_loaded(self, max_level: int):
+        """Подгружает уровни 2..max_level по требованию"""
+        if max_level >= 2:
+            self._load_basic_emojis()
+        if max_level >= 3:
+            self._load_full_emojis()
+        if max_level >= 4:
+            self._load_youtube_emojis()
+        if max_level >= 5:
+            self._load_honey_club_emojis()
     
     def convert_emojis(self, text: str, max_level: int = 2) -> str:
         """
@@ -371,51 +516,33 @@ class EmojiDatabase:
             return text
         
         start_time = time.time()
-        result = text
-        replacements_made = 0
-        
-        # Уровень 1: Популярные эмоджи (всегда загружены)
-        for code, emoji in self.popular_emojis.items():
-            if code in result:
-                result = result.replace(code, emoji)
-                replacements_made += 1
-                self._update_usage_stats(code)
         
-        # Уровень 2: Базовые эмоджи
-        if max_level >= 2:
-            self._load_basic_emojis()
-            for code, emoji in self.basic_emojis.items():
-                if code in result:
-                    result = result.replace(code, emoji)
-                    replacements_made += 1
-                    self._update_usage_stats(code)
+        self._ensure_levels_loaded(max_level)
         
-        # Уровень 3: Полные эмоджи
-        if max_level >= 3:
-            self._load_full_emojis()
-            for code, emoji in self.full_emojis.items():
-                if code in result:
-                    result = result.replace(code, emoji)
-                    replacements_made += 1
-                    self._update_usage_stats(code)
+        # Кэш отсутствовал или устарел - пересобираем его из только что загруженных таблиц
+        if (max_level >= 5 and self.index_key is not None and not self.index_loaded
+                and not self.index_build_attempted and not self.tables_modified):
+            self.build_index()
         
-        # Уровень 4: YouTube эмоджи
-        if max_level >= 4:
-            self._load_youtube_emojis()
-            for code, emoji_html in self.youtube_emojis.items():
-                if code in result:
-                    result = result.replace(code, emoji_html)
-                    replacements_made += 1
-                    self._update_usage_stats(code)
+        # Повторяющиеся сообщения (спам, копипаста) берём из кэша
+        key = (text, max_level, self.version)
+        cached = self.emoji_cache.get(key)
+        if cached is not None:
+            self.emoji_cache.move_to_end(key)
+            self.cache_hits += 1
+            result, matched_codes = cached
+            for code in matched_codes:
+                self._update_usage_stats(code)
+            return result
+        self.cache_misses += 1
         
-        # Уровень 5: Персональные эмоджи канала Honey Club
-        if max_level >= 5:
-            self._load_honey_club_emojis()
-            for code, emoji_html in self.honey_club_emojis.items():
-                if code in result:
-                    result = result.replace(code, emoji_html)
-                    replacements_made += 1
-                    self._update_usage_stats(code)
+        # Один проход по тексту с выбором самого длинного кода
+        matched_codes = []
+        result = self._get_matcher(max_level).replace(text, matched_codes.append)
+        for code in matched_codes:
+            self._update_usage_stats(code)
+        replacements_made = len(matched_codes)
+        self._cache_result(key, result, tuple(matched_codes))
         
         processing_time = time.time() - start_time
         
@@ -451,6 +578,10 @@ class EmojiDatabase:
                     self.popular_emojis[code] = self.full_emojis[code]
                     del self.full_emojis[code]
         
+        self._invalidate_matchers()
+        # Таблицы отличаются от источников - в индекс их не сохраняем
+        self.tables_modified = True
+        
         safe_print(f"🔧 Оптимизация: добавлено {len([c for c in popular_from_usage if c in self.popular_emojis])} эмоджи в популярные")
     
     def get_stats(self) -> Dict:
@@ -463,9 +594,25 @@ class EmojiDatabase:
             'honey_club_count': len(self.honey_club_emojis) if self.levels_loaded[5] else 'не загружено',
             'total_usage': sum(self.usage_stats.values()),
             'unique_used': len(self.usage_stats),
-            'levels_loaded': self.levels_loaded
+            'levels_loaded': self.levels_loaded,
+            'cache_size': len(self.emoji_cache),
+            'cache_chars': self.cache_chars,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'cache_evictions': self.cache_evictions,
+            'cache_hit_rate': round(self.cache_hits / max(self.cache_hits + self.cache_misses, 1), 3)
         }
     
+    def get_shortcodes(self, max_level: int = 3) -> Dict[str, str]:
+        """Обратная таблица Unicode-эмоджи -> код уровней 1..max_level (картинки пропускаются)"""
+        self._ensure_levels_loaded(max_level)
+        shortcodes = {}
+        for table in self._get_level_tables(max_level):
+            for code, emoji in table.items():
+                if emoji and '<' not in emoji and emoji not in shortcodes:
+                    shortcodes[emoji] = code
+        return shortcodes
+    
     def search_emojis(self, query: str, max_results: int = 20) -> Dict[str, str]:
         """Поиск эмоджи по запросу"""
         query = query.lower()
@@ -526,6 +673,14 @@ def get_emoji_stats():
     """Возвращает статистику эмоджи базы"""
     return emoji_db.get_stats()
 
+def get_emoji_version() -> str:
+    """Версия базы эмоджи: ключ исходных файлов (тот же, что у бинарного индекса)"""
+    return emoji_db.index_key or emoji_index_cache.compute_source_key(*get_index_sources())
+
+def get_emoji_shortcodes() -> Dict[str, str]:
+    """Коды Unicode-эмоджи (для поиска по тексту с эмоджи)"""
+    return emoji_db.get_shortcodes()
+
 def search_emojis(query: str, max_results: int = 20):
     """Поиск эмоджи по запросу"""
     return emoji_db.search_emojis(query, max_results)
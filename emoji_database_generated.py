@@ -6,6 +6,8 @@
 Содержит 3686 эмоджи
 """
 
+from emoji_matcher import EmojiMatcher
+
 # Популярные эмоджи (Уровень 1) - быстрая загрузка
 POPULAR_EMOJIS = {
     ':(': '😢',
@@ -3735,6 +3737,16 @@ def get_emoji_database(level=2):
     
     return result
 
+_MATCHERS = {}
+
+def get_emoji_matcher(level=2):
+    """Возвращает скомпилированный матчер для уровня (строится один раз)"""
+    matcher = _MATCHERS.get(level)
+    if matcher is None:
+        matcher = EmojiMatcher(get_emoji_database(level))
+        _MATCHERS[level] = matcher
+    return matcher
+
 def convert_emojis(text, level=2):
     """
     Конвертирует эмоджи в тексте
@@ -3749,13 +3761,7 @@ def convert_emojis(text, level=2):
     if not text:
         return text
     
-    emoji_db = get_emoji_database(level)
-    result = text
-    
-    for code, emoji in emoji_db.items():
-        result = result.replace(code, emoji)
-    
-    return result
+    return get_emoji_matcher(level).replace(text)
 
 def get_stats():
     """Возвращает статистику базы данных"""
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Бинарный кэш индекса эмоджи
+Таблицы всех уровней и скомпилированные матчеры сохраняются одним файлом
+в формате marshal. Файл привязан к ключу из хэшей исходных файлов
+и версии Python: при изменении любого источника кэш игнорируется
+и пересобирается при следующей полной загрузке базы
+
+Ручная сборка: python emoji_index_cache.py
+"""
+
+import os
+import sys
+import time
+import marshal
+import hashlib
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger('emoji_index_cache')
+
+# Файл индекса (рядом с остальными данными проекта)
+INDEX_PATH = 'emoji_index.cache'
+
+# Версия структуры индекса; увеличивается при изменении формата данных
+INDEX_FORMAT = 1
+
+MAGIC = b'EMJIDX'
+
+
+def compute_source_key(source_files: Iterable[Path],
+                       source_dirs: Iterable[Tuple[Path, str]] = ()) -> str:
+    """
+    Вычисляет ключ индекса по содержимому исходных файлов
+
+    Args:
+        source_files: Файлы, из которых строятся таблицы (отсутствующие тоже учитываются)
+        source_dirs: Пары (папка, шаблон), для которых учитывается список файлов
+
+    Returns:
+        str: Хэш источников, формата индекса и версии Python
+    """
+    digest = hashlib.sha1()
+    # marshal не совместим между версиями Python
+    digest.update(f"{INDEX_FORMAT}|{sys.version}".encode('utf-8'))
+
+    for path in source_files:
+        digest.update(str(path).encode('utf-8'))
+        try:
+            with open(path, 'rb') as f:
+                digest.update(hashlib.sha1(f.read()).digest())
+        except OSError:
+            digest.update(b'<missing>')
+
+    for path, pattern in source_dirs:
+        digest.update(f"{path}/{pattern}".encode('utf-8'))
+        names = sorted(item.name for item in Path(path).glob(pattern)) if Path(path).exists() else []
+        digest.update('\n'.join(names).encode('utf-8'))
+
+    return digest.hexdigest()
+
+
+def load_index(key: str, path: str = INDEX_PATH) -> Optional[Dict]:
+    """
+    Загружает индекс, если он собран для тех же источников
+
+    Returns:
+        dict: Данные индекса или None, если файла нет, он повреждён или устарел
+    """
+    try:
+        with open(path, 'rb') as f:
+            blob = f.read()
+    except OSError:
+        return None
+
+    if not blob.startswith(MAGIC):
+        return None
+
+    try:
+        data = marshal.loads(blob[len(MAGIC):])
+    except (ValueError, EOFError, TypeError):
+        logger.warning(f"Индекс эмоджи {path} повреждён, будет пересобран")
+        return None
+
+    if not isinstance(data, dict) or data.get('key') != key:
+        return None
+    return data
+
+
+def save_index(data: Dict, key: str, path: str = INDEX_PATH) -> bool:
+    """
+    Атомарно сохраняет индекс
+
+    Args:
+        data (dict): Таблицы и матчеры (только типы, поддерживаемые marshal)
+        key (str): Ключ источников из compute_source_key()
+        path (str): Файл индекса
+
+    Returns:
+        bool: True если индекс записан
+    """
+    temp_path = f"{path}.tmp.{os.getpid()}"
+    try:
+        payload = dict(data, key=key)
+        with open(temp_path, 'wb') as f:
+            f.write(MAGIC)
+            f.write(marshal.dumps(payload))
+        os.replace(temp_path, path)
+        return True
+    except Exception as e:
+        logger.warning(f"Не удалось сохранить индекс эмоджи {path}: {e}")
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        return False
+
+
+if __name__ == "__main__":
+    from emoji_database_enhanced import EmojiDatabase, safe_print
+
+    start = time.time()
+    db = EmojiDatabase(use_index=False)
+    if db.build_index():
+        size_kb = os.path.getsize(INDEX_PATH) / 1024
+        safe_print(f"✅ Индекс эмоджи собран за {time.time() - start:.2f}s: {INDEX_PATH} ({size_kb:.0f} КБ)")
+    else:
+        safe_print("❌ Не удалось собрать индекс эмоджи")
+        sys.exit(1)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Многошаблонный матчер кодов эмоджи
+Префиксное дерево (trie) строится один раз при загрузке словаря,
+после чего сообщение обрабатывается за один проход слева направо
+с выбором самого длинного совпадения в каждой позиции
+"""
+
+from typing import Callable, Dict, Optional, Tuple
+
+# Ключ конечного узла: пустая строка не может совпасть ни с одним символом текста
+_END = ''
+
+
+class EmojiMatcher:
+    """
+    Скомпилированный матчер для замены кодов эмоджи за один проход
+
+    Стоимость обработки зависит от длины сообщения и длины самого длинного кода,
+    а не от размера словаря
+    """
+
+    def __init__(self, emoji_dict: Optional[Dict[str, str]] = None):
+        self.root = {}
+        self.size = 0
+        self.max_code_length = 0
+
+        if emoji_dict:
+            self.add_all(emoji_dict)
+
+    def add(self, code: str, replacement: str, overwrite: bool = False) -> bool:
+        """
+        Добавляет код в дерево
+
+        Args:
+            code (str): Текстовый код эмоджи (например ':fire:')
+            replacement (str): Чем заменять код
+            overwrite (bool): Перезаписывать ли уже существующий код
+
+        Returns:
+            bool: True если код был добавлен или перезаписан
+        """
+        if not code:
+            return False
+
+        node = self.root
+        for char in code:
+            node = node.setdefault(char, {})
+
+        if _END in node:
+            if not overwrite:
+                return False
+        else:
+            self.size += 1
+
+        node[_END] = replacement
+        if len(code) > self.max_code_length:
+            self.max_code_length = len(code)
+        return True
+
+    def add_all(self, emoji_dict: Dict[str, str], overwrite: bool = False):
+        """Добавляет все коды словаря (по умолчанию первый добавленный код имеет приоритет)"""
+        for code, replacement in emoji_dict.items():
+            self.add(code, replacement, overwrite)
+
+    def replace(self, text: str, on_match: Optional[Callable[[str], None]] = None) -> str:
+        """
+        Заменяет все коды эмоджи в тексте за один проход
+
+        Args:
+            text (str): Исходный текст
+            on_match (callable): Вызывается с каждым найденным кодом (для статистики)
+
+        Returns:
+            str: Текст с замененными эмоджи
+        """
+        if not text or not self.size:
+            return text
+
+        root = self.root
+        parts = []
+        length = len(text)
+        last = 0
+        i = 0
+
+        while i < length:
+            node = root.get(text[i])
+            if node is None:
+                i += 1
+                continue
+
+            # Идём по дереву, запоминая самое длинное совпадение
+            match_end = -1
+            replacement = None
+            j = i + 1
+            if _END in node:
+                match_end = j
+                replacement = node[_END]
+            while j < length:
+                node = node.get(text[j])
+                if node is None:
+                    break
+                j += 1
+                if _END in node:
+                    match_end = j
+                    replacement = node[_END]
+
+            if match_end < 0:
+                i += 1
+                continue
+
+            if last < i:
+                parts.append(text[last:i])
+            parts.append(replacement)
+            if on_match is not None:
+                on_match(text[i:match_end])
+            i = last = match_end
+
+        if not parts:
+            return text
+
+        parts.append(text[last:])
+        return ''.join(parts)
+
+    def get_state(self) -> Tuple[dict, int, int]:
+        """Возвращает таблицы матчера для сохранения в кэш индекса (только dict/str/int)"""
+        return self.root, self.size, self.max_code_length
+
+    @classmethod
+    def from_state(cls, state: Tuple[dict, int, int]) -> 'EmojiMatcher':
+        """Восстанавливает матчер из таблиц, сохранённых get_state(), без перестроения дерева"""
+        matcher = cls()
+        matcher.root, matcher.size, matcher.max_code_length = state
+        return matcher
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, code: str) -> bool:
+        node = self.root
+        for char in code:
+            node = node.get(char)
+            if node is None:
+                return False
+        return _END in node
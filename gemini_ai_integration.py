@@ -353,12 +353,13 @@ class InteractiveManager:
         self.last_analysis_time = 0
         self.analysis_interval = 300  # 5 минут между анализами
     
-    async def process_chat_messages(self, messages: List[ChatMessage]) -> Dict:
+    async def process_chat_messages(self, messages: List[ChatMessage], force: bool = False) -> Dict:
         """
         Обрабатывает сообщения чата и возвращает рекомендации
         
         Args:
             messages: Список сообщений для обработки
+            force: Не ждать analysis_interval (эскалация локальной оценки настроения)
             
         Returns:
             Словарь с рекомендациями и анализом
@@ -366,8 +367,8 @@ class InteractiveManager:
         
         current_time = time.time()
         
-        # Анализируем чат не чаще раза в 5 минут
-        if current_time - self.last_analysis_time < self.analysis_interval:
+        # Анализируем чат не чаще раза в 5 минут (лимиты API проверяет RateLimiter)
+        if not force and current_time - self.last_analysis_time < self.analysis_interval:
             return {"status": "waiting", "next_analysis_in": self.analysis_interval - (current_time - self.last_analysis_time)}
         
         # Анализируем настроение
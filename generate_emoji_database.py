@@ -293,6 +293,7 @@ class EmojiDatabaseGenerator:
             f.write('Автоматически сгенерированная база данных эмоджи\n')
             f.write(f'Содержит {len(self.popular_emojis) + len(self.basic_emojis) + len(self.full_emojis) + len(self.youtube_emojis)} эмоджи\n')
             f.write('"""\n\n')
+            f.write('from emoji_matcher import EmojiMatcher\n\n')
             
             # Популярные эмоджи
             f.write('# Популярные эмоджи (Уровень 1) - быстрая загрузка\n')
@@ -350,6 +351,16 @@ class EmojiDatabaseGenerator:
     
     return result
 
+_MATCHERS = {}
+
+def get_emoji_matcher(level=2):
+    """Возвращает скомпилированный матчер для уровня (строится один раз)"""
+    matcher = _MATCHERS.get(level)
+    if matcher is None:
+        matcher = EmojiMatcher(get_emoji_database(level))
+        _MATCHERS[level] = matcher
+    return matcher
+
 def convert_emojis(text, level=2):
     """
     Конвертирует эмоджи в тексте
@@ -364,13 +375,7 @@ def convert_emojis(text, level=2):
     if not text:
         return text
     
-    emoji_db = get_emoji_database(level)
-    result = text
-    
-    for code, emoji in emoji_db.items():
-        result = result.replace(code, emoji)
-    
-    return result
+    return get_emoji_matcher(level).replace(text)
 
 def get_stats():
     """Возвращает статистику базы данных"""
@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Append-only журнал сообщений чата в формате NDJSON
+Каждое сообщение дописывается одной строкой с монотонно растущим seq,
+читатели забирают новые строки по байтовому смещению и пропускают записи
+с seq не больше последнего прочитанного, а messages.json рендерится
+как снимок не чаще раза в N мс
+"""
+
+import os
+import json
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger('message_journal')
+
+# Минимальное количество строк в журнале перед компакцией
+MIN_COMPACT_LINES = 1000
+
+# Маркеры очереди фоновой записи
+_END_BATCH = object()
+_STOP = object()
+
+
+def journal_path_for(snapshot_path: str) -> str:
+    """Возвращает путь журнала для файла снимка (messages.json -> messages.ndjson)"""
+    base, _ = os.path.splitext(snapshot_path)
+    return f"{base}.ndjson"
+
+
+def encode_record(message: Dict) -> bytes:
+    """Кодирует сообщение в одну строку NDJSON"""
+    line = json.dumps(message, ensure_ascii=False, separators=(',', ':'))
+    return (line + '\n').encode('utf-8')
+
+
+def clear_journal(snapshot_path: str):
+    """Очищает журнал, связанный с файлом снимка"""
+    try:
+        with open(journal_path_for(snapshot_path), 'wb'):
+            pass
+    except Exception as e:
+        logger.error(f"Не удалось очистить журнал для {snapshot_path}: {e}")
+
+
+def read_journal_tail(path: str, limit: int) -> List[Dict]:
+    """Читает последние limit записей журнала"""
+    tail = deque(maxlen=limit)
+    if limit <= 0 or not os.path.exists(path):
+        return []
+
+    with open(path, 'rb') as f:
+        for raw_line in f:
+            if raw_line.endswith(b'\n'):
+                tail.append(raw_line)
+
+    records = []
+    for raw_line in tail:
+        try:
+            records.append(json.loads(raw_line))
+        except ValueError:
+            continue
+    return records
+
+
+class JournalReader:
+    """
+    Читатель журнала по байтовому смещению и курсору seq
+
+    Разбирает только строки, дописанные с прошлого чтения. Незавершённая
+    последняя строка остаётся до следующего вызова. После компакции (замены
+    файла) журнал перечитывается с начала, а уже выданные записи отсекаются
+    по seq. Если максимальный seq в файле меньше курсора или файл очищен
+    на месте, значит парсер начал журнал заново, и курсор сбрасывается
+    """
+
+    def __init__(self, path: str, last_seq: int = 0):
+        self.path = path
+        self.offset = 0
+        self.file_id = None
+        self.last_seq = last_seq
+
+    def read_new(self) -> List[Dict]:
+        """Возвращает записи с seq больше последнего прочитанного"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self.offset = 0
+            self.file_id = None
+            return []
+
+        file_id = (stat.st_dev, stat.st_ino)
+        rewound = False
+        if file_id == self.file_id and stat.st_size < self.offset:
+            # Файл очищен на месте - журнал начат заново
+            logger.info(f"Журнал {self.path} очищен, курсор сброшен")
+            self.offset = 0
+            self.last_seq = 0
+        elif file_id != self.file_id:
+            # Файл заменён компакцией - читаем с начала
+            self.file_id = file_id
+            self.offset = 0
+            rewound = True
+
+        if stat.st_size == self.offset:
+            return []
+
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            chunk = f.read(stat.st_size - self.offset)
+
+        end = chunk.rfind(b'\n')
+        if end < 0:
+            return []
+
+        self.offset += end + 1
+        records = []
+        for raw_line in chunk[:end].split(b'\n'):
+            if not raw_line.strip():
+                continue
+            try:
+                records.append(json.loads(raw_line))
+            except ValueError:
+                logger.warning(f"Пропущена повреждённая строка журнала {self.path}")
+
+        if rewound and records:
+            max_seq = max(record.get('seq', 0) for record in records)
+            if max_seq < self.last_seq:
+                logger.info(f"Журнал {self.path} начат заново (seq {max_seq} < {self.last_seq}), курсор сброшен")
+                self.last_seq = 0
+
+        fresh = []
+        for record in records:
+            seq = record.get('seq')
+            if seq is None:
+                fresh.append(record)
+            elif seq > self.last_seq:
+                fresh.append(record)
+                self.last_seq = seq
+        return fresh
+
+
+class MessageJournal:
+    """
+    Журнал сообщений парсера
+
+    Сообщения дописываются в NDJSON без перезаписи файла и получают поле seq,
+    журнал периодически компактируется до последних max_messages записей,
+    а снимок messages.json рендерится с троттлингом через
+    snapshot_writer(messages, snapshot_path)
+    """
+
+    def __init__(self, snapshot_path: str,
+                 snapshot_writer: Optional[Callable[[List[Dict], str], None]] = None,
+                 max_messages: int = 50,
+                 snapshot_interval_ms: int = 500,
+                 compact_factor: int = 4):
+        self.snapshot_path = snapshot_path
+        self.path = journal_path_for(snapshot_path)
+        self.snapshot_writer = snapshot_writer
+        self.max_messages = max_messages
+        self.snapshot_interval = max(snapshot_interval_ms, 0) / 1000.0
+        self.compact_threshold = max(max_messages * compact_factor, MIN_COMPACT_LINES)
+
+        self.line_count = self._count_lines()
+        self.last_seq = self._recover_last_seq()
+        self.file = open(self.path, 'ab')
+
+        # Состояние снимка
+        self.snapshot_lock = threading.Lock()
+        self.pending_messages = None
+        self.snapshot_timer = None
+        self.last_snapshot_time = 0.0
+
+        # Статистика
+        self.appended = 0
+        self.snapshots_written = 0
+        self.compactions = 0
+
+    def _count_lines(self) -> int:
+        if not os.path.exists(self.path):
+            return 0
+        count = 0
+        with open(self.path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 16), b''):
+                count += block.count(b'\n')
+        return count
+
+    def _recover_last_seq(self) -> int:
+        """Восстанавливает последний seq из хвоста журнала после перезапуска"""
+        try:
+            tail = read_journal_tail(self.path, 1)
+        except Exception:
+            return 0
+        return tail[-1].get('seq', 0) if tail else 0
+
+    def assign_seq(self, message: Dict) -> int:
+        """
+        Назначает сообщению следующий seq
+
+        Парсер вызывает его в потоке чтения чата до того, как сообщение попадёт
+        в общий список снимка: словарь не должен меняться, пока другой поток
+        сериализует снимок
+
+        Returns:
+            int: Назначенный seq
+        """
+        self.last_seq += 1
+        message['seq'] = self.last_seq
+        return self.last_seq
+
+    def append(self, message: Dict):
+        """Дописывает одно сообщение в журнал"""
+        self.append_many([message])
+
+    def append_many(self, messages: List[Dict], assign_seq: bool = True):
+        """
+        Дописывает пачку сообщений одной операцией записи
+
+        Args:
+            messages (list): Сообщения в порядке приёма
+            assign_seq (bool): Назначить seq; False - seq уже назначен через assign_seq()
+        """
+        if not messages:
+            return
+        if assign_seq:
+            for message in messages:
+                self.assign_seq(message)
+        self.file.write(b''.join(encode_record(message) for message in messages))
+        self.file.flush()
+        self.line_count += len(messages)
+        self.appended += len(messages)
+
+        if self.line_count > self.compact_threshold:
+            self.compact()
+
+    def compact(self):
+        """Переписывает журнал, оставляя только последние max_messages записей"""
+        tail = deque(maxlen=self.max_messages)
+        temp_path = f"{self.path}.tmp.{os.getpid()}"
+        try:
+            self.file.close()
+            with open(self.path, 'rb') as f:
+                for raw_line in f:
+                    if raw_line.endswith(b'\n'):
+                        tail.append(raw_line)
+            with open(temp_path, 'wb') as f:
+                f.writelines(tail)
+            os.replace(temp_path, self.path)
+            self.line_count = len(tail)
+            self.compactions += 1
+            logger.debug(f"Журнал {self.path} сжат до {len(tail)} записей")
+        except Exception as e:
+            # Файл может быть временно занят читателем - попробуем при следующем пороге
+            logger.warning(f"⚠️ Не удалось сжать журнал {self.path}: {e}")
+            self.compact_threshold += self.max_messages
+            if os.path.exists(temp_path):
+                try:
+                    os.remove(temp_path)
+                except Exception:
+                    pass
+        finally:
+            self.file = open(self.path, 'ab')
+
+    def clear(self):
+        """Очищает журнал"""
+        self.file.close()
+        self.file = open(self.path, 'wb')
+        self.line_count = 0
+        self.last_seq = 0
+
+    def load_tail(self, limit: Optional[int] = None) -> List[Dict]:
+        """Возвращает последние записи журнала"""
+        self.file.flush()
+        return read_journal_tail(self.path, limit or self.max_messages)
+
+    def maybe_snapshot(self, messages: List[Dict]):
+        """
+        Помечает снимок устаревшим и рендерит его не чаще snapshot_interval
+
+        Если интервал ещё не прошёл, запись откладывается таймером, поэтому
+        последние сообщения попадают в снимок даже при затишье в чате
+        """
+        if self.snapshot_writer is None:
+            return
+
+        with self.snapshot_lock:
+            self.pending_messages = messages
+            elapsed = time.time() - self.last_snapshot_time
+            if elapsed < self.snapshot_interval:
+                if self.snapshot_timer is None:
+                    self.snapshot_timer = threading.Timer(self.snapshot_interval - elapsed, self._flush_pending)
+                    self.snapshot_timer.daemon = True
+                    self.snapshot_timer.start()
+                return
+
+        self._flush_pending()
+
+    def _flush_pending(self):
+        with self.snapshot_lock:
+            self.snapshot_timer = None
+            if self.pending_messages is None:
+                return
+            # Копируем список: основной поток может продолжать дописывать сообщения
+            snapshot = list(self.pending_messages)
+            self.pending_messages = None
+            self.last_snapshot_time = time.time()
+            try:
+                self.snapshot_writer(snapshot, self.snapshot_path)
+                self.snapshots_written += 1
+            except Exception as e:
+                logger.error(f"Не удалось записать снимок {self.snapshot_path}: {e}")
+
+    def flush_snapshot(self, messages: Optional[List[Dict]] = None):
+        """Немедленно рендерит снимок (например, при остановке парсера)"""
+        with self.snapshot_lock:
+            if self.snapshot_timer is not None:
+                self.snapshot_timer.cancel()
+                self.snapshot_timer = None
+            if messages is not None:
+                self.pending_messages = messages
+        self._flush_pending()
+
+    def get_stats(self) -> Dict:
+        """Возвращает статистику журнала"""
+        return {
+            'appended': self.appended,
+            'snapshots_written': self.snapshots_written,
+            'compactions': self.compactions,
+            'journal_lines': self.line_count,
+            'last_seq': self.last_seq
+        }
+
+    def close(self):
+        """Дописывает отложенный снимок и закрывает журнал"""
+        self.flush_snapshot()
+        try:
+            self.file.close()
+        except Exception:
+            pass
+
+
+class CoalescingWriter:
+    """
+    Фоновая запись журнала, снимка и статуса парсера
+
+    Цикл чтения чата только кладёт сообщения в очередь и никогда не ждёт диск;
+    seq сообщениям назначается заранее в цикле чтения (MessageJournal.assign_seq).
+    Поток записи собирает всё накопившееся и сбрасывает пачку одной записью
+    в журнал, одним обновлением снимка и одной записью статуса - в конце
+    пачки sync_items, по истечении max_latency_ms с первого сообщения
+    или при накоплении max_batch сообщений. После каждого сброса вызывается
+    checkpoint_writer (контрольная точка тоже пишется этим потоком)
+    """
+
+    def __init__(self, journal: MessageJournal,
+                 status_writer: Optional[Callable[[str], None]] = None,
+                 max_latency_ms: int = 100,
+                 max_batch: int = 50,
+                 checkpoint_writer: Optional[Callable[[], None]] = None):
+        self.journal = journal
+        self.status_writer = status_writer
+        self.checkpoint_writer = checkpoint_writer
+        self.max_latency = max(max_latency_ms, 0) / 1000.0
+        self.max_batch = max(max_batch, 1)
+        self.queue = queue.Queue()
+
+        # seq последнего сообщения, записанного в журнал
+        self.last_seq = journal.last_seq
+
+        # Статистика: сколько записей запрошено и сколько реально выполнено
+        self.messages_written = 0
+        self.flushes = 0
+        self.writes_requested = 0
+        self.writes_performed = 0
+
+        self.thread = threading.Thread(target=self._run, name='journal-writer', daemon=True)
+        self.thread.start()
+
+    def submit(self, message: Optional[Dict] = None,
+               messages: Optional[List[Dict]] = None,
+               status: Optional[str] = None):
+        """
+        Ставит сообщение, снимок и/или статус в очередь записи
+
+        Args:
+            message (dict): Новое сообщение для журнала с уже назначенным seq
+            messages (list): Текущий список сообщений для снимка
+            status (str): Строка статуса для GUI
+        """
+        self.queue.put((message, messages, status))
+
+    def end_batch(self):
+        """Сбрасывает накопленное, не дожидаясь дедлайна (конец пачки сообщений)"""
+        self.queue.put(_END_BATCH)
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            batch = []
+            snapshot = None
+            status = None
+            deadline = None
+            stop = False
+
+            while True:
+                if item is _STOP:
+                    stop = True
+                    break
+                if item is _END_BATCH:
+                    break
+
+                message, messages, item_status = item
+                if message is not None:
+                    batch.append(message)
+                    self.writes_requested += 1
+                if messages is not None:
+                    snapshot = messages
+                if item_status is not None:
+                    status = item_status
+                    self.writes_requested += 1
+
+                if len(batch) >= self.max_batch:
+                    break
+                if deadline is None:
+                    deadline = time.monotonic() + self.max_latency
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+
+            self._flush(batch, snapshot, status)
+            if stop:
+                return
+
+    def _flush(self, batch: List[Dict], snapshot: Optional[List[Dict]], status: Optional[str]):
+        try:
+            if batch:
+                self.journal.append_many(batch, assign_seq=False)
+                self.last_seq = batch[-1].get('seq', self.last_seq)
+                self.messages_written += len(batch)
+                self.writes_performed += 1
+            if snapshot is not None:
+                self.journal.maybe_snapshot(snapshot)
+            if status is not None and self.status_writer is not None:
+                self.status_writer(status)
+                self.writes_performed += 1
+            if batch or status is not None:
+                self.flushes += 1
+            if self.checkpoint_writer is not None:
+                self.checkpoint_writer()
+        except Exception as e:
+            logger.error(f"Ошибка фоновой записи журнала {self.journal.path}: {e}")
+
+    def get_stats(self) -> Dict:
+        """Возвращает статистику объединения записей"""
+        return {
+            'messages_written': self.messages_written,
+            'flushes': self.flushes,
+            'writes_requested': self.writes_requested,
+            'writes_performed': self.writes_performed,
+            'writes_saved': self.writes_requested - self.writes_performed
+        }
+
+    def close(self, timeout: float = 5.0):
+        """Дописывает очередь и останавливает поток записи"""
+        self.queue.put(_STOP)
+        self.thread.join(timeout)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Окно объединённых сообщений мульти-чата
+Сообщения каждого канала хранятся в отсортированной деке, а общий порядок
+строится k-way слиянием. Самые старые сообщения вытесняются через кучу голов
+каналов, поэтому стоимость цикла зависит от числа новых сообщений,
+а не от размера окна
+"""
+
+import heapq
+import itertools
+from collections import deque
+from typing import Callable, Dict, List
+
+# Канал для сообщений без источника (обычный чат)
+UNKNOWN_CHANNEL = 'unknown'
+
+
+def message_timestamp(message: Dict):
+    """Ключ сортировки сообщений по умолчанию"""
+    return message.get('timestamp', 0)
+
+
+def message_identity(message: Dict):
+    """ID сообщения для дедупликации"""
+    return message.get('id')
+
+
+def message_channel(message: Dict) -> str:
+    """Канал сообщения (поле source.channel_id)"""
+    return (message.get('source') or {}).get('channel_id', UNKNOWN_CHANNEL)
+
+
+class MessageWindow:
+    """
+    Ограниченное окно сообщений, упорядоченное по времени
+
+    При переполнении сначала вытесняется самое старое сообщение среди каналов,
+    превысивших свою долю max(max_messages // каналов, min_per_channel),
+    а если таких нет - самое старое сообщение окна. Так тихие каналы
+    не вытесняются активными, как и при прежнем пропорциональном обрезании
+    """
+
+    def __init__(self, max_messages: int,
+                 key: Callable[[Dict], object] = message_timestamp,
+                 min_per_channel: int = 5,
+                 identity: Callable[[Dict], object] = message_identity,
+                 channel: Callable[[Dict], str] = message_channel):
+        self.max_messages = max_messages
+        self.key = key
+        self.min_per_channel = min_per_channel
+        # Доступ к ID и каналу: словари по умолчанию, объекты сообщений - через свои функции
+        self.identity = identity
+        self.channel_of = channel
+
+        # channel_id -> deque[(key, order, message)], отсортирована по (key, order)
+        self.channels = {}
+        # Куча голов каналов (key, order, channel_id), устаревшие записи пропускаются лениво
+        self.heads = []
+        self.ids = set()
+        self.size = 0
+        self.evicted = 0
+
+        self._order = itertools.count()
+        self._snapshot = None
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, message_id) -> bool:
+        return message_id in self.ids
+
+    def add(self, message: Dict) -> bool:
+        """
+        Добавляет сообщение в окно
+
+        Args:
+            message (dict): Сообщение с полями id и source.channel_id
+
+        Returns:
+            bool: False если сообщение с таким ID уже есть в окне
+        """
+        message_id = self.identity(message)
+        if message_id:
+            if message_id in self.ids:
+                return False
+            self.ids.add(message_id)
+
+        channel_id = self.channel_of(message)
+        entry = (self.key(message), next(self._order), message)
+
+        channel = self.channels.get(channel_id)
+        if channel is None:
+            channel = self.channels[channel_id] = deque()
+
+        if not channel or entry >= channel[-1]:
+            # Обычный случай: сообщения канала приходят по порядку
+            channel.append(entry)
+            if len(channel) == 1:
+                self._push_head(channel_id)
+        else:
+            # Запоздавшее сообщение: вставляем на своё место
+            position = self._bisect(channel, entry)
+            channel.insert(position, entry)
+            if position == 0:
+                self._push_head(channel_id)
+
+        self.size += 1
+        self._snapshot = None
+        self._trim()
+        return True
+
+    def extend(self, messages: List[Dict]) -> List[Dict]:
+        """Добавляет пачку сообщений и возвращает только новые уникальные"""
+        return [message for message in messages if self.add(message)]
+
+    def snapshot(self) -> List[Dict]:
+        """Возвращает все сообщения окна в порядке времени"""
+        if self._snapshot is None:
+            merged = heapq.merge(*self.channels.values())
+            self._snapshot = [entry[2] for entry in merged]
+        return self._snapshot
+
+    def clear(self):
+        """Очищает окно"""
+        self.channels.clear()
+        self.heads = []
+        self.ids.clear()
+        self.size = 0
+        self._snapshot = None
+
+    def get_stats(self) -> Dict:
+        """Возвращает статистику окна"""
+        return {
+            'size': self.size,
+            'channels': {channel_id: len(entries) for channel_id, entries in self.channels.items()},
+            'evicted': self.evicted
+        }
+
+    @staticmethod
+    def _bisect(channel: deque, entry) -> int:
+        low, high = 0, len(channel)
+        while low < high:
+            middle = (low + high) // 2
+            if channel[middle] < entry:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _push_head(self, channel_id: str):
+        key, order, _ = self.channels[channel_id][0]
+        heapq.heappush(self.heads, (key, order, channel_id))
+
+    def _is_current_head(self, head) -> bool:
+        channel = self.channels.get(head[2])
+        return bool(channel) and channel[0][1] == head[1]
+
+    def _trim(self):
+        """Вытесняет старые сообщения, пока окно превышает лимит"""
+        if self.size <= self.max_messages:
+            return
+
+        active = sum(1 for entries in self.channels.values() if entries)
+        quota = max(self.max_messages // max(active, 1), self.min_per_channel)
+
+        while self.size > self.max_messages:
+            over_quota = any(len(entries) > quota for entries in self.channels.values())
+            skipped = []
+            victim = None
+
+            while self.heads:
+                head = heapq.heappop(self.heads)
+                if not self._is_current_head(head):
+                    continue
+                if not over_quota or len(self.channels[head[2]]) > quota:
+                    victim = head[2]
+                    break
+                skipped.append(head)
+
+            for head in skipped:
+                heapq.heappush(self.heads, head)
+
+            if victim is None:
+                break
+            self._evict(victim)
+
+    def _evict(self, channel_id: str):
+        channel = self.channels[channel_id]
+        _, _, message = channel.popleft()
+        message_id = self.identity(message)
+        if message_id:
+            self.ids.discard(message_id)
+        self.size -= 1
+        self.evicted += 1
+        if channel:
+            self._push_head(channel_id)
+        else:
+            del self.channels[channel_id]
+
@@ -13,10 +13,28 @@ import time
 import threading
 import logging
 import argparse
+import heapq
+import re
 import subprocess
+import zlib
 from datetime import datetime
 from queue import Queue, Empty
+from channel_scheduler import FairScheduler
+from chat_analytics import analytics_from_settings
+from chat_archive import archive_from_settings
+from columnar_store import columnar_from_settings
+from chat_sentiment import sentiment_from_settings
+from chat_message import (AuthorTable, ChannelSource, MessageRecord, channel_key,
+                          record_channel, record_identity, record_timestamp)
+from dedupe_store import dedupe_from_settings
 from emoji_database import convert_emojis, get_emoji_count
+from message_journal import JournalReader, MessageJournal, journal_path_for, clear_journal
+from message_window import MessageWindow
+from shm_ring import ShmRing, ShmRingReader
+from spam_aggregator import aggregator_from_settings
+
+# Интервал опроса в строке статуса парсера ("RUNNING: N messages, interval 1.5s")
+STATUS_INTERVAL_PATTERN = re.compile(r'interval ([\d.]+)s')
 
 # =============================================================================
 # ЛОГИРОВАНИЕ
@@ -36,7 +54,8 @@ logger.addHandler(log_handler)
 # =============================================================================
 
 class MultiChatCoordinator:
-    def __init__(self, channels_config, output_file='messages.json', max_messages=50):
+    def __init__(self, channels_config, output_file='messages.json', max_messages=50, in_process=False,
+                 transport='file'):
         """
         Инициализация мульти-чат координатора
         
@@ -44,31 +63,98 @@ class MultiChatCoordinator:
             channels_config (list): Список конфигураций каналов
             output_file (str): Файл для сохранения объединённых сообщений
             max_messages (int): Максимальное количество сообщений
+            in_process (bool): Запускать каналы asyncio-задачами в этом процессе вместо отдельных парсеров
+            transport (str): Передача сообщений от парсеров: 'file' (журнал на диске) или 'shm' (разделяемая память)
         """
         self.channels_config = channels_config
         self.output_file = output_file
         self.max_messages = max_messages
+        self.in_process = in_process
+        self.transport = transport
+        
+        # Кольцевые буферы каналов в разделяемой памяти (transport='shm')
+        self.rings = {}
+        
+        # In-process движок каналов (создаётся при старте)
+        self.engine = None
         
         # Настройки для высоконагруженных каналов (по умолчанию отключены)
         self.max_messages_per_channel_per_cycle = None  # Без ограничений по умолчанию
-        self.message_processing_delay = 0.0  # Без задержек по умолчанию
+        self.message_processing_delay = 0.0  # Устарело: объединитель не делает пауз между сообщениями
         self.channel_restart_cooldown = {}  # Кулдаун для перезапуска каналов
         self.performance_optimization_enabled = False  # Флаг оптимизации
         
-        # Очереди для сообщений от каждого канала
-        self.message_queues = {}
-        
         # Процессы парсеров для каждого канала
         self.parser_processes = {}
         
         # Потоки для чтения сообщений от каждого канала
         self.reader_threads = {}
         
-        # Общий список сообщений
-        self.all_messages = []
-        
-        # Множество для отслеживания уникальных ID сообщений
-        self.seen_message_ids = set()
+        # Общее окно сообщений: упорядочено по времени, дедуплицирует по ID
+        # и пропорционально вытесняет старые сообщения каналов.
+        # Хранит компактные записи с общими авторами и источниками каналов
+        self.authors = AuthorTable()
+        self.channel_sources = {}
+        self.window = MessageWindow(
+            max_messages,
+            key=record_timestamp,
+            identity=record_identity,
+            channel=record_channel
+        )
+        
+        settings = load_settings()
+        
+        # Приоритетная полоса: суперчаты, членства, сообщения владельца и модераторов
+        # минуют лимиты каналов и сброс переполненных очередей, а в выводе хранятся
+        # в отдельном окне, которое не вытесняется потоком обычных сообщений
+        self.priority_queue = Queue()
+        self.priority_window = MessageWindow(
+            settings.get('priority_window_size', 100),
+            key=record_timestamp,
+            identity=record_identity,
+            channel=record_channel
+        )
+        
+        # ID принятых сообщений помнятся dedupe_retention_seconds, даже после
+        # вытеснения из окна: повторы после переподключения парсеров отсекаются
+        self.dedupe = dedupe_from_settings(settings)
+        
+        # Ограниченные очереди каналов с выборкой по весам (deficit round robin):
+        # канал под рейдом не вытесняет остальные, а переполнение обрабатывается
+        # политикой channel_overload_policy со счётчиками сброса по каналам
+        self.scheduler = FairScheduler(
+            queue_limit=settings.get('channel_queue_limit', 500),
+            policy=settings.get('channel_overload_policy', 'drop_oldest'),
+            key=lambda record: record.text.strip().lower()
+        )
+        self.merge_batch_size = settings.get('merge_batch_size', 1000)
+        
+        # Свёртка флуда: повторы одного текста за spam_collapse_window_seconds
+        # не добавляются в окно, а увеличивают счётчик первого сообщения
+        self.aggregator = aggregator_from_settings(settings)
+        
+        # Скорость чата, уникальные авторы и топы для оверлеев (chat_analytics.json)
+        self.analytics = analytics_from_settings(settings)
+        self.analytics_file = settings.get('chat_analytics_file', 'chat_analytics.json')
+        self.analytics_interval = settings.get('chat_analytics_interval', 1.0)
+        self.analytics_saved = 0.0
+        
+        # Локальное настроение чата; ИИ-мост зовёт Gemini только при эскалации (chat_mood.json)
+        self.sentiment = sentiment_from_settings(settings)
+        self.sentiment_file = settings.get('chat_sentiment_file', 'chat_mood.json')
+        
+        # Числовые колонки сообщений (NumPy) для панелей статистики и монитора (chat_columns.npz)
+        self.columns = columnar_from_settings(settings)
+        self.columns_file = settings.get('columnar_store_file', 'chat_columns.npz')
+        self.columns_interval = settings.get('columnar_store_interval', 5.0)
+        self.columns_saved = 0.0
+        self.reported_drops = {}
+        
+        # Журнал объединённых сообщений для push-потока оверлея (/events)
+        self.journal = MessageJournal(output_file, max_messages=max_messages)
+        
+        # Архив всей истории объединённого чата (парсеры каналов его не пишут)
+        self.archive = archive_from_settings(settings)
         
         # Флаг остановки
         self.stop_flag = threading.Event()
@@ -112,6 +198,16 @@ class MultiChatCoordinator:
         # Очищаем старые сообщения
         self.clear_messages()
         
+        if self.in_process:
+            from multichat_engine import InProcessChatEngine
+            settings = load_settings()
+            self.engine = InProcessChatEngine(
+                self.enqueue_channel_message,
+                update_interval=settings.get('update_interval', 2),
+                settings=settings
+            )
+            self.engine.start()
+        
         # Запускаем парсеры для каждого канала
         for channel in self.channels_config:
             self.start_channel_parser(channel)
@@ -123,21 +219,37 @@ class MultiChatCoordinator:
     
     def start_channel_parser(self, channel):
         """Запускает парсер для конкретного канала"""
-        channel_id = channel['prefix'].replace('[', '').replace(']', '').lower()
+        channel_id = channel_key(channel)
         temp_file = f"temp_messages_{channel_id}.json"
+        status_file = f"temp_status_{channel_id}.txt"
+        
+        # Метаданные канала вычисляются один раз и разделяются всеми его сообщениями
+        self.channel_sources[channel_id] = ChannelSource.from_channel(channel)
+        
+        if self.engine is not None:
+            self.start_channel_task(channel_id, channel)
+            return
         
         logger.info(f"Запуск парсера для канала {channel['name']} ({channel['prefix']})")
         
         try:
-            # Создаём временный файл для этого канала
+            # Создаём временный файл и пустой журнал для этого канала
             with open(temp_file, 'w', encoding='utf-8') as f:
                 json.dump([], f, ensure_ascii=False, indent=2)
+            clear_journal(temp_file)
             
             # Запускаем парсер через venv Python
             venv_python = os.path.join(os.path.dirname(os.path.abspath(__file__)), "venv", "Scripts", "python.exe")
+            command = [venv_python, "chat_parser_pytchat.py", channel['url'], "--output", temp_file,
+                       "--status-file", status_file, "--no-archive"]
+            
+            # Буфер канала переживает перезапуски парсера, читатель продолжает с той же позиции
+            ring = self.get_channel_ring(channel_id) if self.transport == 'shm' else None
+            if ring is not None:
+                command += ["--shm-name", ring.name]
             
             process = subprocess.Popen(
-                [venv_python, "chat_parser_pytchat.py", channel['url'], "--output", temp_file],
+                command,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
                 text=True,
@@ -148,90 +260,125 @@ class MultiChatCoordinator:
             self.parser_processes[channel_id] = {
                 'process': process,
                 'channel': channel,
-                'temp_file': temp_file
+                'temp_file': temp_file,
+                'status_file': status_file
             }
             
-            # Создаём очередь для сообщений этого канала
-            self.message_queues[channel_id] = Queue()
+            # Регистрируем очередь канала с его весом
+            self.scheduler.register(channel_id, channel.get('weight', 1))
             
-            # Запускаем поток для чтения сообщений из временного файла
-            reader_thread = threading.Thread(
-                target=self.read_channel_messages,
-                args=(channel_id, temp_file, channel),
-                daemon=True
-            )
-            reader_thread.start()
-            self.reader_threads[channel_id] = reader_thread
+            # Поток чтения канала один на всё время работы координатора: читатель
+            # сам переходит к очищенному при перезапуске журналу или буферу,
+            # а второй поток на тот же источник дублировал бы каждое сообщение
+            reader_thread = self.reader_threads.get(channel_id)
+            if reader_thread is None or not reader_thread.is_alive():
+                reader_thread = threading.Thread(
+                    target=self.read_channel_messages,
+                    args=(channel_id, temp_file, channel),
+                    daemon=True
+                )
+                reader_thread.start()
+                self.reader_threads[channel_id] = reader_thread
             
             logger.info(f"Парсер для канала {channel['name']} запущен (PID: {process.pid})")
             
         except Exception as e:
             logger.error(f"Ошибка запуска парсера для канала {channel['name']}: {e}")
     
+    def get_channel_ring(self, channel_id):
+        """Возвращает кольцевой буфер канала, создавая его при первом запуске"""
+        ring = self.rings.get(channel_id)
+        if ring is not None:
+            return ring
+        
+        # Имя сегмента только из ASCII: префиксы каналов бывают кириллическими
+        name = f"chat_{os.getpid()}_{zlib.crc32(channel_id.encode('utf-8')):08x}"
+        try:
+            ring = ShmRing.create(name)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось создать буфер в разделяемой памяти для канала {channel_id}, используем файлы: {e}")
+            return None
+        
+        self.rings[channel_id] = ring
+        logger.info(f"🧠 Канал {channel_id}: буфер сообщений {name} ({ring.capacity // 1024} КБ)")
+        return ring
+    
+    def open_channel_reader(self, channel_id, temp_file):
+        """Возвращает читатель новых сообщений канала: буфер в памяти или журнал на диске"""
+        ring = self.rings.get(channel_id)
+        if ring is not None:
+            return ShmRingReader(ring)
+        return JournalReader(journal_path_for(temp_file))
+    
+    def start_channel_task(self, channel_id, channel):
+        """Запускает канал как задачу in-process движка"""
+        logger.info(f"Запуск in-process канала {channel['name']} ({channel['prefix']})")
+        
+        try:
+            self.scheduler.register(channel_id, channel.get('weight', 1))
+            
+            handle = self.engine.start_channel(channel_id, channel)
+            self.parser_processes[channel_id] = {
+                'process': handle,
+                'channel': channel,
+                'temp_file': None
+            }
+            
+            logger.info(f"Канал {channel['name']} запущен в процессе координатора")
+            
+        except Exception as e:
+            logger.error(f"Ошибка запуска in-process канала {channel['name']}: {e}")
+    
+    def enqueue_channel_message(self, channel_id, channel, message):
+        """Добавляет сообщение канала в очередь объединителя (переполнение обрабатывает планировщик)"""
+        # Добавляем информацию об источнике и префикс
+        source = self.channel_sources.get(channel_id)
+        if source is None:
+            source = self.channel_sources[channel_id] = ChannelSource.from_channel(channel)
+        enhanced_message = self.enhance_message(message, source)
+        
+        if enhanced_message.priority:
+            # Высокоценные события никогда не сбрасываются при переполнении
+            self.priority_queue.put((channel_id, enhanced_message))
+            return
+        
+        self.scheduler.put(channel_id, enhanced_message)
+    
     def read_channel_messages(self, channel_id, temp_file, channel):
-        """Читает сообщения из временного файла канала"""
-        last_message_count = 0
+        """
+        Читает новые сообщения канала из журнала парсера
+        
+        Журнал читается по байтовому смещению, а записи отбираются по seq,
+        поэтому обрезка файла парсером до max_messages не теряет сообщения.
+        В режиме разделяемой памяти записи читаются из буфера канала
+        """
+        reader = self.open_channel_reader(channel_id, temp_file)
         consecutive_errors = 0
         last_activity_time = time.time()
         
         INACTIVITY_TIMEOUT = 600  # 10 минут без активности считаем нормой для тихих чатов
+        POLL_INTERVAL = 0.5  # Чтение журнала дешёвое, можно проверять чаще
 
         while not self.stop_flag.is_set():
             try:
-                # Проверяем, существует ли файл
-                if not os.path.exists(temp_file):
-                    time.sleep(1)
-                    continue
-                
-                # Читаем сообщения из временного файла
-                with open(temp_file, 'r', encoding='utf-8') as f:
-                    try:
-                        messages = json.load(f)
-                    except json.JSONDecodeError:
-                        # Файл может быть в процессе записи
-                        consecutive_errors += 1
-                        if consecutive_errors > 10:
-                            logger.warning(f"⚠️ Канал {channel['name']}: много ошибок чтения JSON, возможно парсер завис")
-                        time.sleep(0.5)
-                        continue
+                new_messages = reader.read_new()
                 
                 # Сбрасываем счетчик ошибок при успешном чтении
                 consecutive_errors = 0
                 
                 # Если появились новые сообщения
-                if len(messages) > last_message_count:
-                    new_messages = messages[last_message_count:]
-                    
+                if new_messages:
                     # Проверяем на слишком высокую активность
                     if len(new_messages) > 200:
                         logger.warning(f"🔥 Канал {channel['name']}: высокая активность - {len(new_messages)} сообщений за цикл")
                     
                     for message in new_messages:
-                        # Добавляем информацию об источнике и префикс
-                        enhanced_message = self.enhance_message(message, channel)
-                        
-                        # Добавляем в очередь с проверкой размера
-                        queue_size = self.message_queues[channel_id].qsize()
-                        if queue_size > 500:  # Если очередь переполнена
-                            logger.warning(f"⚠️ Канал {channel['name']}: переполнение очереди ({queue_size} сообщений)")
-                            # Очищаем часть очереди
-                            try:
-                                for _ in range(50):
-                                    self.message_queues[channel_id].get_nowait()
-                            except Exception:
-                                pass
-                        
-                        self.message_queues[channel_id].put(enhanced_message)
+                        self.enqueue_channel_message(channel_id, channel, message)
                     
-                    last_message_count = len(messages)
                     last_activity_time = time.time()
-                    logger.debug(f"Получено {len(new_messages)} новых сообщений от канала {channel['name']}")
+                    logger.debug(f"Получено {len(new_messages)} новых сообщений от канала {channel['name']} (seq: {reader.last_seq})")
                 
                 # Проверяем на зависание парсера (нет новых сообщений долгое время)
-                elif len(messages) < last_message_count:
-                    # Файл был обнулён (например, при рестарте парсера). Синхронизируем счётчик.
-                    last_message_count = len(messages)
-                    last_activity_time = time.time()
                 elif time.time() - last_activity_time > INACTIVITY_TIMEOUT:
                     logger.warning(f"⏰ Канал {channel['name']}: нет активности {INACTIVITY_TIMEOUT // 60} минут, возможно парсер завис")
                     
@@ -252,7 +399,7 @@ class MultiChatCoordinator:
                     
                     last_activity_time = time.time()  # Сбрасываем чтобы не спамить
                 
-                time.sleep(1)  # Проверяем каждую секунду
+                time.sleep(POLL_INTERVAL)
                 
             except Exception as e:
                 consecutive_errors += 1
@@ -265,37 +412,32 @@ class MultiChatCoordinator:
                 else:
                     time.sleep(5)
     
-    def enhance_message(self, message, channel):
-        """Добавляет информацию об источнике и префикс к сообщению"""
-        import copy
-        enhanced = copy.deepcopy(message)  # Глубокая копия для сохранения всех данных
-        
-        # Добавляем информацию об источнике
-        enhanced['source'] = {
-            'platform': 'youtube',
-            'channel_id': channel['prefix'].replace('[', '').replace(']', '').lower(),
-            'channel_name': channel['name'],
-            'prefix': channel['prefix']
-        }
-        
-        # Добавляем префикс к отображаемому имени, сохраняя все роли
-        if 'author' in enhanced and 'name' in enhanced['author']:
-            original_name = enhanced['author']['name']
-            enhanced['author']['display_name'] = f"{channel['prefix']} {original_name}"
-            
-            # Логируем роли для отладки
-            roles = []
-            if enhanced['author'].get('is_owner'):
-                roles.append('owner')
-            if enhanced['author'].get('is_moderator'):
-                roles.append('moderator')
-            if enhanced['author'].get('is_sponsor'):
-                roles.append('sponsor')
-            
-            if roles:
-                logger.debug(f"Сообщение от {enhanced['author']['display_name']} (роли: {', '.join(roles)}): {enhanced['text'][:50]}...")
-            else:
-                logger.debug(f"Сообщение от {enhanced['author']['display_name']}: {enhanced['text'][:50]}...")
+    def enhance_message(self, message, source):
+        """
+        Превращает сообщение парсера в запись окна с источником и префиксом
+        
+        Без копирования: source - заранее подготовленный ChannelSource канала,
+        автор интернируется в общей таблице, display_name строится при сериализации
+        """
+        enhanced = MessageRecord.from_dict(message, self.authors, source)
+        
+        # Строки отладки собираются только при включённом DEBUG
+        if not logger.isEnabledFor(logging.DEBUG):
+            return enhanced
+        
+        author = enhanced.author
+        roles = []
+        if author.is_owner:
+            roles.append('owner')
+        if author.is_moderator:
+            roles.append('moderator')
+        if author.is_sponsor:
+            roles.append('sponsor')
+        
+        if roles:
+            logger.debug(f"Сообщение от {enhanced.display_name} (роли: {', '.join(roles)}): {enhanced.text[:50]}...")
+        else:
+            logger.debug(f"Сообщение от {enhanced.display_name}: {enhanced.text[:50]}...")
         
         return enhanced
     
@@ -313,92 +455,161 @@ class MultiChatCoordinator:
                 new_messages = []
                 channel_message_counts = {}
                 
-                # Собираем сообщения из всех очередей
-                for channel_id, queue in self.message_queues.items():
-                    channel_messages = 0
-                    try:
-                        # Если оптимизация включена, используем ограничения
-                        if self.performance_optimization_enabled and self.max_messages_per_channel_per_cycle:
-                            max_messages = self.max_messages_per_channel_per_cycle
-                        else:
-                            max_messages = float('inf')  # Без ограничений
-                        
-                        while channel_messages < max_messages:
-                            message = queue.get_nowait()
-                            new_messages.append(message)
-                            channel_messages += 1
-                            
-                            # Задержка только если оптимизация включена
-                            if self.performance_optimization_enabled and self.message_processing_delay > 0:
-                                time.sleep(self.message_processing_delay)
-                                
-                    except Empty:
-                        pass
-                    
-                    if channel_messages > 0:
-                        channel_message_counts[channel_id] = channel_messages
+                # Приоритетная полоса забирается целиком и первой
+                priority_messages = []
+                try:
+                    while True:
+                        channel_id, message = self.priority_queue.get_nowait()
+                        priority_messages.append(message)
+                        channel_message_counts[channel_id] = channel_message_counts.get(channel_id, 0) + 1
+                except Empty:
+                    pass
+                
+                # Забираем сообщения каналов по весам. При включённой оптимизации
+                # канал получает не больше max_messages_per_channel_per_cycle * weight
+                # за цикл, иначе общий бюджет цикла делится между каналами
+                if self.performance_optimization_enabled and self.max_messages_per_channel_per_cycle:
+                    new_messages = self.scheduler.drain(
+                        quantum=self.max_messages_per_channel_per_cycle, single_round=True
+                    )
+                else:
+                    new_messages = self.scheduler.drain(budget=self.merge_batch_size)
+                backlog = len(new_messages) >= self.merge_batch_size
+                
+                for message in new_messages:
+                    channel_id = record_channel(message)
+                    channel_message_counts[channel_id] = channel_message_counts.get(channel_id, 0) + 1
                 
                 # Если есть новые сообщения
-                if new_messages:
-                    # Фильтруем дубликаты по ID перед добавлением
-                    unique_messages = []
-                    for msg in new_messages:
-                        msg_id = msg.get('id')
-                        if msg_id and msg_id not in self.seen_message_ids:
-                            unique_messages.append(msg)
-                            self.seen_message_ids.add(msg_id)
-                        elif not msg_id:
-                            # Если нет ID, добавляем сообщение (но это редкий случай)
-                            unique_messages.append(msg)
-                    
-                    # Добавляем только уникальные сообщения к общему списку
-                    if unique_messages:
-                        self.all_messages.extend(unique_messages)
-                        
-                        # Сортируем по времени (timestamp)
-                        self.all_messages.sort(key=lambda x: x.get('timestamp', 0))
+                if new_messages or priority_messages:
+                    # Окно отбрасывает дубликаты по ID, вставляет сообщения по времени
+                    # и вытесняет самые старые при превышении лимита
+                    priority_fresh = [message for message in priority_messages if self.dedupe.add(message.id)]
+                    unique_messages = self.priority_window.extend(priority_fresh)
+                    fresh_messages = [message for message in new_messages if self.dedupe.add(message.id)]
+                    # В архив попадают все сообщения, включая свёрнутые повторы и вне окна
+                    self.archive_messages(priority_fresh + fresh_messages)
+                    if self.analytics is not None:
+                        # Повторы флуда учитываются до свёртки: это тоже активность чата
+                        self.analytics.add_many(priority_fresh)
+                        self.analytics.add_many(fresh_messages)
+                    if self.sentiment is not None:
+                        self.sentiment.add_many(priority_fresh)
+                        self.sentiment.add_many(fresh_messages)
+                    if self.columns is not None:
+                        self.columns.append_many(priority_fresh)
+                        self.columns.append_many(fresh_messages)
+                    repeated_messages = []
+                    collapsed = 0
+                    if self.aggregator is not None:
+                        deduped_count = len(fresh_messages)
+                        # Серия, чьё первое сообщение уже вытеснено из окна, начинается заново
+                        fresh_messages, repeated_messages = self.aggregator.process(
+                            fresh_messages, visible=lambda message: message.id in self.window
+                        )
+                        collapsed = deduped_count - len(fresh_messages)
+                    unique_messages += self.window.extend(fresh_messages)
+                    new_messages = priority_messages + new_messages
+                    total_new = len(new_messages)
                     
-                        # Ограничиваем количество сообщений с умной логикой
-                        if len(self.all_messages) > self.max_messages:
-                            # Сохраняем пропорционально от каждого канала
-                            old_length = len(self.all_messages)
-                            self.all_messages = self.smart_trim_messages(self.all_messages)
-                            
-                            # Обновляем seen_message_ids - удаляем ID сообщений, которые были удалены
-                            current_ids = {msg.get('id') for msg in self.all_messages if msg.get('id')}
-                            self.seen_message_ids = current_ids
-                        
-                        # Сохраняем в файл
+                    if unique_messages or repeated_messages:
+                        # Дописываем новые сообщения и обновлённые счётчики повторов в журнал и сохраняем снимок
+                        self.append_to_journal(unique_messages + repeated_messages)
                         self.save_messages()
-                        
+                    
+                    if unique_messages:
                         # Логируем с детализацией по каналам
-                        total_new = len(new_messages)
                         unique_new = len(unique_messages)
-                        duplicates = total_new - unique_new
+                        duplicates = total_new - unique_new - collapsed
                         channel_details = ", ".join([f"{ch_id}: {count}" for ch_id, count in channel_message_counts.items()])
                         
-                        if duplicates > 0:
-                            logger.info(f"Объединено {unique_new} уникальных ({duplicates} дубликатов) из {total_new} ({channel_details}), всего: {len(self.all_messages)}")
+                        if collapsed > 0:
+                            logger.info(f"Объединено {unique_new} уникальных ({duplicates} дубликатов, {collapsed} свёрнуто повторов) из {total_new} ({channel_details}), всего: {len(self.window)}")
+                        elif duplicates > 0:
+                            logger.info(f"Объединено {unique_new} уникальных ({duplicates} дубликатов) из {total_new} ({channel_details}), всего: {len(self.window)}")
                         else:
-                            logger.info(f"Объединено {unique_new} сообщений ({channel_details}), всего: {len(self.all_messages)}")
+                            logger.info(f"Объединено {unique_new} сообщений ({channel_details}), всего: {len(self.window)}")
                     
                     # Предупреждение о высокой нагрузке и автоматическая оптимизация
                     if total_new > 400:
                         logger.warning(f"🔥 Нестандартно большая партия: {total_new} сообщений за цикл")
                 
-                # Интервал зависит от режима оптимизации
-                time.sleep(0.5)
+                self.report_drops()
+                self.save_analytics()
+                self.save_columns()
+                
+                # Если планировщик упёрся в бюджет, очереди ещё не пусты - следующий цикл сразу
+                if not backlog:
+                    self.stop_flag.wait(0.5)
                 
             except Exception as e:
                 logger.error(f"Ошибка в цикле объединения сообщений: {e}")
                 time.sleep(5)
     
+    def save_analytics(self):
+        """Сохраняет снимки аналитики и настроения не чаще analytics_interval (и без новых сообщений - скорость падает)"""
+        if self.analytics is None and self.sentiment is None:
+            return
+        now = time.time()
+        if now - self.analytics_saved >= self.analytics_interval:
+            if self.analytics is not None:
+                self.analytics.save(self.analytics_file)
+            if self.sentiment is not None:
+                self.sentiment.check()
+                self.sentiment.save(self.sentiment_file)
+            self.analytics_saved = now
+    
+    def save_columns(self, force: bool = False):
+        """
+        Сохраняет колонки сообщений не чаще columns_interval
+        
+        Запись идёт в фоновом потоке, чтобы не задерживать объединение;
+        force - синхронная запись (при остановке)
+        """
+        if self.columns is None or not len(self.columns):
+            return
+        now = time.time()
+        if force:
+            self.columns.save(self.columns_file)
+            self.columns_saved = now
+        elif now - self.columns_saved >= self.columns_interval:
+            if self.columns.save_async(self.columns_file):
+                self.columns_saved = now
+    
+    def report_drops(self):
+        """Логирует сообщения, сброшенные при переполнении очередей каналов с прошлого цикла"""
+        for channel_id, stats in self.scheduler.get_stats().items():
+            lost = stats['dropped'] + stats['collapsed']
+            previous = self.reported_drops.get(channel_id, 0)
+            if lost > previous:
+                self.reported_drops[channel_id] = lost
+                logger.warning(
+                    f"⚠️ Канал {channel_id}: переполнение очереди, сброшено {lost - previous} "
+                    f"(всего сброшено {stats['dropped']}, свёрнуто повторов {stats['collapsed']})"
+                )
+    
+    def append_to_journal(self, records):
+        """Дописывает записи в журнал и сохраняет назначенные им seq"""
+        payload = [record.to_dict() for record in records]
+        self.journal.append_many(payload)
+        for record, data in zip(records, payload):
+            record.seq = data['seq']
+    
+    def archive_messages(self, records):
+        """Передаёт записи в архив (после дедупликации, до свёртки повторов и окна)"""
+        if self.archive is not None and records:
+            self.archive.submit([record.to_dict() for record in records])
+    
+    def snapshot(self):
+        """Сообщения для вывода: обычное и приоритетное окна, упорядоченные по времени"""
+        return list(heapq.merge(self.window.snapshot(), self.priority_window.snapshot(), key=record_timestamp))
+    
     def save_messages(self):
         """Сохраняет объединённые сообщения в файл"""
         with self.write_lock:
             try:
                 with open(self.output_file, 'w', encoding='utf-8') as f:
-                    json.dump(self.all_messages, f, ensure_ascii=False, indent=2)
+                    json.dump([record.to_dict() for record in self.snapshot()], f, ensure_ascii=False, indent=2)
             except Exception as e:
                 logger.error(f"Ошибка сохранения сообщений: {e}")
     
@@ -407,8 +618,9 @@ class MultiChatCoordinator:
         try:
             with open(self.output_file, 'w', encoding='utf-8') as f:
                 json.dump([], f, ensure_ascii=False, indent=2)
-            self.all_messages = []
-            self.seen_message_ids.clear()  # Очищаем множество ID
+            self.window.clear()  # Очищаем окно и множество ID
+            self.priority_window.clear()
+            self.journal.clear()
             logger.info("Файл сообщений очищен")
         except Exception as e:
             logger.error(f"Ошибка очистки сообщений: {e}")
@@ -428,18 +640,37 @@ class MultiChatCoordinator:
                     process.terminate()
                     logger.info(f"Парсер канала {parser_info['channel']['name']} остановлен")
                 
-                # Удаляем временный файл
+                # Удаляем временный файл и журнал канала
                 temp_file = parser_info['temp_file']
-                if os.path.exists(temp_file):
-                    os.remove(temp_file)
-                    logger.debug(f"Временный файл {temp_file} удалён")
+                if temp_file:
+                    for path in (temp_file, journal_path_for(temp_file), parser_info.get('status_file')):
+                        if path and os.path.exists(path):
+                            os.remove(path)
+                            logger.debug(f"Временный файл {path} удалён")
                     
             except Exception as e:
                 logger.error(f"Ошибка остановки парсера канала {channel_id}: {e}")
         
+        # Останавливаем in-process движок
+        if self.engine is not None:
+            self.engine.stop()
+        
+        # Освобождаем буферы в разделяемой памяти после остановки читателей
+        for reader_thread in self.reader_threads.values():
+            reader_thread.join(timeout=2)
+        for ring in self.rings.values():
+            ring.close()
+        self.rings.clear()
+        
         # Сохраняем финальное состояние
-        if self.all_messages:
+        if len(self.window) or len(self.priority_window):
             self.save_messages()
+        self.save_columns(force=True)
+        self.journal.close()
+        if self.archive is not None:
+            self.archive.close()
+            stats = self.archive.get_stats()
+            logger.info(f"🗄️ Архив чата: записано {stats['written']} сообщений за {stats['transactions']} транзакций, отброшено {stats['dropped']}")
         
         logger.info("Мульти-чат координатор остановлен")
     
@@ -456,64 +687,46 @@ class MultiChatCoordinator:
                     'name': channel['name'],
                     'prefix': channel['prefix'],
                     'status': 'Работает',
-                    'pid': process.pid
+                    'pid': process.pid,
+                    'poll_interval': self.get_poll_interval(channel_id, parser_info)
                 }
             else:
                 status[channel_id] = {
                     'name': channel['name'],
                     'prefix': channel['prefix'],
                     'status': 'Остановлен',
-                    'pid': None
+                    'pid': None,
+                    'poll_interval': None
                 }
         
+        # Состояние очереди канала и потери при переполнении
+        queue_stats = self.scheduler.get_stats()
+        for channel_id, channel_status in status.items():
+            stats = queue_stats.get(channel_id, {})
+            channel_status['queued'] = stats.get('queued', 0)
+            channel_status['dropped'] = stats.get('dropped', 0)
+            channel_status['collapsed'] = stats.get('collapsed', 0)
+        
         return status
     
-    def smart_trim_messages(self, messages):
-        """Умное обрезание сообщений с сохранением пропорций от каждого канала"""
-        if len(messages) <= self.max_messages:
-            return messages
-        
-        # Группируем сообщения по каналам
-        channel_messages = {}
-        for msg in messages:
-            if 'source' in msg and 'channel_id' in msg['source']:
-                channel_id = msg['source']['channel_id']
-                if channel_id not in channel_messages:
-                    channel_messages[channel_id] = []
-                channel_messages[channel_id].append(msg)
-            else:
-                # Сообщения без источника (обычный чат)
-                if 'unknown' not in channel_messages:
-                    channel_messages['unknown'] = []
-                channel_messages['unknown'].append(msg)
-        
-        # Если каналов нет, просто берем последние сообщения
-        if not channel_messages:
-            return messages[-self.max_messages:]
-        
-        # Вычисляем сколько сообщений оставить от каждого канала
-        num_channels = len(channel_messages)
-        messages_per_channel = max(self.max_messages // num_channels, 5)  # Минимум 5 на канал
-        
-        result_messages = []
-        
-        for channel_id, ch_messages in channel_messages.items():
-            # Берем последние сообщения от каждого канала
-            channel_limit = min(len(ch_messages), messages_per_channel)
-            result_messages.extend(ch_messages[-channel_limit:])
-        
-        # Сортируем по времени и ограничиваем общий лимит
-        result_messages.sort(key=lambda x: x.get('timestamp', 0))
-        
-        if len(result_messages) > self.max_messages:
-            result_messages = result_messages[-self.max_messages:]
-        
-        logger.debug(f"🔄 Умное обрезание: было {len(messages)}, стало {len(result_messages)} сообщений")
-        return result_messages
+    def get_poll_interval(self, channel_id, parser_info):
+        """Возвращает текущий интервал опроса канала в секундах или None, если он неизвестен"""
+        if self.engine is not None:
+            return self.engine.get_poll_interval(channel_id)
+        
+        status_file = parser_info.get('status_file')
+        if not status_file:
+            return None
+        try:
+            with open(status_file, 'r', encoding='utf-8') as f:
+                match = STATUS_INTERVAL_PATTERN.search(f.read())
+            return float(match.group(1)) if match else None
+        except (OSError, ValueError):
+            return None
     
     def restart_channel(self, channel):
         """Перезапускает отдельный канал с кулдауном"""
-        channel_id = channel['prefix'].replace('[', '').replace(']', '').lower()
+        channel_id = channel_key(channel)
         current_time = time.time()
         
         # Проверяем кулдаун (минимум 60 секунд между перезапусками)
@@ -543,11 +756,14 @@ class MultiChatCoordinator:
                         old_process.wait()
                         logger.info(f"💀 Процесс канала {channel['name']} принудительно завершен")
                 
-                # Удаляем временный файл
+                # Удаляем временный файл и журнал канала
                 old_temp_file = self.parser_processes[channel_id]['temp_file']
-                if os.path.exists(old_temp_file):
-                    os.remove(old_temp_file)
-                    logger.debug(f"🗑️ Временный файл {old_temp_file} удалён")
+                if old_temp_file:
+                    old_status_file = self.parser_processes[channel_id].get('status_file')
+                    for path in (old_temp_file, journal_path_for(old_temp_file), old_status_file):
+                        if path and os.path.exists(path):
+                            os.remove(path)
+                            logger.debug(f"🗑️ Временный файл {path} удалён")
                     
             except Exception as e:
                 logger.error(f"❌ Ошибка остановки старого процесса канала {channel['name']}: {e}")
@@ -585,6 +801,8 @@ def main():
     parser = argparse.ArgumentParser(description='YouTube Multi-Chat Coordinator')
     parser.add_argument('--output', '-o', default='messages.json', help='Файл для сохранения объединённых сообщений')
     parser.add_argument('--max-messages', '-m', type=int, default=50, help='Максимальное количество сообщений')
+    parser.add_argument('--in-process', action='store_true', help='Запускать все каналы в одном процессе (asyncio)')
+    parser.add_argument('--transport', choices=['file', 'shm'], help='Передача сообщений от парсеров: файлы или разделяемая память')
     
     args = parser.parse_args()
     
@@ -623,12 +841,23 @@ def main():
     # Для мульти-чата используем увеличенный лимит сообщений
     multichat_max_messages = max(args.max_messages * len(active_channels), 100)  # Минимум 100, или по количеству каналов
     
+    # In-process режим: один интерпретатор и одна база эмоджи на все каналы
+    in_process = args.in_process or settings.get('multichat_in_process', False)
+    transport = args.transport or settings.get('multichat_transport', 'file')
+    
     coordinator = MultiChatCoordinator(
         channels_config=active_channels,
         output_file=args.output,
-        max_messages=multichat_max_messages
+        max_messages=multichat_max_messages,
+        in_process=in_process,
+        transport=transport
     )
     
+    if in_process:
+        logger.info("🧵 Каналы запускаются в процессе координатора (asyncio)")
+    elif transport == 'shm':
+        logger.info("🧠 Сообщения парсеров передаются через разделяемую память")
+    
     logger.info(f"📊 Лимит сообщений для мульти-чата: {multichat_max_messages} (каналов: {len(active_channels)})")
     
     # Применяем настройки производительности из файла (только если включены)
@@ -637,8 +866,9 @@ def main():
     
     if coordinator.performance_optimization_enabled:
         coordinator.max_messages_per_channel_per_cycle = settings.get('max_messages_per_channel_per_cycle', 10)
-        coordinator.message_processing_delay = settings.get('message_processing_delay', 0.1)
-        logger.info(f"⚡ Оптимизация производительности ВКЛЮЧЕНА: макс. сообщений на канал = {coordinator.max_messages_per_channel_per_cycle}, задержка = {coordinator.message_processing_delay}с")
+        logger.info(f"⚡ Оптимизация производительности ВКЛЮЧЕНА: макс. сообщений на канал = {coordinator.max_messages_per_channel_per_cycle} (× вес канала)")
+        if settings.get('message_processing_delay'):
+            logger.info("ℹ️ message_processing_delay больше не используется: объединитель не делает пауз, нагрузку распределяет планировщик")
     else:
         logger.info("🚀 Режим максимальной производительности (без ограничений)")
     
@@ -655,17 +885,23 @@ def main():
             status = coordinator.get_status()
             running_count = sum(1 for s in status.values() if s['status'] == 'Работает')
             
-            write_status(f"RUNNING: {running_count}/{len(active_channels)} channels")
+            # Эффективные интервалы опроса каналов (для async-потока интервала нет)
+            intervals = ', '.join(
+                f"{s['prefix']} {s['poll_interval']:.1f}s"
+                for s in status.values() if s.get('poll_interval') is not None
+            )
+            channels_status = f"{running_count}/{len(active_channels)} channels"
+            write_status(f"RUNNING: {channels_status} ({intervals})" if intervals else f"RUNNING: {channels_status}")
             
             # Логируем подробный статус каналов с дополнительной диагностикой
             for channel_id, channel_status in status.items():
                 if channel_status['status'] == 'Работает':
                     # Проверяем размер очереди для диагностики
-                    queue_size = coordinator.message_queues.get(channel_id, Queue()).qsize()
+                    queue_size = channel_status['queued']
                     if queue_size > 50:
                         logger.warning(f"⚠️ Канал {channel_status['name']}: большая очередь ({queue_size} сообщений)")
                     else:
-                        logger.debug(f"✅ Канал {channel_status['name']} работает (PID: {channel_status['pid']}, очередь: {queue_size})")
+                        logger.debug(f"✅ Канал {channel_status['name']} работает (PID: {channel_status['pid']}, очередь: {queue_size}, интервал: {channel_status['poll_interval']})")
                 else:
                     logger.warning(f"❌ Канал {channel_status['name']} остановлен")
             
@@ -680,7 +916,7 @@ def main():
                     # Находим конфигурацию канала
                     channel_config = None
                     for channel in active_channels:
-                        if channel['prefix'].replace('[', '').replace(']', '').lower() == channel_id:
+                        if channel_key(channel) == channel_id:
                             channel_config = channel
                             break
                     
@@ -697,7 +933,7 @@ def main():
                     # Находим конфигурацию канала
                     channel_config = None
                     for channel in active_channels:
-                        if channel['prefix'].replace('[', '').replace(']', '').lower() == channel_id:
+                        if channel_key(channel) == channel_id:
                             channel_config = channel
                             break
                     
@@ -714,7 +950,9 @@ def main():
                 coordinator = MultiChatCoordinator(
                     channels_config=active_channels,
                     output_file=args.output,
-                    max_messages=args.max_messages
+                    max_messages=args.max_messages,
+                    in_process=in_process,
+                    transport=transport
                 )
                 coordinator.start()
     
@@ -122,6 +122,35 @@ def check_logs():
             except Exception as e:
                 print(f"   ❌ Ошибка чтения: {e}")
 
+def check_archive():
+    """Проверяет архив чата"""
+    print("\n🗄️ ПРОВЕРКА АРХИВА ЧАТА:")
+    
+    try:
+        with open('chat_settings.json', 'r', encoding='utf-8') as f:
+            settings = json.load(f)
+    except Exception:
+        settings = {}
+    
+    from chat_archive import open_archive
+    archive = open_archive(settings)
+    if archive is None:
+        print("📊 Архив чата не найден (создаётся при первом запуске парсера или координатора)")
+        return
+    
+    check_file_exists(archive.path, 'Файл архива')
+    hour_ago = int((time.time() - 3600) * 1000)
+    total = archive.count()
+    last_hour = archive.count(since=hour_ago)
+    print(f"📊 Всего сообщений: {sum(total.values())}, за последний час: {sum(last_hour.values())}")
+    for channel, count in sorted(total.items()):
+        print(f"   {channel}: {count} (за час: {last_hour.get(channel, 0)})")
+    
+    latest = archive.recent(limit=1)
+    if latest:
+        latest_time = datetime.fromtimestamp(latest[0].get('timestamp', 0) / 1000)
+        print(f"📊 Последнее сообщение: {latest_time}")
+
 def check_main_files():
     """Проверяет основные файлы системы"""
     print("\n📄 ПРОВЕРКА ОСНОВНЫХ ФАЙЛОВ:")
@@ -161,6 +190,9 @@ def main():
     # Проверяем логи
     check_logs()
     
+    # Проверяем архив чата
+    check_archive()
+    
     # Итоговый статус
     print("\n" + "=" * 60)
     print("📊 ИТОГОВЫЙ СТАТУС:")
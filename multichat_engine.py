@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+In-process движок мульти-чата
+Все каналы работают как asyncio-задачи в одном event loop внутри процесса
+координатора: общий интерпретатор, одна база эмоджи и один объединитель
+сообщений вместо отдельного процесса парсера на каждый канал.
+При наличии pytchat.LiveChatAsync каналы читаются нативно асинхронно
+с общим HTTP клиентом, иначе блокирующий pytchat работает в пуле потоков
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from typing import Callable, Dict
+
+from chat_parser_pytchat import build_message, connect_chat, extract_video_id
+from chat_stream import ASYNC_AVAILABLE, close_shared_client, get_shared_client, iter_chat_messages
+from dedupe_store import DedupeStore
+from poll_scheduler import scheduler_from_settings
+
+logger = logging.getLogger('multichat_coordinator.engine')
+
+
+class ChannelTaskHandle:
+    """
+    Обёртка над задачей канала с интерфейсом subprocess.Popen
+
+    Позволяет координатору проверять статус, останавливать и перезапускать
+    in-process каналы тем же кодом, что и процессы парсеров
+    """
+
+    def __init__(self, future):
+        self.future = future
+        self.pid = os.getpid()
+
+    def poll(self):
+        """None пока задача работает, иначе код завершения"""
+        if not self.future.done():
+            return None
+        if self.future.cancelled() or self.future.exception() is None:
+            return 0
+        return 1
+
+    def terminate(self):
+        self.future.cancel()
+
+    def kill(self):
+        self.future.cancel()
+
+    def wait(self, timeout=None):
+        deadline = time.time() + timeout if timeout is not None else None
+        while not self.future.done():
+            if deadline is not None and time.time() > deadline:
+                break
+            time.sleep(0.05)
+        return self.poll()
+
+
+class InProcessChatEngine:
+    """
+    Запускает каналы мульти-чата как asyncio-задачи в отдельном потоке
+
+    Каждое нормализованное сообщение передаётся в on_message(channel_id, channel, message),
+    откуда оно попадает в общую очередь объединителя координатора
+    """
+
+    def __init__(self, on_message: Callable[[str, Dict, Dict], None], update_interval: float = 2.0,
+                 settings: Dict = None):
+        self.on_message = on_message
+        self.update_interval = update_interval
+        # Настройки адаптивного опроса (poll_interval_min/max, adaptive_polling)
+        self.settings = settings or {}
+        self.schedulers = {}
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run_loop, name='multichat-engine', daemon=True)
+        self.handles = {}
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def start(self):
+        """Запускает event loop движка"""
+        if not self.thread.is_alive():
+            self.thread.start()
+            logger.info("🧵 In-process движок мульти-чата запущен")
+
+    def start_channel(self, channel_id: str, channel: Dict) -> ChannelTaskHandle:
+        """Запускает задачу канала и возвращает её дескриптор"""
+        future = asyncio.run_coroutine_threadsafe(self._run_channel(channel_id, channel), self.loop)
+        handle = ChannelTaskHandle(future)
+        self.handles[channel_id] = handle
+        return handle
+
+    def stop(self):
+        """Отменяет все задачи каналов и останавливает event loop"""
+        if self.thread.is_alive():
+            try:
+                asyncio.run_coroutine_threadsafe(self._cancel_tasks(), self.loop).result(timeout=5)
+            except Exception as e:
+                logger.warning(f"⚠️ Не все задачи каналов завершились: {e}")
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        logger.info("In-process движок мульти-чата остановлен")
+
+    async def _cancel_tasks(self):
+        """Отменяет задачи каналов и дожидается их завершения"""
+        current = asyncio.current_task()
+        tasks = [task for task in asyncio.all_tasks() if task is not current]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await close_shared_client()
+
+    async def _run_channel(self, channel_id: str, channel: Dict):
+        """Цикл чтения одного канала с переподключением при ошибках"""
+        video_id = extract_video_id(channel['url'])
+        if not video_id:
+            logger.error(f"Не удалось извлечь video ID канала {channel['name']}: {channel['url']}")
+            return
+
+        if ASYNC_AVAILABLE:
+            await self._stream_channel(channel_id, channel, video_id)
+        else:
+            await self._poll_channel(channel_id, channel, video_id)
+
+    async def _stream_channel(self, channel_id: str, channel: Dict, video_id: str):
+        """Нативное асинхронное чтение: пачки ожидаются по готовности, без фиксированной паузы"""
+        seen_ids = DedupeStore()
+        while True:
+            try:
+                logger.info(f"✅ Канал {channel['name']} подключен (async)")
+                async for message in iter_chat_messages(video_id, client=get_shared_client(), seen_ids=seen_ids):
+                    self.on_message(channel_id, channel, message)
+
+                logger.warning(f"⚠️ Чат канала {channel['name']} завершился, переподключение...")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка канала {channel['name']} (async): {e}")
+            await asyncio.sleep(5)
+
+    def get_poll_interval(self, channel_id: str):
+        """Текущий интервал опроса канала или None (async-поток без пауз)"""
+        scheduler = self.schedulers.get(channel_id)
+        return scheduler.interval if scheduler is not None else None
+
+    async def _poll_channel(self, channel_id: str, channel: Dict, video_id: str):
+        """Блокирующий pytchat в пуле потоков с адаптивным интервалом опроса"""
+        loop = asyncio.get_running_loop()
+        seen_ids = DedupeStore()
+        scheduler = self.schedulers[channel_id] = scheduler_from_settings(self.settings, self.update_interval)
+        while True:
+            chat = None
+            try:
+                # pytchat блокирующий: сетевые вызовы уходят в пул потоков, SIGINT не перехватываем
+                chat = await loop.run_in_executor(None, connect_chat, video_id, False)
+                logger.info(f"✅ Канал {channel['name']} подключен (in-process)")
+
+                while chat.is_alive():
+                    chat_data = await loop.run_in_executor(None, chat.get)
+                    accepted = 0
+                    for item in chat_data.items:
+                        message = build_message(item, seen_ids)
+                        if message is None:
+                            continue
+                        seen_ids.add(message['id'])
+                        accepted += 1
+                        self.on_message(channel_id, channel, message)
+
+                    await asyncio.sleep(scheduler.record(accepted, getattr(chat_data, 'interval', None)))
+
+                logger.warning(f"⚠️ Чат канала {channel['name']} завершился, переподключение...")
+            except asyncio.CancelledError:
+                if chat is not None:
+                    chat.terminate()
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка канала {channel['name']} (in-process): {e}")
+            await asyncio.sleep(5)
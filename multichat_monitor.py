@@ -10,6 +10,7 @@ import json
 import time
 import subprocess
 from datetime import datetime
+from columnar_store import read_summary
 
 def check_multichat_status():
     """Проверяет статус мульти-чата и каналов"""
@@ -25,6 +26,20 @@ def check_multichat_status():
         print("❌ Файл статуса не найден - мульти-чат не запущен")
         return
     
+    # Активность чата по колоночному снимку координатора (нужен numpy)
+    summary = read_summary()
+    if summary is not None:
+        delay = summary['pipeline_delay_ms']
+        print(f"📈 За 5 минут: {summary['messages']} сообщений ({summary['rate']}/с), "
+              f"в среднем {summary['avg_text_length']} симв., эмоджи {summary['emoji_per_message']}/сообщ.")
+        if summary['channel_share']:
+            shares = ", ".join(f"{channel_id.upper()}: {share:.0%}" for channel_id, share in summary['channel_share'].items())
+            print(f"   Доли каналов: {shares}")
+        if delay:
+            print(f"   Задержка парсер -> координатор: p50 {delay['p50']:.0f} мс, p90 {delay['p90']:.0f} мс, p99 {delay['p99']:.0f} мс")
+        if summary['top_authors']:
+            print(f"   Активные авторы: {', '.join(entry['author'] for entry in summary['top_authors'])}")
+    
     # Проверяем временные файлы каналов
     temp_files = []
     for file in os.listdir('.'):
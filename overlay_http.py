@@ -0,0 +1,516 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Общие обработчики HTTP сервера оверлея
+Push-поток новых сообщений (Server-Sent Events) по адресу /events:
+сервер следит за журналом messages.ndjson и отправляет подключённым
+оверлеям только новые записи, а клиент возобновляет поток с последнего seq
+(?since=<seq> или заголовок Last-Event-ID).
+Статические файлы отдаются со строгим ETag и Last-Modified (304 при
+неизменном содержимом) и сжимаются gzip, если клиент это поддерживает.
+Поиск по архиву чата - JSON по адресу /api/search?q=...
+"""
+
+import os
+import gzip
+import json
+import time
+import shutil
+import hashlib
+import logging
+import threading
+from collections import OrderedDict, deque
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+from chat_archive import open_archive
+from message_journal import JournalReader, journal_path_for
+
+logger = logging.getLogger('overlay_http')
+
+# Путь push-потока сообщений
+EVENTS_PATH = '/events'
+
+# Путь поиска по архиву чата
+SEARCH_PATH = '/api/search'
+
+# Максимум результатов поиска за запрос
+SEARCH_MAX_LIMIT = 500
+
+# Интервал комментария-пинга, чтобы прокси и vMix не закрывали соединение
+HEARTBEAT_INTERVAL = 15
+
+# Типы содержимого, которые имеет смысл сжимать
+COMPRESSIBLE_TYPES = ('text/html', 'text/css', 'text/plain', 'application/javascript', 'application/json')
+
+# Файлы меньше этого размера не сжимаем
+GZIP_MIN_SIZE = 1024
+
+# В памяти держим только сжимаемые файлы не больше CACHE_MAX_FILE_SIZE,
+# всего не больше CACHE_MAX_BYTES (вместе со сжатыми копиями); остальные
+# файлы (картинки эмоджи, видео) читаются с диска на каждый запрос
+CACHE_MAX_FILE_SIZE = 1024 * 1024
+CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+
+class ChatEventHub:
+    """
+    Источник событий для SSE-клиентов
+
+    Один фоновый поток читает журнал по смещению и хранит последние записи,
+    клиентские потоки ждут новых записей на общем Condition. Если журнал
+    начат заново (очистка чата, перезапуск парсера), увеличивается поколение,
+    и клиенты получают событие reset
+    """
+
+    def __init__(self, journal_path: str, backlog: int = 500, poll_interval: float = 0.1):
+        self.journal_path = journal_path
+        self.reader = JournalReader(journal_path)
+        self.backlog = deque(maxlen=backlog)
+        self.poll_interval = poll_interval
+        self.condition = threading.Condition()
+        self.last_seq = 0
+        self.generation = 0
+        self.thread = threading.Thread(target=self._run, name='chat-event-hub', daemon=True)
+
+    def start(self):
+        """Запускает чтение журнала"""
+        if not self.thread.is_alive():
+            self.thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                records = self.reader.read_new()
+                if records:
+                    self._publish(records)
+            except Exception as e:
+                logger.error(f"Ошибка чтения журнала {self.journal_path}: {e}")
+                time.sleep(1)
+            time.sleep(self.poll_interval)
+
+    def _publish(self, records: List[Dict]):
+        with self.condition:
+            for record in records:
+                seq = record.get('seq')
+                if seq is None:
+                    continue
+                if seq <= self.last_seq:
+                    # Журнал начат заново - старые seq больше не действительны
+                    self.backlog.clear()
+                    self.generation += 1
+                self.backlog.append(record)
+                self.last_seq = seq
+            self.condition.notify_all()
+
+    def resolve_cursor(self, since: Optional[int]) -> Tuple[int, int]:
+        """
+        Определяет стартовую позицию клиента
+
+        Args:
+            since (int): Последний полученный клиентом seq или None
+
+        Returns:
+            tuple: (курсор, поколение журнала)
+        """
+        with self.condition:
+            if since is None:
+                # Новый клиент без истории - только новые сообщения
+                return self.last_seq, self.generation
+            if since > self.last_seq:
+                # Курсор из прошлого поколения журнала - отдаём весь буфер
+                return 0, self.generation
+            return since, self.generation
+
+    def wait_for(self, cursor: int, generation: int, timeout: float) -> Tuple[List[Dict], int, int, bool]:
+        """
+        Ждёт записи с seq больше курсора
+
+        Returns:
+            tuple: (записи, новый курсор, поколение, был ли сброс журнала)
+        """
+        with self.condition:
+            if generation == self.generation and self.last_seq <= cursor:
+                self.condition.wait(timeout)
+
+            if generation != self.generation:
+                return list(self.backlog), self.last_seq, self.generation, True
+
+            records = []
+            for record in reversed(self.backlog):
+                if record['seq'] <= cursor:
+                    break
+                records.append(record)
+            records.reverse()
+            return records, max(cursor, self.last_seq), generation, False
+
+
+_hubs = {}
+_hubs_lock = threading.Lock()
+
+
+def get_event_hub(snapshot_path: str = 'messages.json') -> ChatEventHub:
+    """Возвращает общий запущенный хаб событий для файла сообщений"""
+    with _hubs_lock:
+        hub = _hubs.get(snapshot_path)
+        if hub is None:
+            hub = _hubs[snapshot_path] = ChatEventHub(journal_path_for(snapshot_path))
+            hub.start()
+        return hub
+
+
+def _encode_event(record: Dict) -> bytes:
+    data = json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+    return f"id: {record['seq']}\ndata: {data}\n\n".encode('utf-8')
+
+
+def _parse_since(handler) -> Optional[int]:
+    query = parse_qs(urlparse(handler.path).query)
+    value = query.get('since', [None])[0] or handler.headers.get('Last-Event-ID')
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def is_events_request(path: str) -> bool:
+    """Проверяет, относится ли запрос к push-потоку"""
+    return urlparse(path).path == EVENTS_PATH
+
+
+def serve_events(handler, snapshot_path: str = 'messages.json'):
+    """
+    Отдаёт push-поток сообщений клиенту
+
+    Args:
+        handler: Экземпляр BaseHTTPRequestHandler (сервер должен быть многопоточным)
+        snapshot_path (str): Файл снимка, рядом с которым лежит журнал
+    """
+    hub = get_event_hub(snapshot_path)
+    cursor, generation = hub.resolve_cursor(_parse_since(handler))
+
+    handler.close_connection = True
+    handler.send_response(200)
+    handler.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+    handler.send_header('Cache-Control', 'no-cache')
+    handler.send_header('X-Accel-Buffering', 'no')
+    handler.end_headers()
+
+    try:
+        handler.wfile.write(b'retry: 2000\n\n')
+        handler.wfile.flush()
+
+        while True:
+            records, cursor, generation, reset = hub.wait_for(cursor, generation, HEARTBEAT_INTERVAL)
+
+            chunks = []
+            if reset:
+                chunks.append(b'event: reset\ndata: {}\n\n')
+            for record in records:
+                chunks.append(_encode_event(record))
+            if not chunks:
+                chunks.append(b': ping\n\n')
+
+            handler.wfile.write(b''.join(chunks))
+            handler.wfile.flush()
+
+    except (BrokenPipeError, ConnectionResetError, ConnectionAbortedError):
+        # Оверлей закрыт или перезагружен
+        pass
+
+
+# =============================================================================
+# СТАТИЧЕСКИЕ ФАЙЛЫ С УСЛОВНЫМИ ЗАПРОСАМИ
+# =============================================================================
+
+class StaticFileCache:
+    """
+    Кэш содержимого статических файлов
+
+    Файл перечитывается только при изменении mtime или размера. ETag
+    строится по хэшу содержимого, поэтому перезапись messages.json теми же
+    данными не заставляет клиентов скачивать файл заново. Сжатая версия
+    создаётся один раз на версию файла.
+
+    Кэшируются только сжимаемые файлы до max_file_size; при превышении
+    max_bytes вытесняются давно не запрошенные. Для прочих файлов запись
+    содержит только ETag по mtime и размеру (body = None)
+    """
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES, max_file_size: int = CACHE_MAX_FILE_SIZE):
+        self.max_bytes = max_bytes
+        self.max_file_size = max_file_size
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+    def _evict(self):
+        while self.bytes > self.max_bytes and self.entries:
+            _, entry = self.entries.popitem(last=False)
+            self.bytes -= entry['size']
+
+    def _remove(self, path: str):
+        entry = self.entries.pop(path, None)
+        if entry is not None:
+            self.bytes -= entry['size']
+
+    def get(self, path: str, cacheable: bool = True) -> Dict:
+        """
+        Возвращает актуальную запись кэша для файла
+
+        Args:
+            path (str): Путь к файлу
+            cacheable (bool): Тип файла допускает хранение в памяти
+        """
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+
+        if not cacheable or stat.st_size > self.max_file_size:
+            return {
+                'path': path,
+                'version': version,
+                'body': None,
+                'size': 0,
+                'etag': f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"',
+                'mtime': int(stat.st_mtime),
+                'last_modified': formatdate(stat.st_mtime, usegmt=True),
+                'gzip': None
+            }
+
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry['version'] == version:
+                self.entries.move_to_end(path)
+                return entry
+
+        with open(path, 'rb') as f:
+            body = f.read()
+
+        entry = {
+            'path': path,
+            'version': version,
+            'body': body,
+            'size': len(body),
+            'etag': f'"{hashlib.sha1(body).hexdigest()}"',
+            'mtime': int(stat.st_mtime),
+            'last_modified': formatdate(stat.st_mtime, usegmt=True),
+            'gzip': None
+        }
+        with self.lock:
+            self._remove(path)
+            self.entries[path] = entry
+            self.bytes += entry['size']
+            self._evict()
+        return entry
+
+    def get_gzip(self, entry: Dict) -> bytes:
+        """Возвращает сжатое содержимое записи"""
+        compressed = entry['gzip']
+        if compressed is None:
+            compressed = gzip.compress(entry['body'], compresslevel=6)
+            with self.lock:
+                if entry['gzip'] is None:
+                    entry['gzip'] = compressed
+                    entry['size'] += len(compressed)
+                    # Вытесненная запись уже не учитывается в размере кэша
+                    if self.entries.get(entry['path']) is entry:
+                        self.bytes += len(compressed)
+                        self._evict()
+        return compressed
+
+
+_file_cache = StaticFileCache()
+
+
+def _gzip_etag(etag: str) -> str:
+    return etag[:-1] + '-gz"'
+
+
+def _is_not_modified(handler, entry: Dict) -> bool:
+    if_none_match = handler.headers.get('If-None-Match')
+    if if_none_match:
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        return '*' in tags or entry['etag'] in tags or _gzip_etag(entry['etag']) in tags
+
+    if_modified_since = handler.headers.get('If-Modified-Since')
+    if if_modified_since:
+        try:
+            return entry['mtime'] <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError, IndexError, OverflowError):
+            return False
+    return False
+
+
+def serve_static(handler, cache_control: Optional[str] = 'no-cache') -> bool:
+    """
+    Отдаёт обычный файл с поддержкой ETag, Last-Modified и gzip
+
+    Args:
+        handler: Экземпляр SimpleHTTPRequestHandler
+        cache_control (str): Значение Cache-Control или None, если его добавляет сам обработчик
+
+    Returns:
+        bool: False если путь не является файлом (обработку продолжает SimpleHTTPRequestHandler)
+    """
+    path = handler.translate_path(handler.path)
+    if not os.path.isfile(path):
+        return False
+
+    content_type = handler.guess_type(path)
+    compressible = content_type.split(';')[0] in COMPRESSIBLE_TYPES
+    try:
+        entry = _file_cache.get(path, cacheable=compressible)
+    except OSError:
+        return False
+
+    use_gzip = (
+        entry['body'] is not None
+        and len(entry['body']) >= GZIP_MIN_SIZE
+        and compressible
+        and 'gzip' in handler.headers.get('Accept-Encoding', '')
+    )
+    etag = _gzip_etag(entry['etag']) if use_gzip else entry['etag']
+
+    if _is_not_modified(handler, entry):
+        handler.send_response(304)
+        handler.send_header('ETag', etag)
+        handler.send_header('Last-Modified', entry['last_modified'])
+        if cache_control:
+            handler.send_header('Cache-Control', cache_control)
+        handler.end_headers()
+        return True
+
+    if entry['body'] is None:
+        return _serve_from_disk(handler, path, entry, content_type, cache_control)
+
+    body = _file_cache.get_gzip(entry) if use_gzip else entry['body']
+
+    handler.send_response(200)
+    handler.send_header('Content-Type', content_type)
+    handler.send_header('Content-Length', str(len(body)))
+    if use_gzip:
+        handler.send_header('Content-Encoding', 'gzip')
+    handler.send_header('Vary', 'Accept-Encoding')
+    handler.send_header('ETag', etag)
+    handler.send_header('Last-Modified', entry['last_modified'])
+    if cache_control:
+        handler.send_header('Cache-Control', cache_control)
+    handler.end_headers()
+
+    if handler.command != 'HEAD':
+        try:
+            handler.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError, ConnectionAbortedError):
+            pass
+    return True
+
+
+def _serve_from_disk(handler, path: str, entry: Dict, content_type: str,
+                     cache_control: Optional[str]) -> bool:
+    """Отдаёт некэшируемый файл потоком с диска (ETag по mtime и размеру, без сжатия)"""
+    try:
+        f = open(path, 'rb')
+    except OSError:
+        return False
+
+    with f:
+        handler.send_response(200)
+        handler.send_header('Content-Type', content_type)
+        handler.send_header('Content-Length', str(entry['version'][1]))
+        handler.send_header('ETag', entry['etag'])
+        handler.send_header('Last-Modified', entry['last_modified'])
+        if cache_control:
+            handler.send_header('Cache-Control', cache_control)
+        handler.end_headers()
+
+        if handler.command != 'HEAD':
+            try:
+                shutil.copyfileobj(f, handler.wfile)
+            except (BrokenPipeError, ConnectionResetError, ConnectionAbortedError):
+                pass
+    return True
+
+
+# =============================================================================
+# ПОИСК ПО АРХИВУ ЧАТА
+# =============================================================================
+
+_archive = None
+_archive_lock = threading.Lock()
+
+
+def get_archive():
+    """Возвращает архив чата (открывается при первом запросе) или None, если архива ещё нет"""
+    global _archive
+    with _archive_lock:
+        if _archive is None:
+            try:
+                with open('chat_settings.json', 'r', encoding='utf-8') as f:
+                    settings = json.load(f)
+            except (OSError, ValueError):
+                settings = {}
+            _archive = open_archive(settings)
+        return _archive
+
+
+def is_search_request(path: str) -> bool:
+    """Проверяет, относится ли запрос к поиску по архиву"""
+    return urlparse(path).path == SEARCH_PATH
+
+
+def _send_json(handler, status: int, payload: Dict, cache_control: Optional[str]):
+    body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    handler.send_response(status)
+    handler.send_header('Content-Type', 'application/json; charset=utf-8')
+    handler.send_header('Content-Length', str(len(body)))
+    if cache_control:
+        handler.send_header('Cache-Control', cache_control)
+    handler.end_headers()
+    try:
+        handler.wfile.write(body)
+    except (BrokenPipeError, ConnectionResetError, ConnectionAbortedError):
+        pass
+
+
+def serve_search(handler, cache_control: Optional[str] = 'no-store'):
+    """
+    Отдаёт результаты поиска по архиву чата
+
+    Параметры запроса: q - слова (и эмоджи), minutes или since (мс) - период,
+    channel - ID канала, author - имя автора, limit - число результатов
+
+    Args:
+        handler: Экземпляр BaseHTTPRequestHandler
+        cache_control (str): Значение Cache-Control или None, если его добавляет сам обработчик
+    """
+    query = parse_qs(urlparse(handler.path).query)
+
+    def param(name):
+        return query.get(name, [None])[0]
+
+    text = param('q') or ''
+    try:
+        limit = min(int(param('limit') or 50), SEARCH_MAX_LIMIT)
+        since = int(param('since')) if param('since') else None
+        if param('minutes'):
+            since = int((time.time() - float(param('minutes')) * 60) * 1000)
+    except ValueError:
+        _send_json(handler, 400, {'error': 'Некорректные параметры limit, since или minutes'}, cache_control)
+        return
+
+    archive = get_archive()
+    if archive is None:
+        _send_json(handler, 503, {'error': 'Архив чата ещё не создан'}, cache_control)
+        return
+
+    started = time.perf_counter()
+    results = archive.search(text, since=since, channel=param('channel'), author=param('author'), limit=limit)
+    _send_json(handler, 200, {
+        'query': text,
+        'engine': 'fts5' if archive.fts else 'like',
+        'took_ms': round((time.perf_counter() - started) * 1000, 2),
+        'count': len(results),
+        'results': results
+    }, cache_control)
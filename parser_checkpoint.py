@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Контрольная точка парсера для быстрого перезапуска
+Парсер периодически сохраняет рядом с файлом сообщений позицию чата
+(continuation), последний seq журнала, ID последних принятых сообщений
+и версию базы эмоджи. Перезапущенный парсер той же трансляции продолжает
+с этого состояния: файл не переписывается, а уже показанные сообщения,
+которые pytchat отдаёт повторно после переподключения, сразу отбрасываются
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+logger = logging.getLogger('chat_parser.checkpoint')
+
+# Версия формата контрольной точки
+CHECKPOINT_FORMAT = 1
+
+# Контрольная точка старше этого времени не используется (трансляция могла смениться)
+DEFAULT_MAX_AGE = 600
+
+# Сколько последних ID сохраняется (с запасом на повтор pytchat после переподключения)
+DEFAULT_MAX_IDS = 2000
+
+
+def checkpoint_path_for(snapshot_path: str) -> str:
+    """Возвращает путь контрольной точки для файла снимка (messages.json -> messages.checkpoint.json)"""
+    base, _ = os.path.splitext(snapshot_path)
+    return f"{base}.checkpoint.json"
+
+
+class ParserCheckpoint:
+    """
+    Контрольная точка одного файла сообщений
+
+    Сохранение троттлится (не чаще interval секунд) и атомарно:
+    оборванная запись не портит предыдущую точку. Обычно точку пишет поток
+    фоновой записи, а финальную - основной поток при остановке
+    """
+
+    def __init__(self, snapshot_path: str, interval: float = 5.0, max_ids: int = DEFAULT_MAX_IDS):
+        self.path = checkpoint_path_for(snapshot_path)
+        self.interval = interval
+        self.recent_ids = deque(maxlen=max_ids)
+        self.last_save = 0.0
+        self.saves = 0
+        self.lock = threading.Lock()
+
+    def load(self, video_id: str, emoji_version: str, max_age: float = DEFAULT_MAX_AGE) -> Optional[Dict]:
+        """
+        Загружает контрольную точку, если она подходит для продолжения
+
+        Args:
+            video_id (str): ID текущей трансляции
+            emoji_version (str): Текущая версия базы эмоджи
+            max_age (float): Максимальный возраст точки в секундах
+
+        Returns:
+            dict: Состояние или None (нет точки, другая трансляция, устарела, сменилась база эмоджи)
+        """
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if not isinstance(state, dict) or state.get('format') != CHECKPOINT_FORMAT:
+            return None
+        if state.get('video_id') != video_id:
+            return None
+        if state.get('emoji_version') != emoji_version:
+            logger.info("База эмоджи изменилась с прошлого запуска, контрольная точка не используется")
+            return None
+        if time.time() - state.get('saved_at', 0) > max_age:
+            return None
+
+        self.recent_ids.extend(state.get('recent_ids', []))
+        return state
+
+    def remember(self, message_id: str):
+        """Добавляет ID принятого сообщения"""
+        self.recent_ids.append(message_id)
+
+    def maybe_save(self, **state) -> bool:
+        """Сохраняет точку, если с прошлого сохранения прошло interval секунд"""
+        if time.time() - self.last_save < self.interval:
+            return False
+        return self.save(**state)
+
+    def save(self, video_id: str, emoji_version: str, continuation: Optional[str] = None,
+             last_seq: int = 0, recovery: Optional[Dict] = None, stopped: bool = False) -> bool:
+        """
+        Атомарно записывает контрольную точку
+
+        Args:
+            video_id (str): ID трансляции
+            emoji_version (str): Версия базы эмоджи
+            continuation (str): Последняя позиция чата pytchat, если известна
+            last_seq (int): Последний seq журнала
+            recovery (dict): Метрики последнего восстановления
+            stopped (bool): Парсер завершает работу (время остановки нужно для метрики простоя)
+
+        Returns:
+            bool: True если точка записана
+        """
+        now = time.time()
+        state = {
+            'format': CHECKPOINT_FORMAT,
+            'video_id': video_id,
+            'emoji_version': emoji_version,
+            'continuation': continuation,
+            'last_seq': last_seq,
+            'recent_ids': list(self.recent_ids),
+            'recovery': recovery,
+            'saved_at': now,
+            'stopped_at': now if stopped else None
+        }
+
+        temp_path = f"{self.path}.tmp.{os.getpid()}"
+        with self.lock:
+            try:
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(state, f, ensure_ascii=False, separators=(',', ':'))
+                os.replace(temp_path, self.path)
+            except Exception as e:
+                logger.warning(f"Не удалось сохранить контрольную точку {self.path}: {e}")
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+                return False
+
+            self.last_save = now
+            self.saves += 1
+        return True
+
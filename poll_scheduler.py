@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Адаптивный интервал опроса чата
+Для каждого канала отслеживается сглаженная скорость сообщений и подсказка
+таймаута continuation от YouTube: активный чат опрашивается чаще, тихий -
+всё реже, в пределах poll_interval_min..poll_interval_max из настроек
+"""
+
+import time
+from typing import Dict, Optional
+
+# Границы интервала по умолчанию (секунды)
+DEFAULT_MIN_INTERVAL = 0.5
+DEFAULT_MAX_INTERVAL = 10.0
+
+# Сколько сообщений в среднем стараемся забирать за один опрос
+DEFAULT_TARGET_BATCH = 5
+
+# Во сколько раз растёт интервал после нескольких пустых опросов подряд
+IDLE_BACKOFF = 1.5
+IDLE_POLLS_BEFORE_BACKOFF = 2
+
+
+class AdaptivePollScheduler:
+    """
+    Планировщик интервала опроса одного канала
+
+    После каждого опроса вызывается record(): интервал подбирается так,
+    чтобы за опрос приходило около target_batch сообщений. Подсказка
+    YouTube используется как нижняя граница - раньше неё новых данных
+    всё равно не будет
+    """
+
+    def __init__(self, base_interval: float = 2.0,
+                 min_interval: float = DEFAULT_MIN_INTERVAL,
+                 max_interval: float = DEFAULT_MAX_INTERVAL,
+                 target_batch: int = DEFAULT_TARGET_BATCH,
+                 smoothing: float = 0.3,
+                 adaptive: bool = True):
+        self.min_interval = min(min_interval, max_interval)
+        self.max_interval = max_interval
+        self.target_batch = target_batch
+        self.smoothing = smoothing
+        self.adaptive = adaptive
+
+        self.base_interval = base_interval
+        self.interval = base_interval if not adaptive else self._clamp(base_interval)
+        self.rate = 0.0
+        self.hint = None
+        self.idle_polls = 0
+        self.polls = 0
+        self.last_poll = None
+
+    def _clamp(self, interval: float) -> float:
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def record(self, count: int, hint: Optional[float] = None, now: Optional[float] = None) -> float:
+        """
+        Учитывает результат опроса и возвращает паузу до следующего
+
+        Args:
+            count (int): Количество новых сообщений в пачке
+            hint (float): Таймаут continuation от YouTube в секундах или None
+            now (float): Текущее время time.monotonic() (для тестов)
+
+        Returns:
+            float: Интервал до следующего опроса в секундах
+        """
+        now = time.monotonic() if now is None else now
+        elapsed = now - self.last_poll if self.last_poll is not None else self.interval
+        self.last_poll = now
+
+        sample = count / max(elapsed, 0.001)
+        if self.polls == 0:
+            self.rate = sample
+        else:
+            self.rate += self.smoothing * (sample - self.rate)
+        self.polls += 1
+        self.idle_polls = 0 if count else self.idle_polls + 1
+
+        if not self.adaptive:
+            return self.interval
+
+        interval = self.target_batch / self.rate if self.rate > 0 else self.max_interval
+        if self.idle_polls >= IDLE_POLLS_BEFORE_BACKOFF:
+            # Тихий чат: плавно отступаем, даже если средняя скорость ещё не остыла
+            interval = max(interval, self.interval * IDLE_BACKOFF)
+
+        if hint:
+            try:
+                self.hint = float(hint)
+                interval = max(interval, min(self.hint, self.max_interval))
+            except (TypeError, ValueError):
+                pass
+
+        self.interval = self._clamp(interval)
+        return self.interval
+
+    def get_stats(self) -> Dict:
+        """Возвращает текущее состояние планировщика"""
+        return {
+            'interval': round(self.interval, 2),
+            'rate': round(self.rate, 2),
+            'hint': self.hint,
+            'idle_polls': self.idle_polls,
+            'polls': self.polls
+        }
+
+
+def scheduler_from_settings(settings: Dict, base_interval: Optional[float] = None) -> AdaptivePollScheduler:
+    """
+    Создаёт планировщик по chat_settings.json
+
+    Args:
+        settings (dict): Настройки (update_interval, adaptive_polling, poll_interval_min, poll_interval_max)
+        base_interval (float): Начальный интервал, если задан явно (аргумент --interval)
+
+    Returns:
+        AdaptivePollScheduler: Планировщик канала
+    """
+    return AdaptivePollScheduler(
+        base_interval=base_interval or settings.get('update_interval', 2),
+        min_interval=settings.get('poll_interval_min', DEFAULT_MIN_INTERVAL),
+        max_interval=settings.get('poll_interval_max', DEFAULT_MAX_INTERVAL),
+        target_batch=settings.get('poll_target_batch', DEFAULT_TARGET_BATCH),
+        adaptive=settings.get('adaptive_polling', True)
+    )
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Кольцевой буфер сообщений в разделяемой памяти
+Транспорт парсер -> координатор без файлов на диске: парсер дописывает
+компактные записи [длина u32][JSON] в сегмент multiprocessing.shared_memory,
+а координатор читает их напрямую из отображённой памяти по своей позиции
+"""
+
+import os
+import json
+import struct
+import logging
+from multiprocessing import shared_memory
+from typing import Dict, List
+
+logger = logging.getLogger('shm_ring')
+
+# Заголовок: magic, версия формата, ёмкость данных, позиция записи, последний seq
+_HEADER = struct.Struct('<4sIQQQ')
+HEADER_SIZE = 64
+MAGIC = b'CHRB'
+FORMAT_VERSION = 1
+
+_LENGTH = struct.Struct('<I')
+
+# Ёмкость по умолчанию: хватает на несколько тысяч сообщений
+DEFAULT_CAPACITY = 4 * 1024 * 1024
+
+
+def _attach_segment(name: str) -> shared_memory.SharedMemory:
+    """
+    Подключается к существующему сегменту
+
+    На POSIX resource_tracker считает подключившийся процесс владельцем
+    и удаляет сегмент при его завершении, поэтому сегмент снимается с учёта:
+    временем жизни управляет координатор
+    """
+    segment = shared_memory.SharedMemory(name=name, create=False)
+    if os.name == 'posix':
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(segment._name, 'shared_memory')
+        except Exception:
+            pass
+    return segment
+
+
+class ShmRing:
+    """
+    Кольцевой буфер с одним писателем
+
+    Позиции монотонные (всего записанных байт), поэтому переполнение
+    читателя определяется сравнением позиций. Писатель сначала копирует
+    данные и только потом публикует новую позицию записи
+    """
+
+    def __init__(self, segment: shared_memory.SharedMemory, owner: bool = False):
+        self.segment = segment
+        self.owner = owner
+        self.buf = segment.buf
+
+        magic, version, capacity, _, _ = _HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"Сегмент {segment.name} не является кольцевым буфером сообщений")
+        self.capacity = capacity
+        self.data = self.buf[HEADER_SIZE:HEADER_SIZE + capacity]
+
+    @classmethod
+    def create(cls, name: str, capacity: int = DEFAULT_CAPACITY) -> 'ShmRing':
+        """Создаёт новый сегмент (вызывается координатором)"""
+        segment = shared_memory.SharedMemory(name=name, create=True, size=HEADER_SIZE + capacity)
+        _HEADER.pack_into(segment.buf, 0, MAGIC, FORMAT_VERSION, capacity, 0, 0)
+        return cls(segment, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> 'ShmRing':
+        """Подключается к сегменту, созданному координатором (вызывается парсером)"""
+        return cls(_attach_segment(name))
+
+    @property
+    def name(self) -> str:
+        return self.segment.name
+
+    def _positions(self):
+        _, _, _, write_pos, last_seq = _HEADER.unpack_from(self.buf, 0)
+        return write_pos, last_seq
+
+    @property
+    def last_seq(self) -> int:
+        """Последний опубликованный seq"""
+        return self._positions()[1]
+
+    def _publish(self, write_pos: int, last_seq: int):
+        struct.pack_into('<QQ', self.buf, 16, write_pos, last_seq)
+
+    def _copy_in(self, position: int, payload: bytes):
+        start = position % self.capacity
+        end = start + len(payload)
+        if end <= self.capacity:
+            self.data[start:end] = payload
+        else:
+            split = self.capacity - start
+            self.data[start:] = payload[:split]
+            self.data[:end - self.capacity] = payload[split:]
+
+    def _copy_out(self, position: int, length: int) -> bytes:
+        start = position % self.capacity
+        end = start + length
+        if end <= self.capacity:
+            return bytes(self.data[start:end])
+        return bytes(self.data[start:]) + bytes(self.data[:end - self.capacity])
+
+    def append(self, message: Dict) -> int:
+        """
+        Дописывает сообщение в буфер
+
+        Args:
+            message (dict): Сообщение; поле seq назначается буфером
+
+        Returns:
+            int: Назначенный seq
+        """
+        write_pos, last_seq = self._positions()
+        last_seq += 1
+        message['seq'] = last_seq
+
+        payload = json.dumps(message, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        record = _LENGTH.pack(len(payload)) + payload
+        if len(record) > self.capacity:
+            logger.warning(f"Сообщение {message.get('id')} больше буфера ({len(record)} байт), пропущено")
+            return last_seq - 1
+
+        self._copy_in(write_pos, record)
+        self._publish(write_pos + len(record), last_seq)
+        return last_seq
+
+    def close(self):
+        """Отключается от сегмента, владелец также удаляет его"""
+        self.data.release()
+        self.buf = None
+        try:
+            self.segment.close()
+            if self.owner:
+                self.segment.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class ShmRingReader:
+    """
+    Читатель кольцевого буфера с интерфейсом JournalReader.read_new()
+
+    Если писатель обогнал читателя больше чем на ёмкость буфера,
+    непрочитанные записи потеряны: читатель переходит к текущей позиции
+    """
+
+    def __init__(self, ring: ShmRing):
+        self.ring = ring
+        self.position, self.last_seq = ring._positions()
+        self.overruns = 0
+
+    def read_new(self) -> List[Dict]:
+        """Возвращает записи, опубликованные с прошлого чтения"""
+        ring = self.ring
+        write_pos, last_seq = ring._positions()
+
+        if write_pos < self.position:
+            # Буфер пересоздан - начинаем с начала
+            self.position = 0
+        if write_pos - self.position > ring.capacity:
+            self._skip_to(write_pos, last_seq)
+            return []
+
+        records = []
+        position = self.position
+        while position < write_pos:
+            (length,) = _LENGTH.unpack(ring._copy_out(position, _LENGTH.size))
+            payload = ring._copy_out(position + _LENGTH.size, length)
+            position += _LENGTH.size + length
+            try:
+                records.append(json.loads(payload))
+            except ValueError:
+                logger.warning(f"Пропущена повреждённая запись буфера {ring.name}")
+
+        # Пока мы читали, писатель мог перезаписать начало прочитанного участка
+        current_pos, current_seq = ring._positions()
+        if current_pos - self.position > ring.capacity:
+            self._skip_to(current_pos, current_seq)
+            return []
+
+        self.position = position
+        if records:
+            self.last_seq = records[-1].get('seq', self.last_seq)
+        return records
+
+    def _skip_to(self, write_pos: int, last_seq: int):
+        self.overruns += 1
+        logger.warning(f"⚠️ Буфер {self.ring.name} переполнен, пропущено до seq {last_seq}")
+        self.position = write_pos
+        self.last_seq = last_seq
@@ -4,6 +4,8 @@ import os
 import sys
 import json
 
+from overlay_http import is_events_request, is_search_request, serve_events, serve_search, serve_static
+
 # Определяем порт из аргументов командной строки или используем 8080 по умолчанию
 PORT = int(sys.argv[1]) if len(sys.argv) > 1 else 8080
 
@@ -24,15 +26,36 @@ class MyHttpRequestHandler(http.server.SimpleHTTPRequestHandler):
             return 'text/html'
         return super().guess_type(path)
 
+    def do_GET(self):
+        # Push-поток новых сообщений для оверлеев
+        if is_events_request(self.path):
+            serve_events(self)
+            return
+        # Поиск по архиву чата (JSON)
+        if is_search_request(self.path):
+            serve_search(self)
+            return
+        # Файлы с ETag/Last-Modified (304 без изменений) и gzip
+        if serve_static(self):
+            return
+        super().do_GET()
+
+    def do_HEAD(self):
+        if serve_static(self):
+            return
+        super().do_HEAD()
+
     # Логирование запросов для отладки
     def log_message(self, format, *args):
         print(f"[ВЕБ-СЕРВЕР] {self.address_string()} - {args[0]} {args[1]}")
 
-# Создаем сервер с возможностью переиспользования адреса
-# Это помогает избежать ошибки "Address already in use" при быстром перезапуске
-socketserver.TCPServer.allow_reuse_address = True
+# Создаем многопоточный сервер с возможностью переиспользования адреса
+# Это помогает избежать ошибки "Address already in use" при быстром перезапуске,
+# а открытые потоки /events не блокируют остальных клиентов
+socketserver.ThreadingTCPServer.allow_reuse_address = True
+socketserver.ThreadingTCPServer.daemon_threads = True
 Handler = MyHttpRequestHandler
-httpd = socketserver.TCPServer(("", PORT), Handler)
+httpd = socketserver.ThreadingTCPServer(("", PORT), Handler)
 
 print("==========================================")
 print(f"  УЛУЧШЕННЫЙ ВЕБ-СЕРВЕР ЗАПУЩЕН")
@@ -43,6 +66,7 @@ print("==========================================")
 print("  Доступные ссылки:")
 print(f"  - Основной чат: http://localhost:{PORT}/chat_local.html")
 print(f"  - Демо тем:     http://localhost:{PORT}/theme_demo.html")
+print(f"  - Поток событий: http://localhost:{PORT}/events")
 print("==========================================")
 print("  Для остановки сервера нажмите Ctrl+C")
 print("==========================================")
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Свёртка повторяющихся сообщений мульти-чата
+Во время хайпа один и тот же текст ("GG", ":fire::fire:", копипаста) приходит
+от множества авторов. Первое сообщение проходит дальше как обычно, а его
+повторы в течение window_seconds не попадают в окно, журнал и оверлей
+по отдельности: у первого сообщения растёт repeat_count и пополняется
+выборка авторов. Обновлённое сообщение отправляется повторно (тот же id,
+новый seq) не чаще одного раза за цикл объединителя. Если первое сообщение
+уже вытеснено из окна, серия закрывается и повтор открывает новую
+"""
+
+import re
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from chat_message import plain_text
+
+# Значения по умолчанию (переопределяются в chat_settings.json)
+DEFAULT_WINDOW_SECONDS = 10.0
+DEFAULT_AUTHOR_SAMPLE = 3
+
+# Пробелы и пунктуация не влияют на совпадение ("GG!!" == "g g")
+_NOISE_PATTERN = re.compile(r'[\s\W_]+', re.UNICODE)
+# Растянутые символы ("GGGGG", "🔥🔥🔥🔥") сводятся к двум
+_RUN_PATTERN = re.compile(r'(.)\1{2,}', re.DOTALL)
+
+
+def normalize_text(text: str) -> str:
+    """
+    Ключ сравнения текста сообщения
+
+    Args:
+        text (str): Текст сообщения (может содержать HTML эмоджи)
+
+    Returns:
+        str: Нормализованный текст; пустая строка, если сравнивать нечего
+    """
+    if not text:
+        return ''
+    text = plain_text(text).casefold()
+    # Пунктуация убирается, но текст из одной пунктуации (":)") не теряется
+    stripped = _NOISE_PATTERN.sub('', text)
+    if not stripped:
+        stripped = ''.join(text.split())
+    return _RUN_PATTERN.sub(r'\1\1', stripped)
+
+
+class _Group:
+    """Первое сообщение серии повторов"""
+
+    __slots__ = ('lead', 'started')
+
+    def __init__(self, lead, started: float):
+        self.lead = lead
+        self.started = started
+
+
+class SpamAggregator:
+    """
+    Потоковая свёртка почти одинаковых сообщений
+
+    Серия повторов открывается первым сообщением с новым ключом и длится
+    window_seconds; следующий повтор после окна открывает новую серию,
+    поэтому продолжающийся флуд остаётся виден в оверлее. Во время рейда
+    первое сообщение может покинуть окно раньше - тогда серию закрывает
+    предикат visible. Память ограничена числом различных текстов за window_seconds
+    """
+
+    def __init__(self, window_seconds: float = DEFAULT_WINDOW_SECONDS,
+                 author_sample: int = DEFAULT_AUTHOR_SAMPLE):
+        self.window_seconds = window_seconds
+        self.author_sample = author_sample
+        self.groups = OrderedDict()
+
+        # Статистика
+        self.processed = 0
+        self.collapsed = 0
+        self.reopened = 0
+
+    def _expire(self, now: float):
+        groups = self.groups
+        while groups:
+            key, group = next(iter(groups.items()))
+            if now - group.started < self.window_seconds:
+                break
+            del groups[key]
+
+    def process(self, records: List, now: Optional[float] = None,
+                visible: Optional[Callable[[object], bool]] = None) -> Tuple[List, List]:
+        """
+        Сворачивает повторы в пачке записей
+
+        Args:
+            records (list): Новые записи MessageRecord (после дедупликации по ID)
+            now (float): Текущее время (time.monotonic по умолчанию)
+            visible (callable): Виден ли ещё первый элемент серии (например, есть ли он в окне);
+                серия с вытесненным первым сообщением закрывается, и повтор открывает новую
+
+        Returns:
+            tuple: (записи для окна, ранее отправленные первые записи с обновлённым счётчиком)
+        """
+        now = time.monotonic() if now is None else now
+        self._expire(now)
+
+        fresh = []
+        updated = {}
+        # Первые записи серий из этой пачки ещё не в окне, но видны
+        opened = set()
+        for record in records:
+            self.processed += 1
+            key = normalize_text(record.text)
+            if not key:
+                fresh.append(record)
+                continue
+
+            group = self.groups.get(key)
+            if group is not None and visible is not None and id(group.lead) not in opened \
+                    and not visible(group.lead):
+                # Первое сообщение вытеснено - его счётчик уже никто не увидит
+                del self.groups[key]
+                group = None
+                self.reopened += 1
+            if group is None:
+                self.groups[key] = _Group(record, now)
+                opened.add(id(record))
+                fresh.append(record)
+                continue
+
+            lead = group.lead
+            lead.repeat_count = (lead.repeat_count or 1) + 1
+            name = record.display_name
+            sample = lead.repeat_authors or ()
+            if len(sample) < self.author_sample and name not in sample and name != lead.display_name:
+                lead.repeat_authors = sample + (name,)
+            self.collapsed += 1
+            updated[id(lead)] = lead
+
+        # Первые записи, пришедшие в этой же пачке, уйдут в окно с итоговым счётчиком
+        for record in fresh:
+            updated.pop(id(record), None)
+        return fresh, list(updated.values())
+
+    def get_stats(self) -> Dict:
+        """Возвращает статистику свёртки"""
+        return {
+            'processed': self.processed,
+            'collapsed': self.collapsed,
+            'reopened': self.reopened,
+            'collapse_ratio': round(self.processed / (self.processed - self.collapsed), 2)
+            if self.processed > self.collapsed else 1.0,
+            'active_groups': len(self.groups)
+        }
+
+
+def aggregator_from_settings(settings: Optional[Dict] = None) -> Optional[SpamAggregator]:
+    """
+    Создаёт агрегатор по chat_settings.json
+
+    Args:
+        settings (dict): Настройки (spam_collapse_enabled, spam_collapse_window_seconds,
+            spam_collapse_author_sample)
+
+    Returns:
+        SpamAggregator: Агрегатор или None, если свёртка отключена
+    """
+    settings = settings or {}
+    if not settings.get('spam_collapse_enabled', True):
+        return None
+    return SpamAggregator(
+        window_seconds=settings.get('spam_collapse_window_seconds', DEFAULT_WINDOW_SECONDS),
+        author_sample=settings.get('spam_collapse_author_sample', DEFAULT_AUTHOR_SAMPLE)
+    )
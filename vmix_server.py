@@ -8,19 +8,50 @@ import sys
 import webbrowser
 from urllib.parse import urlparse
 
+from overlay_http import is_events_request, is_search_request, serve_events, serve_search, serve_static
+
 class vMixHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
     """HTTP сервер оптимизированный для vMix"""
     
+    # Обработчик ответа уже задал Cache-Control (например, поток /events)
+    cache_control_sent = False
+    
+    def send_header(self, keyword, value):
+        if keyword.lower() == 'cache-control':
+            self.cache_control_sent = True
+        super().send_header(keyword, value)
+    
     def end_headers(self):
         # Добавляем заголовки для совместимости с vMix
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate')
-        self.send_header('Pragma', 'no-cache')
-        self.send_header('Expires', '0')
+        if not self.cache_control_sent:
+            # Без no-store: браузер хранит копию и перепроверяет её по ETag (ответ 304)
+            self.send_header('Cache-Control', 'no-cache, must-revalidate')
+            self.send_header('Pragma', 'no-cache')
+            self.send_header('Expires', '0')
+        self.cache_control_sent = False
         super().end_headers()
     
+    def do_GET(self):
+        """Отдаём push-поток сообщений или статические файлы"""
+        if is_events_request(self.path):
+            serve_events(self)
+            return
+        if is_search_request(self.path):
+            serve_search(self, cache_control=None)
+            return
+        # Cache-Control добавляет end_headers
+        if serve_static(self, cache_control=None):
+            return
+        super().do_GET()
+    
+    def do_HEAD(self):
+        if serve_static(self, cache_control=None):
+            return
+        super().do_HEAD()
+    
     def do_OPTIONS(self):
         """Обрабатываем OPTIONS запросы для CORS"""
         self.send_response(200)
@@ -63,7 +94,8 @@ def main():
     os.chdir(script_dir)
     
     try:
-        with socketserver.TCPServer(("", PORT), vMixHTTPRequestHandler) as httpd:
+        socketserver.ThreadingTCPServer.daemon_threads = True
+        with socketserver.ThreadingTCPServer(("", PORT), vMixHTTPRequestHandler) as httpd:
             print(f"🚀 vMix HTTP Сервер запущен на порту {PORT}")
             print(f"📁 Рабочая папка: {os.getcwd()}")
             print()